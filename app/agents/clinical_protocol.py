@@ -3,11 +3,11 @@ import logging
 from dotenv import load_dotenv
 
 from agno.agent import Agent
-from agno.models.groq import Groq
-from agno.memory.v2.memory import Memory
-from agno.memory.v2.db.postgres import PostgresMemoryDb
 
-from app.storage.pg_storage import pg_storage
+from app.agents.model_router import MODEL_BACKENDS, get_routed_model
+from app.agents.prompt_budget import BudgetedMemory, PromptBudget, make_budgeted_retriever
+from app.storage.session_cache import session_cache
+from app.storage.pg_memory import get_memory_db
 from app.storage.rag import get_pdfknowledge_base
 
 
@@ -17,8 +17,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 groq_api_key = os.getenv("GROQ_API_KEY")
-model_llm = "qwen/qwen3-32b"
-db_url = os.getenv("DB_URL")
+prompt_budget = PromptBudget(
+    total_tokens=int(os.getenv("CLINICAL_PROTOCOL_PROMPT_BUDGET", 4000)),
+    history_tokens=int(os.getenv("CLINICAL_PROTOCOL_HISTORY_BUDGET", 1000)),
+    memory_tokens=int(os.getenv("CLINICAL_PROTOCOL_MEMORY_BUDGET", 400))
+)
 
 
 async def get_clinical_protocol_agent():
@@ -45,35 +48,42 @@ async def get_clinical_protocol_agent():
     }
     """
 
-    memory_clinical_protocol = Memory(
-        model=Groq(id=model_llm, api_key=groq_api_key),
-        db=PostgresMemoryDb(table_name="clinical_protocol_memories", db_url=db_url),
+    instructions = [
+        "You are an expert in Clinical Protocols. Given a diagnostic hypothesis, your task is to suggest appropriate examinations and treatments.",
+        "**Use ONLY the information provided in the context of the knowledge base (RAG) to form your recommendations.**",
+        "**Your ONLY final result MUST be a valid JSON object that fits EXACTLY into the `ClinicalAction` schema defined below. Do not use any other field names.**",
+        f"Here is the required JSON schema:\n{json_schema_definition}", 
+        "Do NOT include any preamble, explanatory text, code markdown (```json), or anything other than pure JSON.",
+        "Your JSON must start with `{` and end with `}`.",
+        "**YOU MUST INCLUDE the 'urgency' field and populate it with one of the following values: 'Immediate', 'Brief', 'Routine', based on the severity and urgency of the hypothesis.**",
+        "Justify each recommendation in the 'justification' field nested within each exam and treatment object.",
+        "Prioritize safety and efficacy in the action plan. If the hypothesis is uncertain or severe, emphasize the need for immediate medical consultation."
+    ]
+    description = "Suggests examinations and treatments based on diagnostic hypotheses."
+    prompt_budget.measure_static(description, *instructions)
+
+    memory_clinical_protocol = BudgetedMemory(
+        model=get_routed_model(groq_api_key),
+        db=get_memory_db("clinical_protocol_memories"),
         delete_memories=False,
-        clear_memories=False
+        clear_memories=False,
+        budget=prompt_budget
     )
 
     agent_clinical_protocol = Agent(
         name="Clinical Protocol Agent",
-        model=Groq(id=model_llm, api_key=groq_api_key),
+        model=get_routed_model(groq_api_key),
         memory=memory_clinical_protocol,
         enable_agentic_memory=True,
         enable_user_memories=True,
         tools=[],
-        instructions=[
-            "You are an expert in Clinical Protocols. Given a diagnostic hypothesis, your task is to suggest appropriate examinations and treatments.",
-            "**Use ONLY the information provided in the context of the knowledge base (RAG) to form your recommendations.**",
-            "**Your ONLY final result MUST be a valid JSON object that fits EXACTLY into the `ClinicalAction` schema defined below. Do not use any other field names.**",
-            f"Here is the required JSON schema:\n{json_schema_definition}", 
-            "Do NOT include any preamble, explanatory text, code markdown (```json), or anything other than pure JSON.",
-            "Your JSON must start with `{` and end with `}`.",
-            "**YOU MUST INCLUDE the 'urgency' field and populate it with one of the following values: 'Immediate', 'Brief', 'Routine', based on the severity and urgency of the hypothesis.**",
-            "Justify each recommendation in the 'justification' field nested within each exam and treatment object.",
-            "Prioritize safety and efficacy in the action plan. If the hypothesis is uncertain or severe, emphasize the need for immediate medical consultation."
-        ],
-        description="Suggests examinations and treatments based on diagnostic hypotheses.",
+        instructions=instructions,
+        description=description,
         knowledge=pdf_knowledge_base,
+        add_references=True,
+        retriever=make_budgeted_retriever(prompt_budget),
         search_knowledge=False,
-        storage=pg_storage,
+        storage=session_cache.storage_for("clinical_protocol"),
         add_datetime_to_instructions=False,
         add_history_to_messages=True,
         num_history_runs=3,
@@ -82,5 +92,5 @@ async def get_clinical_protocol_agent():
         debug_mode=True,
         tool_choice="none"
     )
-    logger.info(f"Initialized Clinical Protocol Agent with model: {model_llm}")
+    logger.info(f"Initialized Clinical Protocol Agent with model backends: {MODEL_BACKENDS}")
     return agent_clinical_protocol
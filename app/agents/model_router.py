@@ -0,0 +1,379 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from app.monitoring import metrics
+from app.utils.deadline import check_deadline, current_deadline
+from app.utils.http_pool import genai_http_options, http_pool
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Comma-separated "provider:model" list, primary first. Providers: groq, gemini, ollama (local stand-in).
+MODEL_BACKENDS = os.getenv("MODEL_BACKENDS", "groq:qwen/qwen3-32b")
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", 60))
+MODEL_HEDGING_ENABLED = os.getenv("MODEL_HEDGING_ENABLED", "true").lower() == "true"
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", 0.95))
+# Until a backend has this many latency samples, hedges fire after MODEL_HEDGE_DELAY_SECONDS.
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", 20))
+MODEL_HEDGE_DELAY_SECONDS = float(os.getenv("MODEL_HEDGE_DELAY_SECONDS", 15))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("MODEL_BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("MODEL_BREAKER_RESET_SECONDS", 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ModelUnavailableError(RuntimeError):
+    """Every backend failed, timed out or has its circuit open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_seconds`. Once that passes the circuit is half-open: calls go through again,
+    the first success closes it and the first failure opens it for another period.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+# Shared by every agent and memory model, so one agent's failures protect the others.
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(backend: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if backend not in _breakers:
+            _breakers[backend] = CircuitBreaker()
+        return _breakers[backend]
+
+
+def breaker_states() -> Dict[str, str]:
+    with _breakers_lock:
+        return {backend: breaker.state for backend, breaker in _breakers.items()}
+
+
+@dataclass
+class ModelCall:
+    backend: str
+    latency_ms: float
+    hedged: bool = False
+    failover: bool = False
+
+
+@dataclass
+class ModelTrace:
+    calls: List[ModelCall] = field(default_factory=list)
+
+    @property
+    def served_by(self) -> Optional[str]:
+        return self.calls[-1].backend if self.calls else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"served_by": self.served_by, "calls": [asdict(call) for call in self.calls]}
+
+
+_current_trace: contextvars.ContextVar[Optional[ModelTrace]] = contextvars.ContextVar("model_trace", default=None)
+
+
+@contextmanager
+def track_model():
+    """Collect which backend served each model call of one agent run."""
+    trace = ModelTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def build_backend(spec: str, groq_api_key: Optional[str] = None) -> Model:
+    # Every backend's SDK client runs on the process-wide pool, so agents and memories share connections.
+    provider, _, model_id = spec.strip().partition(":")
+    if provider == "groq":
+        from agno.models.groq import Groq
+        from groq import AsyncGroq
+        model = Groq(
+            id=model_id, api_key=groq_api_key or os.getenv("GROQ_API_KEY"), timeout=int(MODEL_TIMEOUT_SECONDS),
+            http_client=http_pool.client()
+        )
+        if model.api_key:
+            # agno builds a new AsyncGroq client (and connection pool) on every call unless one is pinned.
+            model.async_client = AsyncGroq(**model._get_client_params(), http_client=http_pool.async_client())
+        return model
+    if provider == "gemini":
+        from agno.models.google import Gemini
+        return Gemini(id=model_id, api_key=os.getenv("GOOGLE_API_KEY"), client_params={"http_options": genai_http_options()})
+    if provider == "ollama":
+        from agno.models.ollama import Ollama
+        from ollama import AsyncClient, Client
+        model = Ollama(id=model_id, host=os.getenv("OLLAMA_HOST"), timeout=MODEL_TIMEOUT_SECONDS)
+        model.client = Client(**model._get_client_params(), transport=http_pool.transport())
+        model.async_client = AsyncClient(**model._get_client_params(), transport=http_pool.async_transport())
+        return model
+    raise ValueError(f"Unknown model backend '{spec}', expected groq:<id>, gemini:<id> or ollama:<id>.")
+
+
+async def warm_backend(backend: Model) -> None:
+    """Open the backend's connection with a free metadata call (no tokens are generated)."""
+    provider = backend.__class__.__name__.lower()
+    if provider == "groq":
+        await backend.get_async_client().models.list()
+    elif provider == "gemini":
+        await backend.get_client().aio.models.get(model=backend.id)
+    elif provider == "ollama":
+        await backend.get_async_client().list()
+
+
+def model_backends(model: Optional[Model]) -> List[Model]:
+    if model is None:
+        return []
+    return list(model.backends) if isinstance(model, RoutedModel) else [model]
+
+
+def backend_name(model: Model) -> str:
+    return f"{model.__class__.__name__.lower()}:{model.id}"
+
+
+@dataclass
+class RoutedModel(Model):
+    """
+    agno Model that spreads each call over several backends.
+
+    Calls go to the first backend whose circuit is closed. If it has not answered after
+    the `MODEL_HEDGE_PERCENTILE` latency of that backend, a hedged request goes to the next
+    backend (or the same one when it is the only one) and the first answer wins; the other
+    is cancelled. Failed backends fail over to the next one, and the whole call gives up at
+    `timeout` seconds or at the request deadline, whichever comes first. Each attempt works on its own copy of the message list, and only the
+    winner's new messages are appended to the caller's list.
+    """
+
+    id: str = "routed"
+    name: str = "RoutedModel"
+    provider: str = "Routed"
+    backends: List[Model] = field(default_factory=list)
+    timeout: float = MODEL_TIMEOUT_SECONDS
+    hedging: bool = MODEL_HEDGING_ENABLED
+
+    def __post_init__(self):
+        super().__post_init__()
+        if not self.backends:
+            raise ValueError("RoutedModel needs at least one backend.")
+        primary = self.backends[0]
+        self.id = primary.id
+        self.supports_native_structured_outputs = primary.supports_native_structured_outputs
+        self.supports_json_schema_outputs = primary.supports_json_schema_outputs
+        self.assistant_message_role = primary.assistant_message_role
+        self.tool_message_role = primary.tool_message_role
+
+    @property
+    def primary(self) -> Model:
+        return self.backends[0]
+
+    def _available(self) -> List[Model]:
+        available = [backend for backend in self.backends if get_breaker(backend_name(backend)).allow()]
+        if not available:
+            metrics.increment("model.rejected")
+            raise ModelUnavailableError(f"All model backends have an open circuit: {breaker_states()}")
+        return available
+
+    def hedge_delay(self, backend: Model) -> float:
+        delay, samples = metrics.quantile(f"model.{backend_name(backend)}.latency_ms", MODEL_HEDGE_PERCENTILE)
+        if samples < MODEL_HEDGE_MIN_SAMPLES:
+            return MODEL_HEDGE_DELAY_SECONDS
+        return delay / 1000
+
+    async def _attempt(self, backend: Model, messages: List[Message], kwargs: Dict[str, Any]) -> Tuple[ModelResponse, float]:
+        name = backend_name(backend)
+        start = time.perf_counter()
+        try:
+            response = await backend.aresponse(messages=messages, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            get_breaker(name).record_failure()
+            metrics.increment(f"model.{name}.errors")
+            logger.warning(f"Model backend '{name}' failed: {e}")
+            raise
+        latency_ms = (time.perf_counter() - start) * 1000
+        get_breaker(name).record_success()
+        metrics.observe(f"model.{name}.latency_ms", latency_ms)
+        return response, latency_ms
+
+    def _record(self, backend: Model, latency_ms: float, hedged: bool, failover: bool) -> None:
+        name = backend_name(backend)
+        metrics.increment(f"model.served.{name}")
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.calls.append(ModelCall(name, round(latency_ms, 1), hedged, failover))
+
+    async def aresponse(self, messages: List[Message], **kwargs) -> ModelResponse:
+        check_deadline("model")
+        candidates = self._available()
+        spare = candidates[1:]
+        # The request deadline (if any) caps the per-call timeout.
+        own_deadline = time.monotonic() + self.timeout
+        request_deadline = current_deadline()
+        deadline = own_deadline if request_deadline is None else min(own_deadline, request_deadline.expires_at)
+        hedge_at = time.monotonic() + self.hedge_delay(candidates[0])
+        hedged = False
+        pending: Dict[asyncio.Task, Tuple[Model, List[Message], Optional[str]]] = {}
+        error: Optional[BaseException] = None
+
+        def launch(backend: Model, kind: Optional[str] = None) -> None:
+            attempt = list(messages)
+            task = asyncio.create_task(self._attempt(backend, attempt, kwargs))
+            pending[task] = (backend, attempt, kind)
+            if kind is not None:
+                metrics.increment(f"model.{kind}")
+                logger.info(f"Model call {kind} to '{backend_name(backend)}'.")
+
+        launch(candidates[0])
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    if now < own_deadline:
+                        # The caller ran out of time, not the backends: the pending calls are cancelled
+                        # below and the breakers are left alone.
+                        request_deadline.check("model")
+                    for backend, _, _ in pending.values():
+                        get_breaker(backend_name(backend)).record_failure()
+                    metrics.increment("model.timeouts")
+                    raise ModelUnavailableError(f"No model backend answered within {self.timeout:.1f}s.")
+                can_hedge = self.hedging and not hedged
+                wait = deadline - now if not can_hedge else max(0.0, min(deadline, hedge_at) - now)
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if can_hedge and time.monotonic() >= hedge_at:
+                        hedged = True
+                        launch(spare.pop(0) if spare else candidates[0], "hedged")
+                    continue
+
+                for task in done:
+                    backend, attempt, kind = pending.pop(task)
+                    if task.exception() is None:
+                        response, latency_ms = task.result()
+                        messages.extend(attempt[len(messages):])
+                        self._record(backend, latency_ms, hedged=kind == "hedged", failover=kind == "failover")
+                        return response
+                    error = task.exception()
+                if not pending and spare:
+                    # The failover is this call's one extra request; no hedge after it.
+                    hedged = True
+                    launch(spare.pop(0), "failover")
+            raise ModelUnavailableError(f"Every model backend failed: {error}") from error
+        except asyncio.CancelledError:
+            # The request was cancelled (deadline or client gone): the in-flight completions are aborted.
+            metrics.increment("model.cancelled", len(pending))
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def response(self, messages: List[Message], **kwargs) -> ModelResponse:
+        """Sync path (not used by the API): failover only, no hedging."""
+        error: Optional[Exception] = None
+        for position, backend in enumerate(self._available()):
+            name = backend_name(backend)
+            start = time.perf_counter()
+            try:
+                response = backend.response(messages=messages, **kwargs)
+            except Exception as e:
+                get_breaker(name).record_failure()
+                metrics.increment(f"model.{name}.errors")
+                error = e
+                continue
+            latency_ms = (time.perf_counter() - start) * 1000
+            get_breaker(name).record_success()
+            metrics.observe(f"model.{name}.latency_ms", latency_ms)
+            self._record(backend, latency_ms, hedged=False, failover=position > 0)
+            return response
+        raise ModelUnavailableError(f"Every model backend failed: {error}") from error
+
+    def response_stream(self, *args, **kwargs) -> Iterator[ModelResponse]:
+        # Streams are not hedged: the first open circuit serves the whole stream.
+        yield from self._available()[0].response_stream(*args, **kwargs)
+
+    async def aresponse_stream(self, *args, **kwargs) -> AsyncIterator[ModelResponse]:
+        async for chunk in self._available()[0].aresponse_stream(*args, **kwargs):
+            yield chunk
+
+    def get_system_message_for_model(self, tools: Optional[List[Any]] = None) -> Optional[str]:
+        return self.primary.get_system_message_for_model(tools)
+
+    def get_instructions_for_model(self, tools: Optional[List[Any]] = None) -> Optional[List[str]]:
+        return self.primary.get_instructions_for_model(tools)
+
+    def invoke(self, *args, **kwargs) -> Any:
+        return self.primary.invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs) -> Any:
+        return await self.primary.ainvoke(*args, **kwargs)
+
+    def invoke_stream(self, *args, **kwargs) -> Iterator[Any]:
+        return self.primary.invoke_stream(*args, **kwargs)
+
+    async def ainvoke_stream(self, *args, **kwargs) -> AsyncIterator[Any]:
+        async for chunk in self.primary.ainvoke_stream(*args, **kwargs):
+            yield chunk
+
+    def parse_provider_response(self, response: Any, **kwargs) -> ModelResponse:
+        return self.primary.parse_provider_response(response, **kwargs)
+
+    def parse_provider_response_delta(self, response: Any) -> ModelResponse:
+        return self.primary.parse_provider_response_delta(response)
+
+
+def get_routed_model(groq_api_key: Optional[str] = None, backends: str = MODEL_BACKENDS) -> Model:
+    from app.agents.replay import AGENT_REPLAY_MODE, REPLAY, ReplayModel
+
+    if AGENT_REPLAY_MODE == REPLAY:
+        # Recorded answers only: a replay never calls Groq or Gemini.
+        return ReplayModel()
+    return RoutedModel(backends=[build_backend(spec, groq_api_key) for spec in backends.split(",") if spec.strip()])
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Iterator, List, Optional, Tuple, Type, TypeVar
+
+from dotenv import load_dotenv
+from agno.models.base import Model
+from agno.models.message import Message
+from pydantic import BaseModel, ValidationError
+
+from app.monitoring import metrics
+from app.utils.deadline import check_deadline
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTPUT_REPAIR_ENABLED = os.getenv("OUTPUT_REPAIR_ENABLED", "true").lower() == "true"
+OUTPUT_REPAIR_MAX_CHARS = int(os.getenv("OUTPUT_REPAIR_MAX_CHARS", 4000))
+# Balanced objects tried per output before giving up (prose such as "{ver abaixo}" can precede the real one).
+MAX_JSON_CANDIDATES = 3
+
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL | re.IGNORECASE)
+_FENCE = re.compile(r"```[a-zA-Z]*")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+M = TypeVar("M", bound=BaseModel)
+
+REPAIR_PROMPT = (
+    "You fix malformed model output. Reply with a single JSON object that matches the JSON schema below, "
+    "using only the information in the user's text. No prose, no markdown, no reasoning.\n"
+    "Schema: {schema}"
+)
+
+
+class OutputParseError(ValueError):
+    pass
+
+
+def strip_reasoning(text: str) -> str:
+    """Drop `<think>` blocks and markdown fences; what is left is the answer the model meant to give."""
+    text = _THINK_BLOCK.sub("", text)
+    # Some providers drop the opening tag and only the closing one survives.
+    if "</think>" in text.lower():
+        text = re.split(r"</think>", text, flags=re.IGNORECASE)[-1]
+    return _FENCE.sub("", text)
+
+
+def iter_json_objects(text: str) -> Iterator[str]:
+    """
+    Yield the balanced `{...}` spans of `text` in one left-to-right pass.
+
+    Strings (double- or single-quoted) are skipped so braces inside them do not count. An
+    object still open at the end of the text (a truncated completion) is yielded with its
+    strings and brackets closed.
+    """
+    start = None
+    closers: List[str] = []
+    quote = None
+    escaped = False
+    for i, ch in enumerate(text):
+        if start is None:
+            if ch == "{":
+                start, closers = i, ["}"]
+            continue
+        if quote is not None:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+            continue
+        if ch in "\"'":
+            quote = ch
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]" and closers and ch == closers[-1]:
+            closers.pop()
+            if not closers:
+                yield text[start:i + 1]
+                start = None
+    if start is not None:
+        yield text[start:] + (quote or "") + "".join(reversed(closers))
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the defects models commonly emit: single-quoted strings, trailing commas,
+    Python literals (True/False/None), unquoted keys and typographic quotes.
+    """
+    text = text.translate(_SMART_QUOTES)
+    out: List[str] = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            j, chars = i + 1, []
+            while j < n and text[j] != ch:
+                if text[j] == "\\" and j + 1 < n:
+                    # \' is not a valid JSON escape; everything else is kept as written.
+                    chars.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            out.append('"' + "".join(chars) + '"')
+            i = j + 1
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j >= n or text[j] not in "}]":
+                out.append(ch)
+            i += 1
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k].isspace():
+                k += 1
+            if k < n and text[k] == ":":
+                out.append(f'"{word}"')
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def parse_output(text: str, schema: Type[M]) -> Tuple[M, bool]:
+    """
+    Extract and validate the first JSON object of `text` against `schema`, without calling a model.
+
+    Returns the validated object and whether it needed a local repair. Raises OutputParseError
+    when no candidate validates, even after repair.
+    """
+    errors = []
+    for index, candidate in enumerate(iter_json_objects(strip_reasoning(text))):
+        if index >= MAX_JSON_CANDIDATES:
+            break
+        for repaired, source in ((False, candidate), (True, repair_json(candidate))):
+            try:
+                return schema.model_validate(json.loads(source, strict=False)), repaired
+            except (ValueError, ValidationError) as e:
+                errors.append(e)
+    raise OutputParseError(f"No valid {schema.__name__} in model output: {errors[-1] if errors else 'no JSON object found'}")
+
+
+async def repair_with_model(model: Model, text: str, schema: Type[M]) -> M:
+    """
+    One short schema-constrained call that rewrites `text` as a valid `schema` object.
+
+    The call carries only the schema and the broken output (no tools, history or knowledge
+    base), so it costs a fraction of re-running the agent.
+    """
+    check_deadline("output_repair")
+    messages = [
+        Message(role="system", content=REPAIR_PROMPT.format(schema=json.dumps(schema.model_json_schema()))),
+        Message(role="user", content=strip_reasoning(text).strip()[:OUTPUT_REPAIR_MAX_CHARS]),
+    ]
+    start = time.perf_counter()
+    # JSON mode on Groq; the other backends ignore a dict response_format and follow the prompt.
+    response = await model.aresponse(messages=messages, response_format={"type": "json_object"})
+    metrics.observe("output.repair_call.latency_ms", (time.perf_counter() - start) * 1000)
+    obj, _ = parse_output(response.content or "", schema)
+    return obj
+
+
+async def extract_output(model: Optional[Model], text: Optional[str], schema: Type[M]) -> M:
+    """
+    Validated `schema` object from an agent's output: local extraction and repair first, a
+    repair call to `model` only when that fails. Outcomes are counted under `output.*`.
+    """
+    name = schema.__name__
+    try:
+        obj, repaired = parse_output(text or "", schema)
+    except OutputParseError as e:
+        if not OUTPUT_REPAIR_ENABLED or model is None or not text:
+            _count(name, "failed")
+            raise
+        logger.warning(f"{e}. Asking the model for a repaired {name}.")
+        _count(name, "repair_call")
+        try:
+            obj = await repair_with_model(model, text, schema)
+        except OutputParseError:
+            _count(name, "failed")
+            raise
+        return obj
+    _count(name, "repaired" if repaired else "clean")
+    return obj
+
+
+def _count(schema_name: str, outcome: str) -> None:
+    metrics.increment(f"output.{outcome}")
+    metrics.increment(f"output.{schema_name}.{outcome}")
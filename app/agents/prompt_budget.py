@@ -0,0 +1,306 @@
+import os
+import re
+import math
+import logging
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from agno.memory.v2.memory import Memory
+from agno.memory.v2.schema import UserMemory
+from agno.models.message import Message
+
+from app.agents.replay import replayed_references
+from app.monitoring import metrics
+from app.storage.memory_index import MEMORY_TOP_K, UserMemoryIndex
+from app.utils.deadline import check_deadline
+from app.utils.text import tokenize
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+MIN_TRUNCATED_TOKENS = 48
+CANDIDATE_MULTIPLIER = 3
+
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_END = re.compile(r"[.!?;:]\s")
+TRUNCATION_MARKER = " [...]"
+
+
+_tokenizer = None
+
+
+def read_tokenizer():
+    """Read the `tokenizer.json` at PROMPT_TOKENIZER. Local file only: nothing is downloaded."""
+    if Tokenizer is None or not PROMPT_TOKENIZER:
+        return None
+    if not os.path.isfile(PROMPT_TOKENIZER):
+        logger.warning(f"Tokenizer file '{PROMPT_TOKENIZER}' not found, using approximate token counts.")
+        return None
+    try:
+        return Tokenizer.from_file(PROMPT_TOKENIZER)
+    except Exception as e:
+        logger.warning(f"Tokenizer '{PROMPT_TOKENIZER}' unavailable, using approximate token counts: {e}")
+        return None
+
+
+async def load_tokenizer() -> bool:
+    """Read the tokenizer off the event loop. Until it is loaded, token counts are approximate."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = await asyncio.to_thread(read_tokenizer)
+    return _tokenizer is not None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    # BPE vocabularies average ~1.3 tokens per word on Portuguese/English clinical text.
+    return math.ceil(len(_APPROX_TOKEN.findall(text)) * 1.3)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to fit `max_tokens`, preferring to end on a sentence boundary."""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    max_tokens -= count_tokens(TRUNCATION_MARKER)
+    cut = text[: max(1, int(len(text) * max_tokens / total))]
+    while cut and count_tokens(cut) > max_tokens:
+        cut = cut[: int(len(cut) * 0.9)]
+    boundaries = [match.end() for match in _SENTENCE_END.finditer(cut)]
+    if boundaries and boundaries[-1] > len(cut) // 2:
+        cut = cut[: boundaries[-1]]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def relevance(query_terms: set, text: str) -> float:
+    terms = tokenize(text)
+    if not terms or not query_terms:
+        return 0.0
+    return sum(1 for term in terms if term in query_terms) / math.sqrt(len(terms))
+
+
+@dataclass
+class PromptBudget:
+    """Per-agent prompt budget, in tokens. `static_tokens` is the measured instruction block."""
+    total_tokens: int
+    history_tokens: int
+    static_tokens: int = 0
+    memory_tokens: int = 400
+
+    def measure_static(self, *parts: str) -> "PromptBudget":
+        self.static_tokens = sum(count_tokens(part) for part in parts)
+        return self
+
+
+@dataclass
+class BudgetReport:
+    agent: str
+    query: str
+    budget: int
+    system_tokens: int = 0
+    user_tokens: int = 0
+    history_tokens: int = 0
+    memory_tokens: int = 0
+    knowledge_tokens: int = 0
+    history_turns_kept: int = 0
+    history_turns_dropped: int = 0
+    memories_kept: int = 0
+    memories_dropped: int = 0
+    chunks_kept: int = 0
+    chunks_truncated: int = 0
+    chunks_dropped: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.system_tokens + self.user_tokens + self.history_tokens + self.memory_tokens + self.knowledge_tokens
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.budget - self.total)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("query")
+        data["total_tokens"] = self.total
+        return data
+
+
+_current_report: contextvars.ContextVar[Optional[BudgetReport]] = contextvars.ContextVar(
+    "prompt_budget_report", default=None
+)
+
+
+def current_report() -> Optional[BudgetReport]:
+    return _current_report.get()
+
+
+@contextmanager
+def track_prompt(agent, query: str):
+    """Collect the token breakdown of one agent run and record it when the run ends."""
+    budget: Optional[PromptBudget] = getattr(agent.memory, "budget", None)
+    if budget is None:
+        yield None
+        return
+
+    report = BudgetReport(
+        agent=agent.name,
+        query=query,
+        budget=budget.total_tokens,
+        system_tokens=budget.static_tokens,
+        user_tokens=count_tokens(query),
+    )
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+        logger.info(f"Prompt budget for '{agent.name}': {report.as_dict()}")
+        metrics.observe(f"prompt_tokens.{agent.name}", report.total)
+        metrics.observe(f"prompt_tokens.{agent.name}.knowledge", report.knowledge_tokens)
+        metrics.observe(f"prompt_tokens.{agent.name}.history", report.history_tokens)
+        metrics.observe(f"prompt_tokens.{agent.name}.memories", report.memory_tokens)
+
+
+def pack(
+    items: List[Tuple[float, str, Any]],
+    budget: int,
+    allow_truncate: bool = True,
+    max_items: Optional[int] = None,
+) -> Tuple[List[Tuple[str, Any]], int, int, int]:
+    """
+    Greedily pack `(score, text, payload)` items, best score first, into `budget` tokens.
+
+    An item that does not fit is truncated when `allow_truncate` and enough budget is left
+    for a useful fragment, otherwise dropped. Returns (kept, used_tokens, truncated, dropped).
+    """
+    kept: List[Tuple[str, Any]] = []
+    used = truncated = dropped = 0
+    for _, text, payload in sorted(items, key=lambda item: item[0], reverse=True):
+        tokens = count_tokens(text)
+        left = budget - used
+        if max_items is not None and len(kept) >= max_items:
+            dropped += 1
+        elif tokens <= left:
+            kept.append((text, payload))
+            used += tokens
+        elif allow_truncate and left >= MIN_TRUNCATED_TOKENS:
+            text = truncate_to_tokens(text, left)
+            kept.append((text, payload))
+            used += count_tokens(text)
+            truncated += 1
+        else:
+            dropped += 1
+    return kept, used, truncated, dropped
+
+
+class BudgetedMemory(Memory):
+    """
+    agno Memory whose history is ranked by relevance to the current query and packed into a budget.
+
+    During a tracked run, the user memories put in the system message are also narrowed to
+    the `top_k` best for the query (by `index`: similarity and recency) that fit `budget.memory_tokens`.
+    """
+
+    def __init__(self, *args, budget: PromptBudget, top_k: int = MEMORY_TOP_K, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+        self.top_k = top_k
+        self.index = UserMemoryIndex()
+
+    def get_user_memories(self, user_id: Optional[str] = None, refresh_from_db: bool = True) -> List[UserMemory]:
+        memories = super().get_user_memories(user_id=user_id, refresh_from_db=refresh_from_db)
+        report = current_report()
+        if report is None or not memories:
+            return memories
+
+        start = time.perf_counter()
+        ranked = self.index.top_k(user_id or "default", memories, report.query, self.top_k)
+        items = [(score, memory.memory, memory) for score, memory in ranked]
+        kept, used, _, _ = pack(items, self.budget.memory_tokens, allow_truncate=False)
+        metrics.observe("user_memories.rank_ms", (time.perf_counter() - start) * 1000)
+
+        report.memory_tokens = used
+        report.memories_kept = len(kept)
+        report.memories_dropped = len(memories) - len(kept)
+        return [memory for _, memory in kept]
+
+    def get_messages_from_last_n_runs(self, *args, **kwargs) -> List[Message]:
+        messages = super().get_messages_from_last_n_runs(*args, **kwargs)
+        report = current_report()
+
+        turns: List[List[Message]] = []
+        for message in messages:
+            if message.role == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        if not turns:
+            return messages
+
+        query_terms = set(tokenize(report.query)) if report else set()
+        items = []
+        for position, turn in enumerate(turns):
+            text = "\n".join(str(message.content or "") for message in turn)
+            recency = (position + 1) / len(turns)
+            items.append((relevance(query_terms, text) + recency, text, position))
+
+        # Whole turns only: half a user/assistant exchange confuses the model more than it helps.
+        kept, used, _, dropped = pack(items, self.budget.history_tokens, allow_truncate=False)
+        kept_positions = {position for _, position in kept}
+
+        if report is not None:
+            report.history_tokens = used
+            report.history_turns_kept = len(kept)
+            report.history_turns_dropped = dropped
+        return [message for position, turn in enumerate(turns) if position in kept_positions for message in turn]
+
+
+def make_budgeted_retriever(budget: PromptBudget, num_documents: int = 5):
+    """Build an agno `retriever` that ranks knowledge chunks and packs them into what is left of the budget."""
+
+    def retriever(agent, query: str, num_documents: Optional[int] = num_documents, **kwargs) -> Optional[List[Dict]]:
+        report = current_report()
+        recorded = replayed_references()
+        if recorded is not None:
+            return recorded or None
+        if agent.knowledge is None:
+            return None
+        check_deadline("retrieval")
+        docs = agent.knowledge.search(query=query, num_documents=(num_documents or 5) * CANDIDATE_MULTIPLIER)
+        if not docs:
+            return None
+
+        query_terms = set(tokenize(query))
+        items = [
+            (relevance(query_terms, doc.content) + 1 / (rank + 1), doc.content, doc.to_dict())
+            for rank, doc in enumerate(docs)
+        ]
+        available = report.remaining if report else (
+            budget.total_tokens - budget.static_tokens - budget.history_tokens - budget.memory_tokens
+        )
+        kept, used, truncated, dropped = pack(items, available, max_items=num_documents)
+
+        if report is not None:
+            report.knowledge_tokens = used
+            report.chunks_kept = len(kept)
+            report.chunks_truncated = truncated
+            report.chunks_dropped = dropped
+        return [{**payload, "content": text} for text, payload in kept]
+
+    return retriever
@@ -0,0 +1,317 @@
+import os
+import gzip
+import hmac
+import json
+import stat
+import time
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from agno.agent import Agent, RunResponse
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from app.agents.model_router import ModelUnavailableError
+from app.monitoring import metrics
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+AGENT_REPLAY_MODE = os.getenv("AGENT_REPLAY_MODE", OFF).lower()
+AGENT_REPLAY_FILE = os.getenv("AGENT_REPLAY_FILE", "recordings/agent_traffic.jsonl.gz")
+# Key of the user pseudonyms in recordings; unset, a random one per process (pseudonyms then differ between runs).
+AGENT_REPLAY_USER_SALT = os.getenv("AGENT_REPLAY_USER_SALT") or secrets.token_hex(16)
+# 0 serves recordings immediately; 1.0 sleeps for the recorded model latency (realistic load tests).
+AGENT_REPLAY_LATENCY_SCALE = float(os.getenv("AGENT_REPLAY_LATENCY_SCALE", 0))
+
+
+class ReplayMissError(ModelUnavailableError):
+    pass
+
+
+def interaction_key(agent_name: str, message: str) -> str:
+    """Content hash a recording is served by: the agent and the exact input message."""
+    return hashlib.sha256(f"{agent_name}\0{message}".encode("utf-8")).hexdigest()[:32]
+
+
+def pseudonymize(user_id: Optional[str]) -> Optional[str]:
+    """Stable stand-in for `user_id` in recordings, so the same user's runs still group together."""
+    if user_id is None:
+        return None
+    return hmac.new(AGENT_REPLAY_USER_SALT.encode("utf-8"), str(user_id).encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+def private_directory(path: Path) -> Path:
+    """
+    `path`, created 0700. Recordings hold the users' complaints (PHI), so it must be a real
+    directory owned by this user that nobody else can read or write. PermissionError otherwise.
+    """
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = path.lstat()
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise PermissionError(
+            f"Recording directory '{path}' must be a directory owned by this user and private to it (0700)."
+        )
+    return path
+
+
+@dataclass
+class Recording:
+    key: str
+    agent: str
+    stage: str
+    priority: str
+    message: str
+    session_id: Optional[str]
+    user_id: Optional[str]
+    started_at: float
+    latency_ms: float
+    content: Optional[str]
+    references: List[Any] = field(default_factory=list)
+    # Model input without the system prompt, which is the same for every run of an agent.
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    system_sha: Optional[str] = None
+
+
+def recording_from_run(
+    agent: Agent, stage: str, priority: str, message: str, session_id: Optional[str], user_id: Optional[str],
+    response: RunResponse, started_at: float, latency_ms: float
+) -> Recording:
+    messages, system_sha = [], None
+    for item in response.messages or []:
+        if item.role == "system":
+            system_sha = hashlib.sha256(str(item.content).encode("utf-8")).hexdigest()[:16]
+        else:
+            messages.append({"role": item.role, "content": item.get_content_string()})
+    references = []
+    extra_data = response.extra_data
+    for reference in (extra_data.references or []) if extra_data is not None else []:
+        references.extend(reference.references or [])
+    return Recording(
+        key=interaction_key(agent.name, message),
+        agent=agent.name,
+        stage=stage,
+        priority=priority,
+        message=message,
+        session_id=session_id,
+        user_id=pseudonymize(user_id),
+        started_at=started_at,
+        latency_ms=round(latency_ms, 1),
+        content=response.content if isinstance(response.content, str) else json.dumps(response.content, default=str),
+        references=references,
+        messages=messages,
+        system_sha=system_sha,
+    )
+
+
+class RecordingFile:
+    """
+    Append-only, gzip-compressed JSON lines. Every append is its own gzip member, so the file
+    stays readable after a crash and several processes can append to their own files. The file
+    is created 0600 in a private directory (see `private_directory`).
+    """
+
+    def __init__(self, path: str = AGENT_REPLAY_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def append(self, recording: Recording) -> None:
+        line = json.dumps(asdict(recording), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            private_directory(self.path.parent)
+            descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            with os.fdopen(descriptor, "ab") as raw, gzip.GzipFile(fileobj=raw, mode="ab") as file:
+                file.write(line.encode("utf-8"))
+
+    def __iter__(self) -> Iterator[Recording]:
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield Recording(**json.loads(line))
+
+
+class ReplayStore:
+    """
+    Recordings grouped by content hash. The n-th run with a given key gets the n-th recording
+    of that key (cycling when the replay repeats a key more often than it was recorded), so a
+    replay in the recorded order is deterministic.
+    """
+
+    def __init__(self, recordings: Iterator[Recording]):
+        self.recordings: Dict[str, List[Recording]] = defaultdict(list)
+        for recording in recordings:
+            self.recordings[recording.key].append(recording)
+        self._served: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(recordings) for recordings in self.recordings.values())
+
+    def claim(self, agent_name: str, message: str) -> Recording:
+        key = interaction_key(agent_name, message)
+        with self._lock:
+            candidates = self.recordings.get(key)
+            if not candidates:
+                metrics.increment("replay.misses")
+                raise ReplayMissError(f"No recording for '{agent_name}' with input {message[:80]!r}.")
+            served = self._served[key]
+            self._served[key] += 1
+        if served >= len(candidates):
+            metrics.increment("replay.reused")
+        metrics.increment("replay.served")
+        return candidates[served % len(candidates)]
+
+
+_store: Optional[ReplayStore] = None
+_store_lock = threading.Lock()
+_recording_file: Optional[RecordingFile] = None
+
+
+@dataclass
+class _ReplayRun:
+    recording: Recording
+    answered: bool = False
+
+
+_current_run: contextvars.ContextVar[Optional[_ReplayRun]] = contextvars.ContextVar("replay_run", default=None)
+
+
+def get_replay_store() -> ReplayStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ReplayStore(iter(RecordingFile(AGENT_REPLAY_FILE)))
+            logger.info(f"Loaded {len(_store)} agent recording(s) from '{AGENT_REPLAY_FILE}'.")
+        return _store
+
+
+def get_recording_file() -> RecordingFile:
+    global _recording_file
+    if _recording_file is None:
+        _recording_file = RecordingFile(AGENT_REPLAY_FILE)
+    return _recording_file
+
+
+@contextmanager
+def use_recording(recording: Recording):
+    token = _current_run.set(_ReplayRun(recording))
+    try:
+        yield recording
+    finally:
+        _current_run.reset(token)
+
+
+def replayed_references() -> Optional[List[Any]]:
+    """Chunks the recorded run retrieved, when the current run is a replay; None otherwise."""
+    run = _current_run.get()
+    return None if run is None else list(run.recording.references)
+
+
+def _next_answer() -> Optional[Recording]:
+    """The recording to answer with, once per replayed run; None for every later model call."""
+    run = _current_run.get()
+    if run is None or run.answered:
+        return None
+    run.answered = True
+    return run.recording
+
+
+async def run_agent(
+    agent: Agent, message: str, session_id: Optional[str], user_id: str, stage: str, priority: str
+) -> RunResponse:
+    """`agent.arun`, recorded or replayed according to AGENT_REPLAY_MODE."""
+    if AGENT_REPLAY_MODE == REPLAY:
+        with use_recording(get_replay_store().claim(agent.name, message)):
+            return await agent.arun(message=message, session_id=session_id, user_id=user_id)
+
+    started_at = time.time()
+    start = time.perf_counter()
+    response: RunResponse = await agent.arun(message=message, session_id=session_id, user_id=user_id)
+    if AGENT_REPLAY_MODE == RECORD:
+        recording = recording_from_run(
+            agent, stage, priority, message, session_id, user_id, response, started_at, (time.perf_counter() - start) * 1000
+        )
+        try:
+            await asyncio.to_thread(get_recording_file().append, recording)
+            metrics.increment("replay.recorded")
+        except Exception as e:
+            logger.error(f"Could not record the '{stage}' run: {e}")
+    return response
+
+
+@dataclass
+class ReplayModel(Model):
+    """
+    Stand-in for the model backends in replay mode. The first call of a replayed run answers
+    with the recorded content; later calls of the same run (memory extraction) get an empty
+    answer, so replays never reach Groq or Gemini.
+    """
+
+    id: str = "replay"
+    name: str = "Replay"
+    provider: str = "Replay"
+    latency_scale: float = AGENT_REPLAY_LATENCY_SCALE
+
+    async def aresponse(self, messages: List[Message], **kwargs) -> ModelResponse:
+        return self._answer(messages, await self._anext_answer())
+
+    def response(self, messages: List[Message], **kwargs) -> ModelResponse:
+        return self._answer(messages, _next_answer())
+
+    async def _anext_answer(self) -> Optional[Recording]:
+        recording = _next_answer()
+        if recording is not None and self.latency_scale > 0:
+            await asyncio.sleep(recording.latency_ms * self.latency_scale / 1000)
+        return recording
+
+    def _answer(self, messages: Optional[List[Message]], recording: Optional[Recording]) -> ModelResponse:
+        """The recorded answer; appended to `messages` unless None (agno's own loop appends it)."""
+        content = recording.content or "" if recording is not None else ""
+        if messages is not None:
+            messages.append(Message(role="assistant", content=content))
+        return ModelResponse(role="assistant", content=content)
+
+    def response_stream(self, messages: List[Message], **kwargs) -> Iterator[ModelResponse]:
+        yield self.response(messages, **kwargs)
+
+    async def aresponse_stream(self, messages: List[Message], **kwargs) -> AsyncIterator[ModelResponse]:
+        yield await self.aresponse(messages, **kwargs)
+
+    # The provider-level calls, for agno's base response loop: it adds the assistant message itself.
+    def invoke(self, *args, **kwargs) -> ModelResponse:
+        return self._answer(None, _next_answer())
+
+    async def ainvoke(self, *args, **kwargs) -> ModelResponse:
+        return self._answer(None, await self._anext_answer())
+
+    def invoke_stream(self, *args, **kwargs) -> Iterator[ModelResponse]:
+        yield self.invoke(*args, **kwargs)
+
+    async def ainvoke_stream(self, *args, **kwargs) -> AsyncIterator[ModelResponse]:
+        yield await self.ainvoke(*args, **kwargs)
+
+    def parse_provider_response(self, response: Any, **kwargs) -> ModelResponse:
+        return response if isinstance(response, ModelResponse) else ModelResponse(content=str(response))
+
+    def parse_provider_response_delta(self, response: Any) -> ModelResponse:
+        return self.parse_provider_response(response)
@@ -1,7 +1,9 @@
 import logging
+from functools import lru_cache
 
 from decouple import config
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
 
@@ -10,10 +12,23 @@ logger = logging.getLogger(__name__)
 
 DB_URL = config('DB_URL')
 
-try: 
-    engine = create_engine(DB_URL, pool_pre_ping=True)
-    Session = sessionmaker(bind=engine)
-    logger.info(f"Database connection established successfully: {DB_URL}")
-except Exception as e:
-    logger.error(f"Error connecting to database: {e}")
-    raise 
+
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """Create the engine on first use instead of at import, so importing the app stays cheap."""
+    try:
+        engine = create_engine(DB_URL, pool_pre_ping=True)
+        logger.info("Database engine created.")
+        return engine
+    except Exception as e:
+        logger.error(f"Error connecting to database: {e}")
+        raise
+
+
+@lru_cache(maxsize=1)
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(bind=get_engine())
+
+
+def Session():
+    return get_sessionmaker()()
@@ -0,0 +1,86 @@
+import select
+import logging
+import threading
+from typing import Callable, Optional
+
+from decouple import config
+from sqlalchemy import func
+from sqlalchemy import select as sql_select
+from sqlalchemy.engine import Connection
+
+from app.db.connection import get_engine
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LISTEN_POLL_SECONDS = config('LISTEN_POLL_SECONDS', default=5.0, cast=float)
+LISTEN_RETRY_SECONDS = config('LISTEN_RETRY_SECONDS', default=5.0, cast=float)
+
+
+def notify(channel: str, payload: str = "", connection: Optional[Connection] = None) -> None:
+    """Postgres NOTIFY; inside `connection`'s transaction it is only delivered on commit."""
+    statement = sql_select(func.pg_notify(channel, payload))
+    if connection is not None:
+        connection.execute(statement)
+        return
+    with get_engine().begin() as own_connection:
+        own_connection.execute(statement)
+
+
+class PgListener:
+    """
+    LISTEN on a Postgres channel from a daemon thread, on a dedicated connection taken out
+    of the engine's pool. `callback(payload)` runs on that thread for every notification,
+    and with `None` after each (re)connect, since notifications sent while disconnected
+    are lost and the caller has to catch up on its own.
+    """
+
+    def __init__(self, channel: str, callback: Callable[[Optional[str]], None]):
+        self.channel = channel
+        self.callback = callback
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "PgListener":
+        self._thread = threading.Thread(target=self._run, name=f"listen-{self.channel}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _connect(self):
+        raw = get_engine().raw_connection()
+        raw.detach()
+        connection = raw.driver_connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                logger.info(f"Listening for notifications on '{self.channel}'.")
+                self._dispatch(None)
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._dispatch(connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.warning(f"Listener on '{self.channel}' lost its connection: {e}")
+                self._stop.wait(LISTEN_RETRY_SECONDS)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def _dispatch(self, payload: Optional[str]) -> None:
+        try:
+            self.callback(payload)
+        except Exception as e:
+            logger.error(f"Notification handler for '{self.channel}' failed: {e}", exc_info=True)
@@ -0,0 +1,194 @@
+import re
+import logging
+import datetime
+from dataclasses import dataclass
+
+from decouple import config
+from sqlalchemy import text
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AGENT_SCHEMA = "ai"
+
+SESSION_RETENTION_DAYS = config('SESSION_RETENTION_DAYS', default=30, cast=int)
+MEMORY_RETENTION_WEEKS = config('MEMORY_RETENTION_WEEKS', default=4, cast=int)
+PARTITION_LOOKAHEAD = config('PARTITION_LOOKAHEAD', default=7, cast=int)
+# How long a non-concurrent DETACH may wait for its lock before giving up until the next run.
+PARTITION_LOCK_TIMEOUT = config('PARTITION_LOCK_TIMEOUT', default='5s')
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    table_name: str
+    interval: str           # "day" or "week"
+    epoch_key: bool         # True when the partition key is a BIGINT unix timestamp
+    retention: int          # number of intervals kept before a partition is dropped
+
+
+PARTITIONED_TABLES = [
+    PartitionSpec("agent_sessions", "day", True, SESSION_RETENTION_DAYS),
+    PartitionSpec("symptom_analyzer_memories", "week", False, MEMORY_RETENTION_WEEKS),
+    PartitionSpec("clinical_protocol_memories", "week", False, MEMORY_RETENTION_WEEKS),
+]
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{8})$")
+
+
+def interval_start(spec: PartitionSpec, day: datetime.date) -> datetime.date:
+    if spec.interval == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def interval_step(spec: PartitionSpec) -> datetime.timedelta:
+    return datetime.timedelta(weeks=1) if spec.interval == "week" else datetime.timedelta(days=1)
+
+
+def partition_name(spec: PartitionSpec, start: datetime.date) -> str:
+    return f"{spec.table_name}_p{start:%Y%m%d}"
+
+
+def _bound(spec: PartitionSpec, day: datetime.date) -> str:
+    midnight = datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+    if spec.epoch_key:
+        return str(int(midnight.timestamp()))
+    return f"'{midnight.isoformat()}'"
+
+
+def _day(spec: PartitionSpec, value) -> datetime.date:
+    if spec.epoch_key:
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).date()
+    return value.astimezone(datetime.timezone.utc).date()
+
+
+def default_partition_name(spec: PartitionSpec) -> str:
+    return f"{spec.table_name}_default"
+
+
+def has_default_partition(connection, spec: PartitionSpec) -> bool:
+    return connection.execute(
+        text("SELECT to_regclass(:name)"), {"name": f"{AGENT_SCHEMA}.{default_partition_name(spec)}"}
+    ).scalar() is not None
+
+
+def create_partitions(connection, spec: PartitionSpec, first_day: datetime.date, last_day: datetime.date) -> int:
+    """Create every missing partition covering [first_day, last_day]. Returns how many were created."""
+    created = 0
+    step = interval_step(spec)
+    start = interval_start(spec, first_day)
+    while start <= last_day:
+        end = start + step
+        name = partition_name(spec, start)
+        exists = connection.execute(
+            text("SELECT to_regclass(:name)"), {"name": f"{AGENT_SCHEMA}.{name}"}
+        ).scalar()
+        if exists is None:
+            connection.execute(text(
+                f"CREATE TABLE {AGENT_SCHEMA}.{name} PARTITION OF {AGENT_SCHEMA}.{spec.table_name} "
+                f"FOR VALUES FROM ({_bound(spec, start)}) TO ({_bound(spec, end)})"
+            ))
+            created += 1
+        start = end
+    return created
+
+
+def list_partitions(connection, spec: PartitionSpec) -> list[tuple[str, datetime.date]]:
+    rows = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "JOIN pg_namespace ns ON parent.relnamespace = ns.oid "
+        "WHERE ns.nspname = :schema AND parent.relname = :table"
+    ), {"schema": AGENT_SCHEMA, "table": spec.table_name}).fetchall()
+
+    partitions = []
+    for (name,) in rows:
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((name, datetime.datetime.strptime(match.group(1), "%Y%m%d").date()))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def drain_default_partition(connection, spec: PartitionSpec) -> int:
+    """
+    Move rows out of the DEFAULT partition into range partitions. Returns how many were moved.
+
+    Rows only land there when their range partition did not exist yet (maintenance lapsed
+    past the lookahead). Left there, they make creating that partition fail and are never
+    dropped by retention. Runs inside the caller's transaction: the default partition is
+    detached, the missing partitions are created, the rows re-inserted through the parent
+    and the emptied default attached again.
+    """
+    if not has_default_partition(connection, spec):
+        return 0
+    parent = f"{AGENT_SCHEMA}.{spec.table_name}"
+    default = f"{AGENT_SCHEMA}.{default_partition_name(spec)}"
+    oldest, newest, count = connection.execute(
+        text(f"SELECT min(created_at), max(created_at), count(*) FROM {default}")
+    ).one()
+    if not count:
+        return 0
+    logger.warning(
+        f"{count} row(s) of '{spec.table_name}' landed in its DEFAULT partition "
+        f"({oldest} to {newest}); partition maintenance lapsed. Moving them into range partitions."
+    )
+    connection.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {default}"))
+    create_partitions(connection, spec, _day(spec, oldest), _day(spec, newest))
+    connection.execute(text(f"INSERT INTO {parent} SELECT * FROM {default}"))
+    connection.execute(text(f"TRUNCATE TABLE {default}"))
+    connection.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {default} DEFAULT"))
+    return count
+
+
+def drop_expired_partitions(connection, spec: PartitionSpec, today: datetime.date) -> list[str]:
+    """
+    Enforce retention by detaching, then dropping, whole partitions that ended before the cutoff.
+
+    Needs an autocommit connection. Without a DEFAULT partition the detach is CONCURRENTLY
+    and never blocks reads or writes on the parent. Postgres refuses a concurrent detach
+    while a DEFAULT partition exists, so then a plain detach runs under
+    `PARTITION_LOCK_TIMEOUT`: on a busy parent it gives up and the next run retries, instead
+    of queueing every write behind its ACCESS EXCLUSIVE lock.
+    """
+    cutoff = interval_start(spec, today) - interval_step(spec) * spec.retention
+    expired = [name for name, start in list_partitions(connection, spec) if start + interval_step(spec) <= cutoff]
+    if not expired:
+        return []
+    concurrently = not has_default_partition(connection, spec)
+    if not concurrently:
+        connection.execute(text(f"SET lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+    dropped = []
+    try:
+        for name in expired:
+            connection.execute(text(
+                f"ALTER TABLE {AGENT_SCHEMA}.{spec.table_name} DETACH PARTITION {AGENT_SCHEMA}.{name}"
+                f"{' CONCURRENTLY' if concurrently else ''}"
+            ))
+            connection.execute(text(f"DROP TABLE IF EXISTS {AGENT_SCHEMA}.{name}"))
+            dropped.append(name)
+    finally:
+        if not concurrently:
+            connection.execute(text("RESET lock_timeout"))
+    return dropped
+
+
+def maintain_partitions(engine) -> None:
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    for spec in PARTITIONED_TABLES:
+        try:
+            with engine.begin() as connection:
+                moved = drain_default_partition(connection, spec)
+                created = create_partitions(
+                    connection, spec, today, today + interval_step(spec) * PARTITION_LOOKAHEAD
+                )
+            with engine.connect() as connection:
+                connection.execution_options(isolation_level="AUTOCOMMIT")
+                dropped = drop_expired_partitions(connection, spec, today)
+            logger.info(
+                f"Partition maintenance for '{spec.table_name}': {moved} row(s) moved out of the default partition, "
+                f"{created} created, {len(dropped)} dropped {dropped if dropped else ''}"
+            )
+        except Exception as e:
+            logger.error(f"Partition maintenance failed for '{spec.table_name}': {e}")
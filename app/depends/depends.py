@@ -1,11 +1,13 @@
 import logging
 
 from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.db.connection import Session as ss
 from app.auth.auth_user import UserUseCases
+from app.utils.deadline import Deadline
 
 
 oauth_scheme = OAuth2PasswordBearer(tokenUrl='/user/login')
@@ -35,3 +37,8 @@ def token_verifier(db_session: Session = Depends(get_db_session), token = Depend
     except Exception as e:
         logger.exception(f"Unexpected error while verifying token: {e}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
+
+
+def request_deadline(x_request_timeout: Optional[float] = Header(None, description="Seconds the client is willing to wait.")):
+    """Starts the request deadline; declared before the auth dependency so authentication counts against it."""
+    return Deadline.from_client(x_request_timeout)
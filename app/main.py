@@ -1,57 +1,159 @@
+import os
+import asyncio
 import logging
+import datetime
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 
 from app.routes.agents_routes import agent_router
 from app.routes.user_routes import user_router, test_router
-from app.storage.rag import load_pdf_knowledge_base
+from app.routes.metrics_routes import metrics_router
+from app.routes.admin_routes import admin_router
+from app.routes.cases_routes import cases_router
+from app.storage.kb_reload import (
+    KB_VERSION_CHANNEL, KB_WATCH_SECONDS, follow_active_version, sync_knowledge_base, watch_knowledge_base
+)
 from app.agents.symptom_analyzer import get_symptom_analyzer_agent
 from app.agents.clinical_protocol import get_clinical_protocol_agent
-from app.db.connection import Session as DbSessionGenerator
-from scripts.cleanup_memory import clear_agents_memory, scheduler
+from app.agents.prompt_budget import load_tokenizer
+from app.db.connection import Session as DbSessionGenerator, get_engine
+from app.db.notifications import PgListener
+from app.monitoring.readiness import FAILED, READY, readiness
+from app.storage.case_history import CASE_HISTORY_FLUSH_SECONDS, flush_case_history
+from app.storage.memory_writes import MEMORY_WRITE_FLUSH_SECONDS, flush_memory_writes, memory_writes
+from app.storage.session_cache import SESSION_CACHE_FLUSH_SECONDS, flush_session_cache, session_cache
+from app.utils.cluster import APP_ROLE, owns_ingestion
+from app.utils.http_pool import http_pool
+from app.utils.warmup import WARMUP_ENABLED, warm_up
+from scripts.cleanup_memory import rotate_agent_partitions, scheduler
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+STARTUP_MAX_ATTEMPTS = int(os.getenv("STARTUP_MAX_ATTEMPTS", 5))
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", 5))
+KB_LISTEN_ENABLED = os.getenv("KB_LISTEN_ENABLED", "true").lower() == "true"
+
+
+async def initialize_agents(app: FastAPI):
+    logger.info("Initializing Symptom Analyzer Agent...")
+    app.state.symptom_analyzer_agent = await get_symptom_analyzer_agent()
+    logger.info(f"Symptom Analyzer Agent initialized: {app.state.symptom_analyzer_agent is not None}")
+
+    logger.info("Initializing Clinical Protocol Agent...")
+    app.state.clinical_protocol_agent = await get_clinical_protocol_agent()
+    logger.info(f"Clinical Protocol Agent initialized: {app.state.clinical_protocol_agent is not None}")
+
+    if app.state.symptom_analyzer_agent is None or app.state.clinical_protocol_agent is None:
+        raise RuntimeError("One or both agents failed to initialize and are None.")
+
+
+async def start_component(component: str, start) -> bool:
+    """Run a startup step with exponential backoff, so a Qdrant or Postgres hiccup does not kill the boot."""
+    for attempt in range(1, STARTUP_MAX_ATTEMPTS + 1):
+        try:
+            await start()
+            readiness.set(component, READY)
+            logger.info(f"Startup step '{component}' is ready.")
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Startup step '{component}' failed (attempt {attempt}/{STARTUP_MAX_ATTEMPTS}): {e}", exc_info=True)
+            if attempt == STARTUP_MAX_ATTEMPTS:
+                readiness.set(component, FAILED, error=str(e))
+                return False
+            await asyncio.sleep(STARTUP_RETRY_SECONDS * 2 ** (attempt - 1))
+
+
+async def warm_up_services(app: FastAPI):
+    """Best-effort: whatever happens, the warm-up never keeps the service from becoming ready."""
+    if WARMUP_ENABLED and readiness.is_ready("agents"):
+        try:
+            engines = [get_engine(), session_cache.backend.db_engine]
+        except Exception as e:
+            logger.warning(f"Warm-up skips the database pools: {e}")
+            engines = []
+        await warm_up([app.state.symptom_analyzer_agent, app.state.clinical_protocol_agent], engines)
+    readiness.set("warmup", READY)
+
+
+async def follow_published_version():
+    """A process published a knowledge base version (or the listener reconnected): load it."""
+    if not readiness.is_ready("agents"):
+        return  # startup loads whatever is active once the agents are up
+    try:
+        await follow_active_version()
+        readiness.set("knowledge_base", READY)
+    except Exception as e:
+        logger.warning(f"Could not follow the published knowledge base version: {e}")
+
+
+def listen_for_versions() -> PgListener:
+    loop = asyncio.get_running_loop()
+    return PgListener(
+        KB_VERSION_CHANNEL, lambda payload: asyncio.run_coroutine_threadsafe(follow_published_version(), loop)
+    ).start()
+
+
+async def initialize_services(app: FastAPI):
+    # Before the agents, so their instruction blocks are measured with the real tokenizer.
+    await load_tokenizer()
+    if await start_component("agents", lambda: initialize_agents(app)):
+        # Workers never ingest: they wait for the version the supervisor publishes.
+        await start_component("knowledge_base", sync_knowledge_base if owns_ingestion() else follow_active_version)
+    await warm_up_services(app)
+    if readiness.ready:
+        logger.info("Agents and knowledge base loaded and ready!")
+    else:
+        logger.error(f"Application is live but not ready: {readiness.as_dict()}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application startup initiated...")
-    app.state.symptom_analyzer_agent = None  
+    app.state.symptom_analyzer_agent = None
     app.state.clinical_protocol_agent = None
 
     app.state.db_session_gen = DbSessionGenerator
-
-    logger.info("Starting lifespan: Loading knowledge base and agents...")
-    try:
-        await load_pdf_knowledge_base()
-        logger.info("Initializing Symptom Analyzer Agent...")
-        app.state.symptom_analyzer_agent = await get_symptom_analyzer_agent()
-        logger.info(f"Symptom Analyzer Agent initialized: {app.state.symptom_analyzer_agent is not None}")
-
-        logger.info("Initializing Clinical Protocol Agent...")
-        app.state.clinical_protocol_agent = await get_clinical_protocol_agent()
-        logger.info(f"Clinical Protocol Agent initialized: {app.state.clinical_protocol_agent is not None}")
-
-        if app.state.symptom_analyzer_agent is None or app.state.clinical_protocol_agent is None:
-            raise RuntimeError("One or both agents failed to initialize and are None.")
-        
-        scheduler.add_job(clear_agents_memory, 'interval', hours=24)
-        scheduler.start()
-        logger.info("Scheduler started. Memory cleanup job scheduled.")
-        
-        logger.info("Agents and knowledge base loaded and ready!")
-
-    except Exception as e:
-        logger.error(f"Error during application startup: {e}")
-        raise
+    readiness.reset()
+
+    if owns_ingestion():
+        scheduler.add_job(rotate_agent_partitions, 'interval', hours=24, next_run_time=datetime.datetime.now())
+    scheduler.add_job(flush_session_cache, 'interval', seconds=SESSION_CACHE_FLUSH_SECONDS)
+    scheduler.add_job(flush_case_history, 'interval', seconds=CASE_HISTORY_FLUSH_SECONDS)
+    scheduler.add_job(flush_memory_writes, 'interval', seconds=MEMORY_WRITE_FLUSH_SECONDS)
+    if KB_WATCH_SECONDS > 0:
+        scheduler.add_job(watch_knowledge_base, 'interval', seconds=KB_WATCH_SECONDS)
+    scheduler.start()
+    logger.info(f"Scheduler started (role '{APP_ROLE}'). Session, case history and memory flush and knowledge base watcher jobs scheduled.")
+    app.state.kb_listener = listen_for_versions() if KB_LISTEN_ENABLED else None
+
+    # Agents and the knowledge base load and warm up in the background; the server accepts
+    # requests (and answers liveness) right away and agent endpoints answer 503 until `readiness` is reached.
+    logger.info("Starting lifespan: Loading knowledge base and agents in the background...")
+    app.state.startup_task = asyncio.create_task(initialize_services(app))
 
     yield
 
     logger.info("Application shutdown initiated...")
+    if not app.state.startup_task.done():
+        app.state.startup_task.cancel()
+        await asyncio.gather(app.state.startup_task, return_exceptions=True)
     scheduler.shutdown()
     logger.info("Scheduler shut down.")
+    if app.state.kb_listener is not None:
+        app.state.kb_listener.stop()
+    flush_session_cache()
+    logger.info("Session cache flushed.")
+    flush_case_history()
+    logger.info("Case history flushed.")
+    flush_memory_writes()
+    logger.info(f"Agent memory writes flushed ({memory_writes.pending} change(s) left pending).")
+    await http_pool.aclose()
     logger.info("Application shutdown complete.")
 
 
@@ -71,6 +173,25 @@ async def health_check(request: Request):
             "clinical_protocol_agent_status": cp_status}
 
 
+@app.get('/health/live')
+async def liveness():
+    return {"status": "alive"}
+
+
+@app.get('/health/ready')
+async def readiness_check():
+    if readiness.ready:
+        return readiness.as_dict()
+    return JSONResponse(
+        content=readiness.as_dict(),
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(readiness.retry_after())}
+    )
+
+
 app.include_router(user_router)
 app.include_router(test_router)
 app.include_router(agent_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
+app.include_router(cases_router)
@@ -0,0 +1,58 @@
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Tuple
+
+
+WINDOW_SIZE = 1024
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+
+
+def increment(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    """Record a sample in a rolling window of the last `WINDOW_SIZE` observations."""
+    with _lock:
+        _samples[name].append(value)
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def quantile(name: str, q: float) -> Tuple[float, int]:
+    """The `q` quantile of the rolling window of `name` and how many samples it was computed from."""
+    with _lock:
+        values = list(_samples.get(name, ()))
+    return percentile(values, q), len(values)
+
+
+def summary(name: str) -> Dict[str, float]:
+    with _lock:
+        values = list(_samples.get(name, ()))
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def snapshot() -> Dict[str, Dict]:
+    with _lock:
+        counters = dict(_counters)
+        names = list(_samples)
+    return {
+        "counters": counters,
+        "summaries": {name: summary(name) for name in names},
+    }
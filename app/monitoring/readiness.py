@@ -0,0 +1,57 @@
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+
+READINESS_RETRY_AFTER_SECONDS = int(os.getenv("READINESS_RETRY_AFTER_SECONDS", 10))
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """
+    Startup state of the components that must be up before agent requests are served.
+
+    Liveness only says the process is running; readiness is reached once every component
+    reports READY. Until then agent endpoints answer 503 with `retry_after()` seconds.
+    """
+
+    def __init__(self, components: Iterable[str], retry_after_seconds: int = READINESS_RETRY_AFTER_SECONDS):
+        self.components = tuple(components)
+        self.retry_after_seconds = retry_after_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._status: Dict[str, str] = {name: STARTING for name in self.components}
+            self._errors: Dict[str, Optional[str]] = {name: None for name in self.components}
+
+    def set(self, component: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._status[component] = status
+            self._errors[component] = error
+
+    def is_ready(self, component: str) -> bool:
+        return self._status.get(component) == READY
+
+    @property
+    def ready(self) -> bool:
+        return all(status == READY for status in self._status.values())
+
+    def retry_after(self) -> int:
+        return self.retry_after_seconds
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": all(status == READY for status in self._status.values()),
+                "components": {
+                    name: {"status": status, "error": self._errors[name]} for name, status in self._status.items()
+                },
+            }
+
+
+readiness = Readiness(components=("agents", "knowledge_base", "warmup"))
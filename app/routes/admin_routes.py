@@ -0,0 +1,67 @@
+import os
+import asyncio
+import logging
+
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+
+from app.depends.depends import token_verifier
+from app.storage.kb_reload import get_active_version, request_reload, sync_knowledge_base
+from app.utils.cluster import owns_ingestion
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+admin_router = APIRouter(prefix='/admin')
+
+KB_ADMIN_USERS = {name.strip() for name in os.getenv("KB_ADMIN_USERS", "").split(",") if name.strip()}
+
+_reload_task = None
+
+
+async def get_admin_user(user: Annotated[dict, Depends(token_verifier)]):
+    if not user or user.get("sub") not in KB_ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
+
+
+@admin_router.post('/knowledge_base/reload')
+async def reload_knowledge_base(force: bool = False, user: dict = Depends(get_admin_user)):
+    """Ingest new or changed PDFs in the background; `force` rebuilds the whole collection."""
+    global _reload_task
+    if _reload_task is not None and not _reload_task.done():
+        return JSONResponse(content={"status": "running"}, status_code=status.HTTP_409_CONFLICT)
+
+    logger.info(f"Knowledge base reload requested by '{user.get('sub')}' (force={force}).")
+    if not owns_ingestion():
+        # Workers do not ingest: the supervisor does, and every worker then follows the new version.
+        await asyncio.to_thread(request_reload, force)
+        return JSONResponse(content={"status": "requested"}, status_code=status.HTTP_202_ACCEPTED)
+    _reload_task = asyncio.create_task(sync_knowledge_base(force=force))
+    return JSONResponse(content={"status": "started"}, status_code=status.HTTP_202_ACCEPTED)
+
+
+@admin_router.get('/knowledge_base')
+async def knowledge_base_status(user: dict = Depends(get_admin_user)):
+    active = await asyncio.to_thread(get_active_version)
+    reload_status = "idle"
+    result = None
+    if _reload_task is not None:
+        if not _reload_task.done():
+            reload_status = "running"
+        elif _reload_task.exception() is not None:
+            reload_status = "failed"
+            result = str(_reload_task.exception())
+        else:
+            reload_status = "finished"
+            result = _reload_task.result()
+    return {
+        "reload": reload_status,
+        "last_result": result,
+        "active_version": active.id if active else None,
+        "collection": active.collection_name if active else None,
+        "chunks": active.chunks if active else 0,
+        "files": sorted(active.manifest) if active else [],
+    }
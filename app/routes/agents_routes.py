@@ -1,19 +1,42 @@
-import json
+import time
+import asyncio
 import logging
 
-from typing import Annotated
-from fastapi import APIRouter, Depends, status, HTTPException, Request
+from typing import Annotated, Optional, Tuple, Type, TypeVar
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Response
 from fastapi import WebSocket, WebSocketDisconnect
 from agno.agent import RunResponse, Agent
+from pydantic import BaseModel
 from starlette.websockets import WebSocketState
 
-from app.depends.depends import token_verifier
+from app.depends.depends import request_deadline, token_verifier
 from app.auth.auth_user import UserUseCases
+from app.agents import replay
+from app.agents.model_router import BREAKER_RESET_SECONDS, ModelTrace, ModelUnavailableError, track_model
+from app.agents.output_parser import OutputParseError, extract_output
+from app.agents.prompt_budget import track_prompt
+from app.monitoring import metrics
+from app.monitoring.readiness import readiness
 from app.schemas.agents_schemas import SymptomInput, ClinicalAction, DiagnosisHypothesis, ClinicalProtocolInput
+from app.storage.case_history import DIAGNOSIS, PROTOCOL, case_history, case_record
+from app.storage.result_cache import diagnosis_key, protocol_key, result_cache
+from app.storage.session_cache import session_cache
+from app.utils.deadline import (
+    ClientDisconnected, Deadline, DeadlineExceeded, run_stage, use_deadline,
+    wait_for_http_disconnect, wait_for_websocket_disconnect
+)
+from app.utils.overload import OVERLOAD_RETRY_AFTER_SECONDS, Overloaded, degraded_mode, inflight_limiter
+from app.utils.scheduler import BATCH, INTERACTIVE, QueueOverloaded, agent_scheduler
+from app.utils.symptoms import prompt_symptoms
 
 
 agent_router = APIRouter(prefix="/agent")
 
+# Agent runs of one orchestrator session, in order; used to count the runs a cancellation avoided.
+ORCHESTRATOR_STAGES = ("symptom_analyzer", "symptom_analyzer_memory", "clinical_protocol", "clinical_protocol_memory")
+
+M = TypeVar("M", bound=BaseModel)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -26,6 +49,110 @@ async def get_current_user(user: Annotated[dict, Depends(token_verifier)]):
     return user
 
 
+async def require_ready():
+    if not readiness.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Agents are still starting up. Try again later.",
+            headers={"Retry-After": str(readiness.retry_after())}
+        )
+
+
+def limit_inflight(endpoint: str):
+    """Dependency holding one of `endpoint`'s in-flight slots for the whole request; 503 when none is left."""
+    async def hold_inflight_slot():
+        try:
+            inflight_limiter.acquire(endpoint)
+        except Overloaded as e:
+            raise overloaded(e)
+        try:
+            yield
+        finally:
+            inflight_limiter.release(endpoint)
+    return hold_inflight_slot
+
+
+def overloaded(error: Exception) -> HTTPException:
+    logger.warning(f"Shedding agent request: {error}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
+    )
+
+
+def cached_result(kind: str, key: str, schema: Type[M]) -> M:
+    """The cached result degraded mode answers with; Overloaded when there is none for this input."""
+    result = result_cache.get(kind, key, schema)
+    if result is None:
+        metrics.increment("overload.degraded.miss")
+        raise Overloaded(f"Service is degraded ({degraded_mode.reason}) and has no cached {kind} for this input. Try again later.")
+    metrics.increment("overload.degraded.hit")
+    return result
+
+
+def model_unavailable(error: ModelUnavailableError) -> HTTPException:
+    logger.error(f"No model backend could answer: {error}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The language model is unavailable. Try again later.",
+        headers={"Retry-After": str(int(BREAKER_RESET_SECONDS))}
+    )
+
+
+async def scheduled_run(
+    stage: str, agent: Agent, message: str, session_id: Optional[str], user_id: str, priority: str
+) -> RunResponse:
+    """Run the agent once the fair scheduler admits it; the queue wait counts against the request deadline."""
+    async with agent_scheduler.slot(user_id, priority):
+        start = time.perf_counter()
+        try:
+            return await replay.run_agent(agent, message, session_id, user_id, stage, priority)
+        finally:
+            degraded_mode.observe((time.perf_counter() - start) * 1000)
+
+
+async def run_agent_request(
+    stage: str, agent: Agent, message: str, session_id: Optional[str], user_id: str, deadline: Deadline, request: Request,
+    schema: Type[M], error_detail: str
+) -> Tuple[M, ModelTrace]:
+    """
+    Run one agent for an HTTP request and validate its output against `schema`, cancelled at
+    the request deadline or when the client goes away.
+    """
+    disconnected = asyncio.create_task(wait_for_http_disconnect(request))
+    try:
+        with use_deadline(deadline):
+            with track_prompt(agent, message), track_model() as model_trace:
+                deadline.check("auth")
+                response: RunResponse = await run_stage(
+                    stage, scheduled_run(stage, agent, message, session_id, user_id, BATCH), disconnected
+                )
+            if not response.content:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+                    detail="Agent did not produce content."
+                )
+            obj = await run_stage(f"{stage}_output", extract_output(agent.model, response.content, schema), disconnected)
+        return obj, model_trace
+    except OutputParseError as e:
+        logger.error(f"Failed to parse JSON from {stage}: {e}. Content: {response.content}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_detail)
+    except ModelUnavailableError as e:
+        raise model_unavailable(e)
+    except QueueOverloaded as e:
+        raise overloaded(e)
+    except DeadlineExceeded as e:
+        logger.warning(f"{e} ({deadline.seconds}s budget)")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except ClientDisconnected as e:
+        logger.info(f"{e} The agent run was cancelled.")
+        # 499 (client closed request): nobody reads it, but it keeps the access log honest.
+        raise HTTPException(status_code=499, detail=str(e))
+    finally:
+        disconnected.cancel()
+
+
 async def get_symptom_analyzer_agent_dependency(request: Request) -> Agent:
     agent = getattr(request.app.state, "symptom_analyzer_agent", None)
     if agent is None:
@@ -46,70 +173,83 @@ async def get_clinical_protocol_agent_dependency(request: Request) -> Agent:
     return agent
 
 
-@agent_router.post("/symptom_analyzer", response_model=DiagnosisHypothesis, summary="Get Diagnostic Hypothesis")
+@agent_router.post(
+    "/symptom_analyzer",
+    response_model=DiagnosisHypothesis,
+    summary="Get Diagnostic Hypothesis",
+    dependencies=[Depends(require_ready), Depends(limit_inflight("symptom_analyzer"))]
+)
 async def analyze_symptoms(
     input_data: SymptomInput,
+    request: Request,
+    http_response: Response,
+    deadline: Deadline = Depends(request_deadline),
     user: dict = Depends(get_current_user),
     agent: Agent = Depends(get_symptom_analyzer_agent_dependency)
 ):
     
     logger.info(f"Calling Symptom Analyzer for session {input_data.session_id}.")
+    user_id = str(user.get("user_id"))
+    symptoms = prompt_symptoms(input_data.symptoms)
+    if degraded_mode.active:
+        try:
+            diagnosis = cached_result(DIAGNOSIS, diagnosis_key(user_id, symptoms), DiagnosisHypothesis)
+        except Overloaded as e:
+            raise overloaded(e)
+        http_response.headers["X-Degraded"] = degraded_mode.reason
+        return diagnosis
 
-    response: RunResponse = await agent.arun(
-        message=input_data.symptoms, 
-        session_id=input_data.session_id, 
-        user_id=str(user.get("id"))
+    diagnosis, model_trace = await run_agent_request(
+        "symptom_analyzer", agent, symptoms, input_data.session_id, user_id, deadline, request,
+        DiagnosisHypothesis, "Error processing diagnosis."
     )
-    
-    final_content = response.content
-    if not final_content:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Agent did not produce content."
-        )
-
-    try:
-        decoder = json.JSONDecoder()
-        obj, _ = decoder.raw_decode(final_content.strip())
-        return DiagnosisHypothesis.model_validate(obj)
-    except Exception as e:
-        logger.error(f"Failed to parse JSON from Symptom Analyzer: {e}. Content: {final_content}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Error processing diagnosis."
-        )
+    if model_trace.served_by:
+        http_response.headers["X-Model-Backend"] = model_trace.served_by
+    case_history.record(case_record(
+        DIAGNOSIS, "symptom_analyzer", user.get("user_id"), input_data.session_id, diagnosis, model_trace.served_by,
+        input_text=symptoms
+    ))
+    result_cache.put(DIAGNOSIS, diagnosis_key(user_id, symptoms), diagnosis)
+    return diagnosis
 
 
-@agent_router.post("/clinical_protocol", response_model=ClinicalAction, summary="Get Clinical Action Protocol")
+@agent_router.post(
+    "/clinical_protocol",
+    response_model=ClinicalAction,
+    summary="Get Clinical Action Protocol",
+    dependencies=[Depends(require_ready), Depends(limit_inflight("clinical_protocol"))]
+)
 async def get_clinical_protocol(
     input_data: ClinicalProtocolInput,
+    request: Request,
+    http_response: Response,
+    deadline: Deadline = Depends(request_deadline),
     user: dict = Depends(get_current_user),
     agent: Agent = Depends(get_clinical_protocol_agent_dependency)
 ):
     logger.info(f"Calling Clinical Protocol for session {input_data.session_id}.")
-    
+    user_id = str(user.get("user_id"))
     agent_input = f"Diagnostic hypothesis: {input_data.diagnosis.diagnosis}. Justification: {input_data.diagnosis.justification}."
-    
-    response: RunResponse = await agent.arun(
-        message=agent_input, 
-        session_id=input_data.session_id, 
-        user_id=str(user.get("id"))
-    )
-    
-    final_content = response.content
-    if not final_content:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Agent did not produce content."
-        )
+    if degraded_mode.active:
+        try:
+            clinical_action = cached_result(PROTOCOL, protocol_key(user_id, input_data.diagnosis.diagnosis), ClinicalAction)
+        except Overloaded as e:
+            raise overloaded(e)
+        http_response.headers["X-Degraded"] = degraded_mode.reason
+        return clinical_action
 
-    try:
-        decoder = json.JSONDecoder()
-        obj, _ = decoder.raw_decode(final_content.strip())
-        return ClinicalAction.model_validate(obj)
-    except Exception as e:
-        logger.error(f"Failed to parse JSON from Clinical Protocol Agent: {e}. Content: {final_content}")
-        raise HTTPException(status_code=500, detail="Error processing clinical action protocol.")
+    clinical_action, model_trace = await run_agent_request(
+        "clinical_protocol", agent, agent_input, input_data.session_id, user_id, deadline, request,
+        ClinicalAction, "Error processing clinical action protocol."
+    )
+    if model_trace.served_by:
+        http_response.headers["X-Model-Backend"] = model_trace.served_by
+    case_history.record(case_record(
+        PROTOCOL, "clinical_protocol", user.get("user_id"), input_data.session_id, clinical_action, model_trace.served_by,
+        input_text=agent_input
+    ))
+    result_cache.put(PROTOCOL, protocol_key(user_id, input_data.diagnosis.diagnosis), clinical_action)
+    return clinical_action
 
 
 """ async def token_verifier_ws(token: str = Query(...)):
@@ -120,7 +260,8 @@ async def get_clinical_protocol(
 
 
 @agent_router.websocket("/ws/orchestrator")
-async def websocket_orchestrator(websocket: WebSocket, token: str):
+async def websocket_orchestrator(websocket: WebSocket, token: str, timeout: Optional[float] = None):
+    deadline = Deadline.from_client(timeout)
     db_session = websocket.app.state.db_session_gen()
 
     try:
@@ -140,81 +281,142 @@ async def websocket_orchestrator(websocket: WebSocket, token: str):
     symptom_analyzer_agent: Agent = websocket.app.state.symptom_analyzer_agent
     clinical_protocol_agent: Agent = websocket.app.state.clinical_protocol_agent
     
-    if not symptom_analyzer_agent or not clinical_protocol_agent:
-        logger.error("Agents not initialized in app.state.")
-        await websocket.send_json({"error": "Service not available. Agents not initialized."})
-        await websocket.close()
+    if not readiness.ready or not symptom_analyzer_agent or not clinical_protocol_agent:
+        logger.warning(f"Orchestrator called before the service is ready: {readiness.as_dict()}")
+        await websocket.send_json({
+            "error": "Service not available. Agents are still starting up.",
+            "retry_after": readiness.retry_after()
+        })
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
         return
 
     try:
-        input_data_json = await websocket.receive_json()
-        input_data = SymptomInput.model_validate(input_data_json)
-        user_id = user.get("user_id")
-        session_id = input_data.session_id
-
-        await websocket.send_json({"status": "Analyzing symptoms..."})
-        response_agent_a: RunResponse = await symptom_analyzer_agent.arun(
-            message=input_data.symptoms, 
-            session_id=session_id, 
-            user_id=str(user_id)
-        )
-        
-        hypothesis_content = response_agent_a.content
-        if not hypothesis_content:
-            raise ValueError("Symptom Analyzer Agent did not produce any content.")
-        
-        obj, _ = json.JSONDecoder().raw_decode(hypothesis_content.strip())
-        diagnosis_hypothesis = DiagnosisHypothesis.model_validate(obj)
-        await websocket.send_json({
-            "type": "diagnosis_result",
-            "data": diagnosis_hypothesis.model_dump()
-        })
+        inflight_limiter.acquire("orchestrator")
+    except Overloaded as e:
+        logger.warning(f"Shedding orchestrator socket for user {user.get('sub')}: {e}")
+        await websocket.send_json({"error": str(e), "retry_after": OVERLOAD_RETRY_AFTER_SECONDS})
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
 
-        await websocket.send_json({"status": "Saving initial diagnosis to memory..."})
-        memory_task_a = f"Based on our last interaction, please save this to your memory: The user's symptoms are '{input_data.symptoms}' and the diagnosis was '{diagnosis_hypothesis.diagnosis}'."
-        await symptom_analyzer_agent.arun(
-            message=memory_task_a, 
-            session_id=session_id, 
-            user_id=str(user_id)
-        )
+    session_id = None
+    disconnected = None
+    started = []
+    close_code = status.WS_1000_NORMAL_CLOSURE
+    try:
+        with use_deadline(deadline):
+            deadline.check("auth")
+            input_data_json = await run_stage("receive_input", websocket.receive_json())
+            input_data = SymptomInput.model_validate(input_data_json)
+            user_id = user.get("user_id")
+            session_id = input_data.session_id
+            # From here on, a client disconnect cancels whichever agent run is in flight.
+            disconnected = asyncio.create_task(wait_for_websocket_disconnect(websocket))
 
-        await websocket.send_json({"status": "Generating clinical protocol..."})
-        clinical_input_message = f"Diagnostic hypothesis: {diagnosis_hypothesis.diagnosis}. Justification: {diagnosis_hypothesis.justification}. Severity: {diagnosis_hypothesis.severity}."
-        response_agent_b: RunResponse = await clinical_protocol_agent.arun(
-            message=clinical_input_message, 
-            session_id=session_id, 
-            user_id=str(user_id)
-        )
-        action_content = response_agent_b.content
-        if not action_content:
-            raise ValueError("Clinical Protocol Agent did not produce any content.")
+            async def run_agent(stage: str, agent: Agent, message: str) -> RunResponse:
+                started.append(stage)
+                return await run_stage(
+                    stage, scheduled_run(stage, agent, message, session_id, str(user_id), INTERACTIVE), disconnected
+                )
 
-        obj, _ = json.JSONDecoder().raw_decode(action_content.strip())
-        clinical_action = ClinicalAction.model_validate(obj)
-        await websocket.send_json({
-            "type": "protocol_result",
-            "data": clinical_action.model_dump()
-        })
-        
-        await websocket.send_json({"status": "Saving clinical protocol to memory..."})
-        memory_task_b = f"For the diagnosis of '{diagnosis_hypothesis.diagnosis}', the suggested clinical protocol has an urgency of '{clinical_action.urgency}'."
-        await clinical_protocol_agent.arun(
-            message=memory_task_b, 
-            session_id=session_id, 
-            user_id=str(user_id)
-        )
+            symptoms = prompt_symptoms(input_data.symptoms)
+            if degraded_mode.active:
+                diagnosis_hypothesis = cached_result(DIAGNOSIS, diagnosis_key(user_id, symptoms), DiagnosisHypothesis)
+                clinical_action = cached_result(PROTOCOL, protocol_key(user_id, diagnosis_hypothesis.diagnosis), ClinicalAction)
+                for kind, result in (("diagnosis_result", diagnosis_hypothesis), ("protocol_result", clinical_action)):
+                    await websocket.send_json({
+                        "type": kind, "data": result.model_dump(), "served_by": None, "degraded": degraded_mode.reason
+                    })
+                await websocket.send_json({"status": "Completed!"})
+                return
 
-        await websocket.send_json({"status": "Completed!"})
+            await websocket.send_json({"status": "Analyzing symptoms..."})
+            with track_prompt(symptom_analyzer_agent, symptoms), track_model() as model_trace_a:
+                response_agent_a = await run_agent("symptom_analyzer", symptom_analyzer_agent, symptoms)
+            
+            hypothesis_content = response_agent_a.content
+            if not hypothesis_content:
+                raise ValueError("Symptom Analyzer Agent did not produce any content.")
+            
+            diagnosis_hypothesis = await run_stage(
+                "symptom_analyzer_output",
+                extract_output(symptom_analyzer_agent.model, hypothesis_content, DiagnosisHypothesis),
+                disconnected
+            )
+            case_history.record(case_record(
+                DIAGNOSIS, "orchestrator", user_id, session_id, diagnosis_hypothesis, model_trace_a.served_by,
+                input_text=symptoms
+            ))
+            result_cache.put(DIAGNOSIS, diagnosis_key(user_id, symptoms), diagnosis_hypothesis)
+            await websocket.send_json({
+                "type": "diagnosis_result",
+                "data": diagnosis_hypothesis.model_dump(),
+                "served_by": model_trace_a.served_by
+            })
 
-    except WebSocketDisconnect:
-        logger.info(f"Client {websocket.client.host} disconnected.")
+            await websocket.send_json({"status": "Saving initial diagnosis to memory..."})
+            memory_task_a = f"Based on our last interaction, please save this to your memory: The user's symptoms are '{symptoms}' and the diagnosis was '{diagnosis_hypothesis.diagnosis}'."
+            with track_prompt(symptom_analyzer_agent, memory_task_a):
+                await run_agent("symptom_analyzer_memory", symptom_analyzer_agent, memory_task_a)
+
+            await websocket.send_json({"status": "Generating clinical protocol..."})
+            clinical_input_message = f"Diagnostic hypothesis: {diagnosis_hypothesis.diagnosis}. Justification: {diagnosis_hypothesis.justification}. Severity: {diagnosis_hypothesis.severity}."
+            with track_prompt(clinical_protocol_agent, clinical_input_message), track_model() as model_trace_b:
+                response_agent_b = await run_agent("clinical_protocol", clinical_protocol_agent, clinical_input_message)
+            action_content = response_agent_b.content
+            if not action_content:
+                raise ValueError("Clinical Protocol Agent did not produce any content.")
+
+            clinical_action = await run_stage(
+                "clinical_protocol_output",
+                extract_output(clinical_protocol_agent.model, action_content, ClinicalAction),
+                disconnected
+            )
+            case_history.record(case_record(
+                PROTOCOL, "orchestrator", user_id, session_id, clinical_action, model_trace_b.served_by,
+                input_text=clinical_input_message
+            ))
+            result_cache.put(PROTOCOL, protocol_key(user_id, diagnosis_hypothesis.diagnosis), clinical_action)
+            await websocket.send_json({
+                "type": "protocol_result",
+                "data": clinical_action.model_dump(),
+                "served_by": model_trace_b.served_by
+            })
+            
+            await websocket.send_json({"status": "Saving clinical protocol to memory..."})
+            memory_task_b = f"For the diagnosis of '{diagnosis_hypothesis.diagnosis}', the suggested clinical protocol has an urgency of '{clinical_action.urgency}'."
+            with track_prompt(clinical_protocol_agent, memory_task_b):
+                await run_agent("clinical_protocol_memory", clinical_protocol_agent, memory_task_b)
+
+            await websocket.send_json({"status": "Completed!"})
+
+    except (WebSocketDisconnect, ClientDisconnected) as e:
+        metrics.increment("cancellation.stages_avoided", len(ORCHESTRATOR_STAGES) - len(started))
+        logger.info(f"Client {websocket.client.host} disconnected ({e}); {len(ORCHESTRATOR_STAGES) - len(started)} agent run(s) skipped.")
+    except DeadlineExceeded as e:
+        metrics.increment("cancellation.stages_avoided", len(ORCHESTRATOR_STAGES) - len(started))
+        logger.warning(f"WebSocket orchestrator for user {user.get('sub')}: {e} ({deadline.seconds}s budget)")
+        if websocket.client_state != WebSocketState.DISCONNECTED:
+            await websocket.send_json({"error": str(e), "stage": e.stage})
+    except (Overloaded, QueueOverloaded) as e:
+        logger.warning(f"Shedding orchestrator run for user {user.get('sub')}: {e}")
+        close_code = status.WS_1013_TRY_AGAIN_LATER
+        if websocket.client_state != WebSocketState.DISCONNECTED:
+            await websocket.send_json({"error": str(e), "retry_after": OVERLOAD_RETRY_AFTER_SECONDS})
+    except ModelUnavailableError as e:
+        logger.error(f"WebSocket orchestrator for user {user.get('sub')}: {e}")
+        if websocket.client_state != WebSocketState.DISCONNECTED:
+            await websocket.send_json({"error": "The language model is unavailable. Try again later.", "retry_after": int(BREAKER_RESET_SECONDS)})
     except Exception as e:
         error_message = f"An error occurred: {e}"
         logger.error(f"WebSocket Error for user {user.get('sub')}: {error_message}", exc_info=True)
         if websocket.client_state != WebSocketState.DISCONNECTED:
             await websocket.send_json({"error": error_message})
     finally:
+        inflight_limiter.release("orchestrator")
+        if disconnected is not None:
+            disconnected.cancel()
+        if session_id is not None:
+            await asyncio.to_thread(session_cache.flush, session_id=session_id)
         if websocket.client_state != WebSocketState.DISCONNECTED:
-            await websocket.close()
+            await websocket.close(code=close_code)
             logger.info(f"WebSocket connection closed for user: {user.get('sub')}")
-            
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os
+import asyncio
+import logging
+import datetime
+
+from typing import Annotated, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from app.depends.depends import token_verifier
+from app.storage.case_history import (
+    CASE_MAX_PAGE_SIZE, CASE_PAGE_SIZE, CaseFilters, csv_line, iter_cases, ndjson_line, query_cases, serialize_case
+)
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+cases_router = APIRouter(prefix='/cases')
+
+# Users allowed to query every user's cases; everyone else only sees their own.
+CASE_AUDIT_USERS = {name.strip() for name in os.getenv("CASE_AUDIT_USERS", "").split(",") if name.strip()}
+
+
+async def case_filters(
+    user: Annotated[dict, Depends(token_verifier)],
+    user_id: Optional[str] = None,
+    start: Optional[datetime.datetime] = Query(None, description="Cases created at or after this time (UTC if no offset)."),
+    end: Optional[datetime.datetime] = Query(None, description="Cases created before this time (UTC if no offset)."),
+    diagnosis: Optional[str] = Query(None, description="Exact diagnosis, case-insensitive."),
+    severity: Optional[str] = Query(None, description="Exact severity, case-insensitive."),
+) -> CaseFilters:
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    own_id = str(user.get("user_id"))
+    if user.get("sub") not in CASE_AUDIT_USERS:
+        if user_id is not None and user_id != own_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Audit access required")
+        user_id = own_id
+    return CaseFilters(user_id=user_id, start=start, end=end, diagnosis=diagnosis, severity=severity)
+
+
+@cases_router.get('')
+async def list_cases(
+    filters: CaseFilters = Depends(case_filters),
+    limit: int = Query(CASE_PAGE_SIZE, ge=1, le=CASE_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """Newest cases first; pass `next_cursor` back as `cursor` for the following page."""
+    try:
+        rows, next_cursor = await asyncio.to_thread(query_cases, filters, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"items": [serialize_case(row) for row in rows], "next_cursor": next_cursor}
+
+
+@cases_router.get('/export')
+async def export_cases(
+    filters: CaseFilters = Depends(case_filters),
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    """Stream every matching case as NDJSON or CSV, one keyset page at a time."""
+    logger.info(f"Case history export ({format}) with filters {filters}.")
+
+    async def lines():
+        if format == "csv":
+            yield csv_line()
+        async for row in iter_cases(filters):
+            yield ndjson_line(row) if format == "ndjson" else csv_line(row)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        lines(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="cases.{format}"'}
+    )
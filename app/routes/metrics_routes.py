@@ -0,0 +1,44 @@
+import logging
+
+from fastapi import APIRouter
+
+from app.agents.model_router import breaker_states
+from app.monitoring import metrics
+from app.storage.case_history import case_history
+from app.storage.memory_writes import memory_writes
+from app.storage.rag import peek_knowledge_base
+from app.storage.result_cache import result_cache
+from app.storage.session_cache import session_cache
+from app.utils import warmup
+from app.utils.http_pool import http_pool
+from app.utils.overload import degraded_mode, inflight_limiter
+from app.utils.scheduler import agent_scheduler
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+metrics_router = APIRouter(prefix='/metrics')
+
+
+@metrics_router.get('')
+async def get_metrics():
+    pdf_knowledge_base = peek_knowledge_base()
+    retrieval_cache = pdf_knowledge_base.retrieval_cache if pdf_knowledge_base else None
+    return {
+        **metrics.snapshot(),
+        "session_cache": dict(session_cache.stats),
+        "case_history": {**case_history.stats, "pending": case_history.pending},
+        "memory_writes": {**memory_writes.stats, "pending": memory_writes.pending},
+        "retrieval_cache": retrieval_cache.snapshot() if retrieval_cache else None,
+        "corpus_version": pdf_knowledge_base.corpus_version if pdf_knowledge_base else None,
+        "model_breakers": breaker_states(),
+        "scheduler": agent_scheduler.snapshot(),
+        "overload": {
+            "inflight": inflight_limiter.snapshot(),
+            "degraded": degraded_mode.snapshot(),
+            "result_cache": {**result_cache.stats, "entries": len(result_cache)},
+        },
+        "http_pool": http_pool.snapshot(),
+        "warmup": warmup.last_report.as_dict() if warmup.last_report else None,
+    }
@@ -0,0 +1,265 @@
+import os
+import csv
+import io
+import json
+import base64
+import asyncio
+import datetime
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from pydantic import BaseModel
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Integer, MetaData, String, Table, Text, func, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Engine
+
+from app.db.connection import get_engine
+from app.db.partitions import AGENT_SCHEMA
+from app.monitoring import metrics
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CASE_HISTORY_BATCH_SIZE = int(os.getenv("CASE_HISTORY_BATCH_SIZE", 200))
+CASE_HISTORY_FLUSH_SECONDS = int(os.getenv("CASE_HISTORY_FLUSH_SECONDS", 2))
+# Rows kept in memory while Postgres is unreachable; the oldest are dropped beyond this.
+CASE_HISTORY_MAX_BUFFER = int(os.getenv("CASE_HISTORY_MAX_BUFFER", 10000))
+CASE_PAGE_SIZE = 100
+CASE_MAX_PAGE_SIZE = 1000
+CASE_EXPORT_PAGE_SIZE = 500
+
+DIAGNOSIS = "diagnosis"
+PROTOCOL = "protocol"
+
+case_history_table = Table(
+    "case_history",
+    MetaData(schema=AGENT_SCHEMA),
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("session_id", String),
+    Column("source", String, nullable=False),
+    Column("kind", String, nullable=False),
+    Column("diagnosis", String),
+    Column("severity", String),
+    Column("urgency", String),
+    Column("served_by", String),
+    Column("input", Text),
+    Column("payload", JSON().with_variant(JSONB, "postgresql"), nullable=False),
+)
+
+CSV_COLUMNS = [
+    "id", "created_at", "user_id", "session_id", "source", "kind", "diagnosis", "severity", "urgency", "served_by", "input", "payload"
+]
+
+
+def case_record(
+    kind: str, source: str, user_id: Any, session_id: Optional[str], result: BaseModel, served_by: Optional[str] = None,
+    input_text: Optional[str] = None
+) -> Dict[str, Any]:
+    """Row for one agent result and the message the agent was given; a ClinicalAction's `condition` is stored as its diagnosis."""
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc),
+        "user_id": str(user_id),
+        "session_id": session_id,
+        "source": source,
+        "kind": kind,
+        "diagnosis": getattr(result, "diagnosis", None) or getattr(result, "condition", None),
+        "severity": getattr(result, "severity", None),
+        "urgency": getattr(result, "urgency", None),
+        "served_by": served_by,
+        "input": input_text,
+        "payload": result.model_dump(),
+    }
+
+
+class CaseHistoryWriter:
+    """
+    Append-only writer for `ai.case_history`.
+
+    `record` only buffers the row, so request handlers never wait on Postgres. Rows are
+    inserted in batches of `batch_size` by `flush` (on the flush timer, as soon as a batch
+    fills up, and at shutdown). A failed batch goes back to the front of the buffer.
+    """
+
+    def __init__(self, engine: Optional[Engine] = None, batch_size: int = CASE_HISTORY_BATCH_SIZE, max_buffer: int = CASE_HISTORY_MAX_BUFFER):
+        self._engine = engine
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"recorded": 0, "written": 0, "batches": 0, "dropped": 0, "failed_flushes": 0}
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            self._engine = get_engine()
+        return self._engine
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def record(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.stats["dropped"] += 1
+                metrics.increment("case_history.dropped")
+            self._buffer.append(row)
+            self.stats["recorded"] += 1
+            full = len(self._buffer) >= self.batch_size
+        if full and not self._flush_lock.locked():
+            threading.Thread(target=self.flush, name="case-history-flush", daemon=True).start()
+
+    def flush(self) -> int:
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    return written
+                try:
+                    with self.engine.begin() as connection:
+                        connection.execute(insert(case_history_table), batch)
+                except Exception as e:
+                    logger.error(f"Case history could not write {len(batch)} row(s): {e}")
+                    with self._lock:
+                        self._buffer.extendleft(reversed(batch))
+                    self.stats["failed_flushes"] += 1
+                    return written
+                written += len(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                metrics.observe("case_history.batch_rows", len(batch))
+
+
+case_history = CaseHistoryWriter()
+
+
+def flush_case_history() -> None:
+    written = case_history.flush()
+    if written:
+        logger.info(f"Case history flushed {written} row(s).")
+
+
+@dataclass
+class CaseFilters:
+    user_id: Optional[str] = None
+    start: Optional[datetime.datetime] = None
+    end: Optional[datetime.datetime] = None
+    diagnosis: Optional[str] = None
+    severity: Optional[str] = None
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _utc(moment: datetime.datetime) -> datetime.datetime:
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=datetime.timezone.utc)
+
+
+def fetch_cases(
+    filters: CaseFilters, limit: int, after: Optional[Tuple[datetime.datetime, int]] = None, engine: Optional[Engine] = None
+) -> List[Dict[str, Any]]:
+    """
+    Newest-first page of cases after the keyset `after` (created_at, id).
+
+    The keyset predicate and the (created_at, id) order match the table's indexes, so every
+    page costs the same however deep the client has paged.
+    """
+    table = case_history_table
+    statement = select(table).order_by(table.c.created_at.desc(), table.c.id.desc()).limit(limit)
+    if filters.user_id is not None:
+        statement = statement.where(table.c.user_id == str(filters.user_id))
+    if filters.start is not None:
+        statement = statement.where(table.c.created_at >= _utc(filters.start))
+    if filters.end is not None:
+        statement = statement.where(table.c.created_at < _utc(filters.end))
+    if filters.diagnosis:
+        statement = statement.where(func.lower(table.c.diagnosis) == filters.diagnosis.lower())
+    if filters.severity:
+        statement = statement.where(func.lower(table.c.severity) == filters.severity.lower())
+    if after is not None:
+        statement = statement.where(tuple_(table.c.created_at, table.c.id) < tuple_(_utc(after[0]), after[1]))
+
+    with (engine or get_engine()).connect() as connection:
+        return [dict(row._mapping) for row in connection.execute(statement)]
+
+
+def query_cases(
+    filters: CaseFilters, limit: int = CASE_PAGE_SIZE, cursor: Optional[str] = None, engine: Optional[Engine] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page and the cursor of the next one (None on the last page)."""
+    rows = fetch_cases(filters, limit + 1, decode_cursor(cursor) if cursor else None, engine)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def iter_cases(
+    filters: CaseFilters, page_size: int = CASE_EXPORT_PAGE_SIZE, engine: Optional[Engine] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Every matching case, fetched a keyset page at a time so memory stays flat."""
+    after = None
+    while True:
+        rows = await asyncio.to_thread(fetch_cases, filters, page_size, after, engine)
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def frequent_inputs(kind: str, since: datetime.datetime, limit: int, engine: Optional[Engine] = None) -> List[str]:
+    """The most frequent agent inputs of `kind` since `since`, most frequent first."""
+    table = case_history_table
+    hits = func.count().label("hits")
+    statement = (
+        select(table.c.input, hits)
+        .where(table.c.kind == kind, table.c.created_at >= _utc(since), table.c.input.is_not(None))
+        .group_by(table.c.input)
+        .order_by(hits.desc())
+        .limit(limit)
+    )
+    with (engine or get_engine()).connect() as connection:
+        return [row.input for row in connection.execute(statement)]
+
+
+def serialize_case(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {**row, "created_at": _utc(row["created_at"]).isoformat()}
+
+
+def ndjson_line(row: Dict[str, Any]) -> str:
+    return json.dumps(serialize_case(row), ensure_ascii=False) + "\n"
+
+
+def csv_line(row: Optional[Dict[str, Any]] = None) -> str:
+    """One CSV line: the header when `row` is None."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if row is None:
+        writer.writerow(CSV_COLUMNS)
+    else:
+        data = serialize_case(row)
+        data["payload"] = json.dumps(data["payload"], ensure_ascii=False)
+        writer.writerow([data.get(column) for column in CSV_COLUMNS])
+    return buffer.getvalue()
@@ -0,0 +1,130 @@
+import os
+import hashlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from agno.document import Document
+
+from app.utils.text import tokenize
+
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.85))
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Accent-folded word n-grams; short chunks fall back to their single tokens."""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return set(tokens)
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 32, size=num_permutations, dtype=np.uint64)
+        self.b = generator.randint(0, 1 << 32, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, items: Iterable[str]) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(), "little") for item in items],
+            dtype=np.uint64,
+        )
+        if hashes.size == 0:
+            return np.full(len(self.a), _MAX_HASH, dtype=np.uint64)
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateFilter:
+    """
+    Drop chunks whose MinHash-estimated Jaccard similarity to an already kept chunk is at
+    least `threshold`.
+
+    Signatures are split into `bands` LSH bands, so each chunk is compared only with the
+    few chunks that share a band bucket instead of every chunk seen so far. With 16 bands
+    of 8 rows, pairs above ~0.7 similarity almost always become candidates; the exact
+    cut-off is then applied on the full signature.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, bands: int = LSH_BANDS, num_permutations: int = NUM_PERMUTATIONS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_permutations // bands
+        self.hasher = MinHasher(num_permutations)
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._signatures: List[np.ndarray] = []
+        self.stats = {
+            "chunks_seen": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0,
+            "embedding_calls_avoided": 0,
+            "vectors_avoided": 0,
+        }
+        self._exact: set = set()
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find_duplicate(self, text: str) -> Tuple[Optional[int], np.ndarray]:
+        signature = self.hasher.signature(shingles(text))
+        candidates = sorted({index for key in self._band_keys(signature) for index in self._buckets.get(key, ())})
+        if not candidates:
+            return None, signature
+        similarity = np.mean(np.stack([self._signatures[index] for index in candidates]) == signature, axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] >= self.threshold:
+            return candidates[best], signature
+        return None, signature
+
+    def _remember(self, signature: np.ndarray) -> None:
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets[key].append(index)
+
+    def seed(self, texts: Iterable[str]) -> int:
+        """Register chunks that are already stored, so new copies of them are dropped too."""
+        seeded = 0
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            if digest in self._exact:
+                continue
+            self._exact.add(digest)
+            self._remember(self.hasher.signature(shingles(text)))
+            seeded += 1
+        return seeded
+
+    def filter(self, documents: List[Document]) -> List[Document]:
+        kept = []
+        for document in documents:
+            if not document.content:
+                continue
+            self.stats["chunks_seen"] += 1
+            digest = hashlib.sha256(document.content.encode("utf-8")).digest()
+            if digest in self._exact:
+                self.stats["exact_duplicates"] += 1
+                self._count_avoided()
+                continue
+            duplicate, signature = self.find_duplicate(document.content)
+            if duplicate is not None:
+                self.stats["near_duplicates"] += 1
+                self._count_avoided()
+                continue
+            self._exact.add(digest)
+            self._remember(signature)
+            kept.append(document)
+        return kept
+
+    def _count_avoided(self) -> None:
+        # agno embeds and stores one vector per chunk, so every dropped chunk is one call and one point saved.
+        self.stats["embedding_calls_avoided"] += 1
+        self.stats["vectors_avoided"] += 1
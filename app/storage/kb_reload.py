@@ -0,0 +1,406 @@
+import os
+import stat
+import time
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+from agno.document import Document
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, MetaData, String, Table, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.connection import get_engine
+from app.db.notifications import notify
+from app.db.partitions import AGENT_SCHEMA
+from app.monitoring import metrics
+from app.storage.rag import build_pdf_knowledge_base, collection_name, get_knowledge_base, knowledge_base_path
+from app.storage.specialty_router import SPECIALTY_FIELD, tag_specialty
+from app.utils.cluster import owns_ingestion
+from app.utils.symptoms import symptom_canonicalizer
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KB_WATCH_SECONDS = int(os.getenv("KB_WATCH_SECONDS", 60))
+KB_KEEP_COLLECTIONS = int(os.getenv("KB_KEEP_COLLECTIONS", 2))
+KB_INDEX_TIMEOUT_SECONDS = float(os.getenv("KB_INDEX_TIMEOUT_SECONDS", 120))
+# Directory the lexical snapshots are shared through; unset, there are none. The supervisor
+# creates a private one for its workers (see scripts/supervisor.py).
+KB_SNAPSHOT_DIR = os.getenv("KB_SNAPSHOT_DIR") or None
+# NOTIFY channels: a new active version was published / a worker asks the supervisor to ingest.
+KB_VERSION_CHANNEL = "kb_version"
+KB_RELOAD_CHANNEL = "kb_reload"
+INGESTION_LOCK = "knowledge_base_ingestion"
+LOCK_POLL_SECONDS = 2
+SCROLL_BATCH = 256
+
+kb_versions = Table(
+    "knowledge_base_versions",
+    MetaData(schema=AGENT_SCHEMA),
+    Column("id", BigInteger, primary_key=True),
+    Column("collection_name", String, nullable=False),
+    Column("manifest", JSONB, nullable=False),
+    Column("chunks", Integer, nullable=False),
+    Column("active", Boolean, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+@dataclass
+class KnowledgeBaseVersion:
+    id: int
+    collection_name: str
+    manifest: Dict[str, str]
+    chunks: int
+
+
+def build_manifest(path: str = knowledge_base_path) -> Dict[str, str]:
+    """Map every PDF under `path` (relative path) to the sha256 of its bytes."""
+    root = Path(path)
+    if not root.is_dir():
+        return {}
+    return {
+        pdf.relative_to(root).as_posix(): hashlib.sha256(pdf.read_bytes()).hexdigest()
+        for pdf in sorted(root.glob("**/*.pdf"))
+    }
+
+
+def diff_manifests(old: Dict[str, str], new: Dict[str, str]) -> Tuple[Set[str], Set[str]]:
+    """Return (added or modified files, removed files)."""
+    changed = {name for name, digest in new.items() if old.get(name) != digest}
+    removed = set(old) - set(new)
+    return changed, removed
+
+
+def get_active_version() -> Optional[KnowledgeBaseVersion]:
+    with get_engine().connect() as connection:
+        row = connection.execute(select(kb_versions).where(kb_versions.c.active)).fetchone()
+    if row is None:
+        return None
+    return KnowledgeBaseVersion(row.id, row.collection_name, row.manifest, row.chunks)
+
+
+def record_version(collection: str, manifest: Dict[str, str], chunks: int) -> KnowledgeBaseVersion:
+    with get_engine().begin() as connection:
+        connection.execute(update(kb_versions).where(kb_versions.c.active).values(active=False))
+        version_id = connection.execute(
+            kb_versions.insert()
+            .values(collection_name=collection, manifest=manifest, chunks=chunks, active=True)
+            .returning(kb_versions.c.id)
+        ).scalar_one()
+    return KnowledgeBaseVersion(version_id, collection, manifest, chunks)
+
+
+def snapshot_dir() -> Optional[Path]:
+    """
+    The snapshot directory, None when none is configured. Snapshots are pickles, so it must
+    be a real directory owned by this user that nobody else can write to: anyone who can
+    plant a snapshot there can run code in every worker. PermissionError otherwise.
+    """
+    if not KB_SNAPSHOT_DIR:
+        return None
+    path = Path(KB_SNAPSHOT_DIR)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = path.lstat()
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(
+            f"Snapshot directory '{path}' must be a directory owned by this user and not writable by group or others."
+        )
+    return path
+
+
+def snapshot_path(version_id: int) -> Optional[Path]:
+    directory = snapshot_dir()
+    return directory / f"lexical_v{version_id}.pickle" if directory is not None else None
+
+
+def drop_old_snapshots(keep: int = KB_KEEP_COLLECTIONS) -> None:
+    directory = snapshot_dir()
+    if directory is None:
+        return
+    snapshots = sorted(directory.glob("lexical_v*.pickle"), key=lambda path: int(path.stem.rsplit("_v", 1)[1]))
+    for path in snapshots[: max(0, len(snapshots) - keep)]:
+        path.unlink(missing_ok=True)
+
+
+def usable_snapshot_path(version_id: int) -> Optional[Path]:
+    try:
+        return snapshot_path(version_id)
+    except OSError as e:
+        logger.error(f"Lexical snapshots disabled: {e}")
+        return None
+
+
+def save_snapshot(kb, path: Optional[Path]) -> None:
+    if path is None:
+        return
+    try:
+        kb.save_lexical_snapshot(str(path))
+        drop_old_snapshots()
+    except Exception as e:
+        logger.warning(f"Could not save the lexical snapshot '{path}': {e}")
+
+
+def fit_spelling(kb) -> None:
+    words = symptom_canonicalizer.fit(kb.lexical_index.documents())
+    logger.info(f"Symptom spelling vocabulary fitted on the corpus: {words} words.")
+
+
+def load_version(kb, version: KnowledgeBaseVersion) -> str:
+    """
+    Point `kb`'s lexical index at `version`: from the snapshot file when a process on this
+    host already built it, otherwise from the Qdrant payloads (and then save the snapshot).
+    """
+    path = usable_snapshot_path(version.id)
+    loaded_from = "snapshot"
+    loaded = False
+    if path is not None:
+        try:
+            loaded = kb.load_lexical_snapshot(str(path))
+        except Exception as e:
+            logger.warning(f"Could not load the lexical snapshot '{path}', rebuilding from Qdrant: {e}")
+    if not loaded:
+        loaded_from = "vector_db"
+        kb.index_from_vector_db()
+        save_snapshot(kb, path)
+    fit_spelling(kb)
+    return loaded_from
+
+
+def finish_version(kb, version: KnowledgeBaseVersion) -> None:
+    """After an ingestion swapped `version` in: share its snapshot and refit the spelling vocabulary."""
+    save_snapshot(kb, usable_snapshot_path(version.id))
+    fit_spelling(kb)
+
+
+_load_lock = asyncio.Lock()
+
+
+@asynccontextmanager
+async def ingestion_lock():
+    """Cluster-wide lock (Postgres advisory lock) so only one worker ingests at a time."""
+    connection = get_engine().connect()
+    try:
+        while not connection.execute(select(func.pg_try_advisory_lock(func.hashtext(INGESTION_LOCK)))).scalar():
+            connection.commit()
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            connection.execute(select(func.pg_advisory_unlock(func.hashtext(INGESTION_LOCK))))
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def with_specialty(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Tag points stored before specialty routing existed, so their partition is known without re-embedding."""
+    meta_data = payload.get("meta_data") or {}
+    if meta_data.get(SPECIALTY_FIELD):
+        return payload
+    document = Document(content=payload.get("content") or "", meta_data=dict(meta_data))
+    tag_specialty(document)
+    return {**payload, "meta_data": document.meta_data}
+
+
+def copy_unchanged_points(client, source: str, target: str, skip_sources: Set[str]) -> int:
+    """Copy points (vectors included) of files that did not change, so they are not chunked and embedded again."""
+    from qdrant_client import models
+
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source, limit=SCROLL_BATCH, offset=offset, with_payload=True, with_vectors=True
+        )
+        keep = [
+            models.PointStruct(id=point.id, vector=point.vector, payload=with_specialty(point.payload or {}))
+            for point in points
+            if ((point.payload or {}).get("meta_data") or {}).get("source") not in skip_sources
+        ]
+        if keep:
+            client.upsert(collection_name=target, points=keep, wait=True)
+            copied += len(keep)
+        if offset is None:
+            return copied
+
+
+def wait_until_indexed(client, collection: str, timeout: float = KB_INDEX_TIMEOUT_SECONDS) -> int:
+    """agno inserts with `wait=False`; wait until the point count settles before exposing the collection."""
+    from qdrant_client import models
+
+    deadline = time.monotonic() + timeout
+    previous = -1
+    while time.monotonic() < deadline:
+        info = client.get_collection(collection)
+        count = client.count(collection_name=collection, exact=True).count
+        if info.status == models.CollectionStatus.GREEN and count == previous:
+            return count
+        previous = count
+        time.sleep(0.5)
+    raise TimeoutError(f"Collection '{collection}' was not fully indexed after {timeout}s.")
+
+
+def swap_alias(client, alias: str, target: str) -> None:
+    """Point `alias` at `target` in a single Qdrant alias update, so searches never see a missing collection."""
+    from qdrant_client import models
+
+    aliases = {item.alias_name for item in client.get_aliases().aliases}
+    operations: List[Any] = []
+    if alias in aliases:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    elif client.collection_exists(alias):
+        # One-off migration: the alias name is still a plain collection from before versioned ingestion.
+        logger.warning(f"Dropping legacy collection '{alias}' so it can become an alias of '{target}'.")
+        client.delete_collection(alias)
+    operations.append(
+        models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target, alias_name=alias))
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+
+
+def drop_old_collections(client, alias: str, keep: int = KB_KEEP_COLLECTIONS) -> List[str]:
+    """Keep the newest `keep` versioned collections (the active one included) for rollback, drop the rest."""
+    active = {item.collection_name for item in client.get_aliases().aliases if item.alias_name == alias}
+    versioned = sorted(
+        (item.name for item in client.get_collections().collections if item.name.startswith(f"{alias}_v")),
+        key=lambda name: int(name.rsplit("_v", 1)[1]),
+    )
+    dropped = [name for name in versioned[: max(0, len(versioned) - keep)] if name not in active]
+    for name in dropped:
+        client.delete_collection(name)
+    return dropped
+
+
+async def ingest_version(
+    manifest: Dict[str, str], active: Optional[KnowledgeBaseVersion], force: bool = False
+) -> Tuple[KnowledgeBaseVersion, Dict[str, int]]:
+    """
+    Build a new versioned collection and its lexical index, then swap the alias and this
+    worker's lexical index to it and record it as the active version.
+
+    Returns the version and the near-duplicate report of the ingestion.
+    """
+    live = get_knowledge_base()
+    client = live.vector_db.client
+    target = f"{collection_name}_v{int(time.time() * 1000)}"
+
+    changed, removed = diff_manifests({} if force or active is None else active.manifest, manifest)
+    staging = build_pdf_knowledge_base(
+        collection=target,
+        path=[{"path": str(Path(knowledge_base_path) / name), "metadata": {"source": name}} for name in sorted(changed)],
+        with_cache=False,
+    )
+    staging.vector_db.create()
+
+    copied = 0
+    if active is not None and not force:
+        copied = await asyncio.to_thread(copy_unchanged_points, client, active.collection_name, target, changed | removed)
+    if changed and staging.deduplicator is not None and copied:
+        await asyncio.to_thread(staging.deduplicator.seed, (doc.content for doc in staging.stored_documents()))
+    if changed:
+        await staging.aload(recreate=False, skip_existing=False)
+
+    dedup_report = dict(staging.deduplicator.stats) if staging.deduplicator is not None else {}
+    for name in ("near_duplicates", "exact_duplicates", "embedding_calls_avoided", "vectors_avoided"):
+        metrics.increment(f"ingestion.{name}", dedup_report.get(name, 0))
+    chunks = await asyncio.to_thread(wait_until_indexed, client, target)
+    logger.info(
+        f"Collection '{target}' built: {len(changed)} file(s) ingested, {len(removed)} removed, "
+        f"{copied} chunk(s) reused, {chunks} chunk(s) total. Deduplication: {dedup_report}"
+    )
+
+    # Everything slow happens before the swap: the alias, the lexical index and the corpus
+    # version then change together, and the cached searches are dropped last.
+    lexical = await asyncio.to_thread(live.build_lexical_index, target)
+    async with _load_lock:
+        swap_alias(client, collection_name, target)
+        live.swap_lexical_index(*lexical)
+        version = record_version(target, manifest, chunks)
+        live.active_version = version.id
+    await asyncio.to_thread(finish_version, live, version)
+    dropped = drop_old_collections(client, collection_name)
+    if dropped:
+        logger.info(f"Dropped old knowledge base collections: {dropped}")
+    return version, dedup_report
+
+
+async def sync_knowledge_base(force: bool = False, ingest: bool = owns_ingestion()) -> Dict[str, Any]:
+    """
+    Bring this worker's knowledge base in line with the PDF directory.
+
+    If the files differ from the active version, one worker (under the ingestion lock)
+    ingests only the changed files into a new collection and atomically repoints the
+    `pdf_rag` alias together with its own lexical index. Every other worker then loads the
+    lexical index of the new active version, which also invalidates its retrieval cache,
+    once the ingesting one announces it on KB_VERSION_CHANNEL. With `ingest=False` (APP_ROLE=worker) the PDF directory is not
+    read at all and only the active version is followed.
+    """
+    kb = get_knowledge_base()
+    manifest = build_manifest() if ingest else {}
+    active = get_active_version()
+    ingested = False
+    loaded_from = None
+    dedup_report: Dict[str, int] = {}
+
+    if ingest and not manifest and active is None:
+        logger.warning(f"No PDFs found under '{knowledge_base_path}', the knowledge base is empty.")
+    elif ingest and (force or active is None or any(diff_manifests(active.manifest, manifest))):
+        async with ingestion_lock():
+            active = get_active_version()
+            if force or active is None or any(diff_manifests(active.manifest, manifest)):
+                active, dedup_report = await ingest_version(manifest, active, force=force)
+                ingested = True
+                loaded_from = "ingestion"
+
+    async with _load_lock:
+        if active is not None and active.id != kb.active_version:
+            loaded_from = await asyncio.to_thread(load_version, kb, active)
+            kb.active_version = active.id
+    if ingested:
+        # Sent once the snapshot exists, so the workers notified load it instead of scrolling Qdrant.
+        notify(KB_VERSION_CHANNEL, str(active.id))
+
+    return {
+        "ingested": ingested,
+        "active_version": active.id if active else None,
+        "collection": active.collection_name if active else None,
+        "chunks": active.chunks if active else 0,
+        "files": len(manifest),
+        "loaded_from": loaded_from,
+        "deduplication": dedup_report,
+    }
+
+
+async def follow_active_version() -> Dict[str, Any]:
+    """Load the version the ingestion owner published, without ingesting; fails while there is none."""
+    result = await sync_knowledge_base(ingest=False)
+    if result["active_version"] is None:
+        raise RuntimeError("No knowledge base version has been published yet.")
+    return result
+
+
+def request_reload(force: bool = False) -> None:
+    """Ask the ingestion owner (`scripts/supervisor.py`) to sync the knowledge base."""
+    notify(KB_RELOAD_CHANNEL, "force" if force else "")
+
+
+async def watch_knowledge_base():
+    """
+    Scheduler job: pick up new or changed PDFs, and versions activated by other workers.
+    Workers get those through KB_VERSION_CHANNEL; for them this is the fallback poll.
+    """
+    try:
+        result = await sync_knowledge_base()
+        if result["ingested"]:
+            logger.info(f"Knowledge base hot reload finished: {result}")
+    except Exception as e:
+        logger.error(f"Knowledge base watcher failed: {e}", exc_info=True)
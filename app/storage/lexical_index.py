@@ -0,0 +1,135 @@
+import math
+import threading
+from collections import Counter, defaultdict
+from hashlib import md5
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from agno.document import Document
+
+from app.utils.text import analyze
+
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+
+def document_key(document: Document) -> str:
+    """Same id the agno Qdrant integration uses for a point, so both rankings agree on identity."""
+    return md5(document.content.replace("\x00", "\ufffd").encode()).hexdigest()
+
+
+def matches_filters(document: Document, filters: Optional[Dict[str, Any]]) -> bool:
+    if not filters:
+        return True
+    meta_data = document.meta_data or {}
+    return all(
+        meta_data.get(key) in value if isinstance(value, (list, tuple, set)) else meta_data.get(key) == value
+        for key, value in filters.items()
+    )
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 inverted index over knowledge-base chunks.
+
+    Terms come from `app.utils.text.analyze` (accent folding, stopwords, Portuguese stemming),
+    so 'infecções respiratórias' and 'infecção respiratória' hit the same postings. Chunks
+    are deduplicated by content hash. Searches run against an immutable snapshot that
+    `add` replaces, so ingestion can extend the index while requests are being served.
+    The index pickles with its postings, so other processes can load it without re-analyzing.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._documents: Dict[str, Document] = {}
+        self._term_freqs: Dict[str, Counter] = {}
+        self._snapshot: Tuple[Dict[str, Dict[str, int]], Dict[str, int], float] = ({}, {}, 0.0)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        with self._lock:
+            return {key: value for key, value in self.__dict__.items() if key != "_lock"}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, documents: Iterable[Document]) -> int:
+        added = 0
+        with self._lock:
+            for document in documents:
+                if not document.content:
+                    continue
+                key = document_key(document)
+                if key in self._documents:
+                    continue
+                self._documents[key] = document
+                self._term_freqs[key] = Counter(analyze(document.content))
+                added += 1
+            if added:
+                self._rebuild()
+        return added
+
+    def documents(self) -> List[Document]:
+        with self._lock:
+            return list(self._documents.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents = {}
+            self._term_freqs = {}
+            self._snapshot = ({}, {}, 0.0)
+
+    def _rebuild(self) -> None:
+        postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        lengths: Dict[str, int] = {}
+        for key, term_freqs in self._term_freqs.items():
+            lengths[key] = sum(term_freqs.values())
+            for term, freq in term_freqs.items():
+                postings[term][key] = freq
+        average_length = sum(lengths.values()) / len(lengths) if lengths else 0.0
+        self._snapshot = (dict(postings), lengths, average_length)
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        postings, lengths, average_length = self._snapshot
+        if not lengths:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        total = len(lengths)
+        for term in set(analyze(query)):
+            term_postings = postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for key, freq in term_postings.items():
+                norm = self.k1 * (1 - self.b + self.b * lengths[key] / average_length)
+                scores[key] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for key, score in ranked:
+            document = self._documents.get(key)
+            if document is not None and matches_filters(document, filters):
+                results.append((document, score))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], limit: int, k: int = RRF_K) -> List[Document]:
+    """Fuse ranked lists with RRF: score(d) = sum over lists of 1 / (k + rank). Ties keep first-seen order."""
+    scores: Dict[str, float] = defaultdict(float)
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = document_key(document)
+            scores[key] += 1 / (k + rank)
+            documents.setdefault(key, document)
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [documents[key] for key in ranked[:limit]]
@@ -0,0 +1,142 @@
+import os
+import math
+import zlib
+import threading
+import datetime
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+import numpy as np
+from agno.memory.v2.schema import UserMemory
+
+from app.utils.text import analyze
+
+
+load_dotenv()
+
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", 8))
+MEMORY_INDEX_DIMENSIONS = int(os.getenv("MEMORY_INDEX_DIMENSIONS", 1024))
+MEMORY_INDEX_MAX_USERS = int(os.getenv("MEMORY_INDEX_MAX_USERS", 4096))
+MEMORY_RECENCY_HALF_LIFE_HOURS = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_HOURS", 72))
+# Weight of recency against similarity (a cosine in [0, 1]); also what orders memories on an empty query.
+MEMORY_RECENCY_WEIGHT = float(os.getenv("MEMORY_RECENCY_WEIGHT", 0.15))
+
+
+def embed(text: str, dimensions: int = MEMORY_INDEX_DIMENSIONS) -> np.ndarray:
+    """
+    L2-normalized hashed bag of stems and stem bigrams, with sublinear term frequency.
+
+    Local and deterministic: memories and queries are embedded in-process, in microseconds,
+    without a call to the embedding API on every run.
+    """
+    stems = analyze(text)
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for term in stems + [f"{first} {second}" for first, second in zip(stems, stems[1:])]:
+        vector[zlib.crc32(term.encode()) % dimensions] += 1.0
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def memory_text(memory: UserMemory) -> str:
+    return " ".join([memory.memory, *(memory.topics or [])])
+
+
+@dataclass
+class _UserVectors:
+    ids: List[str] = field(default_factory=list)
+    texts: Dict[str, str] = field(default_factory=dict)
+    vectors: Dict[str, np.ndarray] = field(default_factory=dict)
+    matrix: Optional[np.ndarray] = None
+    idf: Optional[np.ndarray] = None
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+class UserMemoryIndex:
+    """
+    Per-user vector index of agent memories, ranked by similarity to the query and recency.
+
+    Each user's memories are kept as one matrix of embeddings (LRU over `max_users` users).
+    The terms are weighted by their IDF over the user's memories, so what every memory says
+    ("the user ...") does not count. A memory is only embedded again when its text changes
+    and the matrix is only rebuilt when the user's memory set changes, so ranking a few
+    hundred memories costs one matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = MEMORY_INDEX_DIMENSIONS,
+        max_users: int = MEMORY_INDEX_MAX_USERS,
+        half_life_hours: float = MEMORY_RECENCY_HALF_LIFE_HOURS,
+        recency_weight: float = MEMORY_RECENCY_WEIGHT,
+    ):
+        self.dimensions = dimensions
+        self.max_users = max_users
+        self.half_life_hours = half_life_hours
+        self.recency_weight = recency_weight
+        self._users: "OrderedDict[str, _UserVectors]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"embedded": 0, "rebuilds": 0, "queries": 0}
+
+    def _matrix(self, user_id: str, memories: List[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            entry = self._users.pop(user_id, None) or _UserVectors()
+            self._users[user_id] = entry
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+            ids = [memory_id for memory_id, _ in memories]
+            changed = ids != entry.ids
+            for memory_id, text in memories:
+                if entry.texts.get(memory_id) != text:
+                    entry.texts[memory_id] = text
+                    entry.vectors[memory_id] = embed(text, self.dimensions)
+                    self.stats["embedded"] += 1
+                    changed = True
+            if changed or entry.matrix is None:
+                for memory_id in set(entry.texts) - set(ids):
+                    del entry.texts[memory_id], entry.vectors[memory_id]
+                entry.ids = ids
+                vectors = np.stack([entry.vectors[memory_id] for memory_id in ids])
+                entry.idf = np.log((1 + len(ids)) / (1 + np.count_nonzero(vectors, axis=0))).astype(np.float32) + 1
+                entry.matrix = _normalize_rows(vectors * entry.idf)
+                self.stats["rebuilds"] += 1
+            return entry.matrix, entry.idf
+
+    def recency(self, memories: List[UserMemory], now: Optional[datetime.datetime] = None) -> np.ndarray:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        ages = []
+        for memory in memories:
+            updated = memory.last_updated
+            if updated is None:
+                ages.append(math.inf)
+                continue
+            if updated.tzinfo is None:
+                updated = updated.replace(tzinfo=datetime.timezone.utc)
+            ages.append(max(0.0, (now - updated).total_seconds() / 3600))
+        return np.power(0.5, np.array(ages, dtype=np.float32) / self.half_life_hours)
+
+    def top_k(
+        self, user_id: str, memories: List[UserMemory], query: str, k: int = MEMORY_TOP_K,
+        now: Optional[datetime.datetime] = None
+    ) -> List[Tuple[float, UserMemory]]:
+        """The `k` best (score, memory) pairs for `query`, best first."""
+        if not memories:
+            return []
+        self.stats["queries"] += 1
+        keyed = [(memory.memory_id or str(position), memory_text(memory)) for position, memory in enumerate(memories)]
+        matrix, idf = self._matrix(user_id, keyed)
+        similarity = matrix @ _normalize_rows(embed(query, self.dimensions) * idf)
+        scores = similarity + self.recency_weight * self.recency(memories, now)
+        if k < len(memories):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(memories))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(float(scores[position]), memories[position]) for position in best]
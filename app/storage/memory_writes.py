@@ -0,0 +1,164 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from agno.memory.v2.db.schema import MemoryRow
+
+from app.monitoring import metrics
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MEMORY_WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "true").lower() == "true"
+MEMORY_WRITE_BATCH_SIZE = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", 100))
+MEMORY_WRITE_FLUSH_SECONDS = int(os.getenv("MEMORY_WRITE_FLUSH_SECONDS", 1))
+# Changes kept in memory while Postgres is unreachable; the oldest are dropped beyond this.
+MEMORY_WRITE_MAX_PENDING = int(os.getenv("MEMORY_WRITE_MAX_PENDING", 10000))
+
+
+def overlay_changes(
+    memories: List[MemoryRow], changes: Dict[str, Optional[MemoryRow]], user_id: Optional[str] = None,
+    limit: Optional[int] = None, sort: Optional[str] = None
+) -> List[MemoryRow]:
+    """`memories` as read from the table, with the changes that were not flushed yet applied on top."""
+    if not changes:
+        return memories
+    merged = []
+    for memory in memories:
+        if memory.id in changes:
+            change = changes[memory.id]
+            if change is None or (user_id is not None and change.user_id != user_id):
+                continue
+            merged.append(change)
+        else:
+            merged.append(memory)
+    stored = {memory.id for memory in memories}
+    added = [
+        memory for memory_id, memory in changes.items()
+        if memory is not None and memory_id not in stored and (user_id is None or memory.user_id == user_id)
+    ]
+    # Unflushed memories are the newest ones.
+    merged = merged + added if sort == "asc" else added[::-1] + merged
+    return merged[:limit] if limit is not None else merged
+
+
+class MemoryWriteBuffer:
+    """
+    Write-behind buffer for the agents' memory tables.
+
+    `upsert` and `delete` only queue the change per table, keyed by memory id, so repeated
+    writes to one memory between flushes collapse into the last one. `flush` (on the flush
+    timer, as soon as `batch_size` changes are pending, and at shutdown) hands each table
+    its changes in batches of `batch_size` through `db.write_changes`, one transaction per
+    batch. A failed batch is queued again behind any newer change to the same memories.
+    Reads apply `changes_for` on top of the table, so unflushed writes stay visible.
+    """
+
+    def __init__(self, batch_size: int = MEMORY_WRITE_BATCH_SIZE, max_pending: int = MEMORY_WRITE_MAX_PENDING):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # table -> memory id -> the row to upsert, or None to delete it.
+        self._pending: Dict[str, "OrderedDict[str, Optional[MemoryRow]]"] = {}
+        self._in_flight: Dict[str, "OrderedDict[str, Optional[MemoryRow]]"] = {}
+        self._dbs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"queued": 0, "coalesced": 0, "written": 0, "batches": 0, "dropped": 0, "failed_flushes": 0}
+
+    @property
+    def pending(self) -> int:
+        return sum(len(changes) for changes in self._pending.values())
+
+    def upsert(self, db, memory: MemoryRow) -> None:
+        self._queue(db, memory.id, memory.model_copy(deep=True))
+
+    def delete(self, db, memory_id: str) -> None:
+        self._queue(db, memory_id, None)
+
+    def changes_for(self, table: str) -> Dict[str, Optional[MemoryRow]]:
+        """The changes to `table` not yet committed, in flight ones included."""
+        with self._lock:
+            changes = dict(self._in_flight.get(table) or {})
+            changes.update(self._pending.get(table) or {})
+        return changes
+
+    def _queue(self, db, memory_id: str, memory: Optional[MemoryRow]) -> None:
+        table = db.table.fullname
+        with self._lock:
+            self._dbs[table] = db
+            changes = self._pending.setdefault(table, OrderedDict())
+            if memory_id in changes:
+                del changes[memory_id]
+                self.stats["coalesced"] += 1
+            elif self.pending >= self.max_pending:
+                oldest = changes if changes else max(self._pending.values(), key=len)
+                oldest.popitem(last=False)
+                self.stats["dropped"] += 1
+                metrics.increment("memory_writes.dropped")
+            changes[memory_id] = memory
+            self.stats["queued"] += 1
+            full = self.pending >= self.batch_size
+        if full and not self._flush_lock.locked():
+            threading.Thread(target=self.flush, name="memory-writes-flush", daemon=True).start()
+
+    def _take(self) -> List[Tuple[str, Any, "OrderedDict[str, Optional[MemoryRow]]"]]:
+        with self._lock:
+            batches = []
+            for table, changes in self._pending.items():
+                if changes:
+                    batch = OrderedDict(changes.popitem(last=False) for _ in range(min(self.batch_size, len(changes))))
+                    self._in_flight[table] = batch
+                    batches.append((table, self._dbs[table], batch))
+            return batches
+
+    def _requeue(self, table: str, batch: "OrderedDict[str, Optional[MemoryRow]]") -> None:
+        with self._lock:
+            self._in_flight.pop(table, None)
+            newer = self._pending.get(table) or OrderedDict()
+            changes = OrderedDict((memory_id, memory) for memory_id, memory in batch.items() if memory_id not in newer)
+            changes.update(newer)
+            self._pending[table] = changes
+
+    def flush(self) -> int:
+        written = 0
+        with self._flush_lock:
+            while True:
+                batches = self._take()
+                if not batches:
+                    return written
+                for table, db, batch in batches:
+                    start = time.perf_counter()
+                    try:
+                        db.write_changes(batch)
+                    except Exception as e:
+                        logger.error(f"Memory writes could not apply {len(batch)} change(s) to {table}: {e}")
+                        self._requeue(table, batch)
+                        self.stats["failed_flushes"] += 1
+                        # The other tables' batches go back too, and are retried on the next flush.
+                        for other, _, other_batch in batches:
+                            if other != table and other in self._in_flight:
+                                self._requeue(other, other_batch)
+                        return written
+                    with self._lock:
+                        self._in_flight.pop(table, None)
+                    written += len(batch)
+                    self.stats["written"] += len(batch)
+                    self.stats["batches"] += 1
+                    metrics.observe("memory_writes.flush_ms", (time.perf_counter() - start) * 1000)
+                    metrics.observe("memory_writes.batch_rows", len(batch))
+
+
+memory_writes = MemoryWriteBuffer()
+
+
+def flush_memory_writes() -> None:
+    written = memory_writes.flush()
+    if written:
+        logger.info(f"Memory writes flushed {written} change(s).")
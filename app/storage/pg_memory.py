@@ -0,0 +1,116 @@
+import os
+import logging
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from sqlalchemy import String, column, delete, func, insert, text, update, values
+from sqlalchemy.dialects.postgresql import JSONB
+from agno.memory.v2.db.postgres import PostgresMemoryDb
+from agno.memory.v2.db.schema import MemoryRow
+
+from app.storage.memory_writes import MEMORY_WRITE_BEHIND, memory_writes, overlay_changes
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+db_url = os.getenv("DB_URL")
+
+
+class PartitionedPostgresMemoryDb(PostgresMemoryDb):
+    """
+    PostgresMemoryDb for the week-partitioned memory tables.
+
+    The primary key is `(id, created_at)`, so memories are upserted with an
+    update-then-insert on `id` instead of `ON CONFLICT (id)`.
+
+    With `write_behind`, upserts and deletes are queued in `memory_writes` and applied in
+    batches by `write_changes`; reads see the queued changes.
+    """
+
+    # A class default as well, since agno's `__deepcopy__` only carries over its own attributes.
+    write_behind: bool = MEMORY_WRITE_BEHIND
+
+    def __init__(self, *args, write_behind: bool = MEMORY_WRITE_BEHIND, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_behind = write_behind
+
+    def read_memories(
+        self, user_id: Optional[str] = None, limit: Optional[int] = None, sort: Optional[str] = None
+    ) -> List[MemoryRow]:
+        memories = super().read_memories(user_id=user_id, limit=limit, sort=sort)
+        if not self.write_behind:
+            return memories
+        return overlay_changes(memories, memory_writes.changes_for(self.table.fullname), user_id, limit, sort)
+
+    def memory_exists(self, memory: MemoryRow) -> bool:
+        if self.write_behind:
+            changes = memory_writes.changes_for(self.table.fullname)
+            if memory.id in changes:
+                return changes[memory.id] is not None
+        return super().memory_exists(memory)
+
+    def upsert_memory(self, memory: MemoryRow, create_and_retry: bool = True) -> None:
+        if self.write_behind:
+            memory_writes.upsert(self, memory)
+            return None
+        try:
+            with self.Session() as sess, sess.begin():
+                sess.execute(func.pg_advisory_xact_lock(func.hashtext(memory.id)).select())
+                result = sess.execute(
+                    update(self.table)
+                    .where(self.table.c.id == memory.id)
+                    .values(user_id=memory.user_id, memory=memory.memory, updated_at=func.now())
+                )
+                if result.rowcount == 0:
+                    sess.execute(insert(self.table).values(id=memory.id, user_id=memory.user_id, memory=memory.memory))
+        except Exception as e:
+            logger.warning(f"Exception upserting memory '{memory.id}' into {self.table.fullname}: {e}")
+            return None
+
+    def delete_memory(self, memory_id: str) -> None:
+        if self.write_behind:
+            memory_writes.delete(self, memory_id)
+            return None
+        super().delete_memory(memory_id)
+
+    def write_changes(self, changes: Dict[str, Optional[MemoryRow]]) -> None:
+        """
+        Apply queued changes (memory id -> row, or None to delete) in one transaction: one
+        multi-row UPDATE, one multi-row INSERT for the ids it did not find, and one DELETE.
+        """
+        upserts = [memory for memory in changes.values() if memory is not None]
+        deletes = [memory_id for memory_id, memory in changes.items() if memory is None]
+        with self.Session() as sess, sess.begin():
+            if upserts:
+                # The per-id locks `upsert_memory` takes, in a fixed order so concurrent flushes cannot deadlock.
+                sess.execute(
+                    text(
+                        "SELECT pg_advisory_xact_lock(hashtext(id)) "
+                        "FROM (SELECT id FROM unnest(CAST(:ids AS text[])) AS ids(id) ORDER BY id) AS ordered"
+                    ),
+                    {"ids": sorted(memory.id for memory in upserts)}
+                )
+                rows = values(
+                    column("id", String), column("user_id", String), column("memory", JSONB), name="changes"
+                ).data([(memory.id, memory.user_id, memory.memory) for memory in upserts])
+                updated = set(sess.execute(
+                    update(self.table)
+                    .where(self.table.c.id == rows.c.id)
+                    .values(user_id=rows.c.user_id, memory=rows.c.memory, updated_at=func.now())
+                    .returning(self.table.c.id)
+                ).scalars())
+                missing = [memory for memory in upserts if memory.id not in updated]
+                if missing:
+                    sess.execute(
+                        insert(self.table),
+                        [{"id": memory.id, "user_id": memory.user_id, "memory": memory.memory} for memory in missing]
+                    )
+            if deletes:
+                sess.execute(delete(self.table).where(self.table.c.id.in_(deletes)))
+
+
+def get_memory_db(table_name: str) -> PartitionedPostgresMemoryDb:
+    return PartitionedPostgresMemoryDb(table_name=table_name, db_url=db_url)
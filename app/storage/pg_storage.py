@@ -1,8 +1,19 @@
 import os
+import time
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
 from dotenv import load_dotenv
 
+from sqlalchemy import BigInteger, Column, LargeBinary, String, Table, Text, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql
 from agno.storage.postgres import PostgresStorage
+from agno.storage.session import Session
+from agno.storage.session.agent import AgentSession
+
+from app.storage.session_codec import compact_memory, compress, decompress, expand_memory, referenced_prompts
 
 
 load_dotenv()
@@ -11,14 +22,201 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 db_url = os.getenv("DB_URL")
+session_storage_format = os.getenv("SESSION_STORAGE_FORMAT", "compact")
+session_keep_runs = int(os.getenv("SESSION_KEEP_RUNS", 3))
+# Static system prompt prefixes kept in memory; one per agent (and instructions version) in practice.
+SESSION_PROMPT_CACHE_ENTRIES = int(os.getenv("SESSION_PROMPT_CACHE_ENTRIES", 256))
+
+
+class PartitionedPostgresStorage(PostgresStorage):
+    """
+    PostgresStorage for the range-partitioned `agent_sessions` table.
+
+    A partitioned table cannot keep a unique constraint on `session_id` alone, so the
+    `ON CONFLICT (session_id)` upsert used by agno is replaced with an update-then-insert
+    guarded by a transaction-scoped advisory lock on the session id.
+
+    Every write bumps the `version` column so that write-back caches in other workers can
+    detect that the row changed under them (see `app.storage.session_cache`).
+
+    With `session_format="compact"` the memory is written to `memory_blob` instead of the
+    JSONB `memory` column: trimmed to the last `keep_runs` runs, with the static part of
+    system prompts stored once in `prompt_table_name` and referenced by hash, and compressed
+    (see `app.storage.session_codec`). Rows in either format are readable.
+    """
+
+    def __init__(
+        self,
+        *args,
+        session_format: str = "json",
+        keep_runs: int = 3,
+        prompt_table_name: str = "agent_session_prompts",
+        **kwargs
+    ):
+        self.session_format = session_format
+        self.keep_runs = keep_runs
+        super().__init__(*args, **kwargs)
+        self.prompt_table = Table(
+            prompt_table_name,
+            self.metadata,
+            Column("hash", String, primary_key=True),
+            Column("content", Text, nullable=False),
+            extend_existing=True,
+        )
+        self._prompts: "OrderedDict[str, str]" = OrderedDict()
+        self._prompts_lock = threading.Lock()
+
+    def get_table_v1(self) -> Table:
+        table = super().get_table_v1()
+        table.append_column(
+            Column("version", BigInteger, nullable=False, server_default=text("0")),
+            replace_existing=True
+        )
+        table.append_column(Column("memory_blob", LargeBinary, nullable=True), replace_existing=True)
+        return table
+
+    def _session_values(self, session: Session) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        values = dict(
+            agent_id=session.agent_id,
+            team_session_id=session.team_session_id,
+            user_id=session.user_id,
+            memory=session.memory,
+            memory_blob=None,
+            agent_data=session.agent_data,
+            session_data=session.session_data,
+            extra_data=session.extra_data,
+        )
+        prompts: Dict[str, str] = {}
+        if self.session_format == "compact" and session.memory is not None:
+            compact, prompts = compact_memory(session.memory, self.keep_runs)
+            values["memory"] = None
+            values["memory_blob"] = compress(compact)
+        return values, prompts
+
+    def _store_prompts(self, sess, prompts: Dict[str, str]) -> None:
+        new_prompts = [{"hash": ref, "content": content} for ref, content in prompts.items() if ref not in self._prompts]
+        if new_prompts:
+            sess.execute(postgresql.insert(self.prompt_table).values(new_prompts).on_conflict_do_nothing())
+
+    def _remember_prompts(self, prompts: Mapping[str, str]) -> None:
+        with self._prompts_lock:
+            for ref, content in prompts.items():
+                self._prompts[ref] = content
+                self._prompts.move_to_end(ref)
+            while len(self._prompts) > SESSION_PROMPT_CACHE_ENTRIES:
+                self._prompts.popitem(last=False)
+
+    def _load_prompts(self, refs: Iterable[str]) -> Dict[str, str]:
+        with self.Session() as sess:
+            rows = sess.execute(
+                select(self.prompt_table.c.hash, self.prompt_table.c.content)
+                .where(self.prompt_table.c.hash.in_(list(refs)))
+            ).fetchall()
+        return {row.hash: row.content for row in rows}
+
+    def _row_to_session(self, mapping: Mapping[str, Any]) -> Optional[AgentSession]:
+        data = dict(mapping)
+        blob = data.get("memory_blob")
+        if blob is not None:
+            memory = decompress(blob)
+            refs = referenced_prompts(memory)
+            with self._prompts_lock:
+                prompts = {ref: self._prompts[ref] for ref in refs if ref in self._prompts}
+            if len(prompts) < len(refs):
+                prompts.update(self._load_prompts(refs - prompts.keys()))
+            self._remember_prompts(prompts)
+            data["memory"] = expand_memory(memory, prompts)
+        return AgentSession.from_dict(data)
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[Session]:
+        if self.mode != "agent":
+            return super().read(session_id=session_id, user_id=user_id)
+        try:
+            with self.Session() as sess:
+                stmt = select(self.table).where(self.table.c.session_id == session_id)
+                if user_id:
+                    stmt = stmt.where(self.table.c.user_id == user_id)
+                row = sess.execute(stmt).fetchone()
+            return self._row_to_session(row._mapping) if row is not None else None
+        except Exception as e:
+            logger.warning(f"Exception reading session '{session_id}' from {self.table.fullname}: {e}")
+            return None
+
+    def read_with_version(self, session_id: str) -> Tuple[Optional[AgentSession], int]:
+        """Read a session together with its row version (0 when the row does not exist yet)."""
+        with self.Session() as sess:
+            row = sess.execute(select(self.table).where(self.table.c.session_id == session_id)).fetchone()
+        if row is None:
+            return None, 0
+        return self._row_to_session(row._mapping), row._mapping["version"]
+
+    def write_if_version(self, session: Session, expected_version: int) -> Optional[int]:
+        """
+        Write a session only if its row is still at `expected_version`.
+
+        Returns the new version, or None when another writer got there first.
+        """
+        values, prompts = self._session_values(session)
+        new_version: Optional[int] = None
+        with self.Session() as sess, sess.begin():
+            sess.execute(func.pg_advisory_xact_lock(func.hashtext(session.session_id)).select())
+            self._store_prompts(sess, prompts)
+            result = sess.execute(
+                update(self.table)
+                .where(self.table.c.session_id == session.session_id)
+                .where(self.table.c.version == expected_version)
+                .values(**values, updated_at=int(time.time()), version=expected_version + 1)
+            )
+            if result.rowcount == 1:
+                new_version = expected_version + 1
+            elif expected_version == 0:
+                exists = sess.execute(
+                    select(self.table.c.version).where(self.table.c.session_id == session.session_id)
+                ).first()
+                if exists is None:
+                    sess.execute(insert(self.table).values(session_id=session.session_id, version=1, **values))
+                    new_version = 1
+        self._remember_prompts(prompts)
+        return new_version
+
+    def upsert(self, session: Session, create_and_retry: bool = True) -> Optional[Session]:
+        if self.mode != "agent":
+            return super().upsert(session, create_and_retry=create_and_retry)
+
+        if self.auto_upgrade_schema and not self._schema_up_to_date:
+            self.upgrade_schema()
+
+        values, prompts = self._session_values(session)
+        try:
+            with self.Session() as sess, sess.begin():
+                sess.execute(func.pg_advisory_xact_lock(func.hashtext(session.session_id)).select())
+                self._store_prompts(sess, prompts)
+                result = sess.execute(
+                    update(self.table)
+                    .where(self.table.c.session_id == session.session_id)
+                    .values(**values, updated_at=int(time.time()), version=self.table.c.version + 1)
+                )
+                if result.rowcount == 0:
+                    sess.execute(insert(self.table).values(session_id=session.session_id, version=1, **values))
+            self._remember_prompts(prompts)
+        except Exception as e:
+            logger.warning(f"Exception upserting session '{session.session_id}' into {self.table.fullname}: {e}")
+            return None
+        return self.read(session_id=session.session_id)
+
 
-try: 
-    pg_storage = PostgresStorage(
-        table_name="agent_sessions",
-        db_url=db_url,
-        auto_upgrade_schema=True
-    )
-    logger.info("PostgresStorage initialized successfully.")
-except Exception as e:
-    logger.error(f"Error initializing PostgresStorage: {e}")
-    raise
+@lru_cache(maxsize=1)
+def get_pg_storage() -> PartitionedPostgresStorage:
+    try:
+        pg_storage = PartitionedPostgresStorage(
+            table_name="agent_sessions",
+            db_url=db_url,
+            auto_upgrade_schema=True,
+            session_format=session_storage_format,
+            keep_runs=session_keep_runs
+        )
+        logger.info(f"PostgresStorage initialized successfully (session format: {session_storage_format}).")
+        return pg_storage
+    except Exception as e:
+        logger.error(f"Error initializing PostgresStorage: {e}")
+        raise
@@ -0,0 +1,85 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+# How many quantized candidates per requested result are re-scored with the float vectors.
+VECTOR_RESCORE_OVERSAMPLING = float(os.getenv("VECTOR_RESCORE_OVERSAMPLING", 2.0))
+INT8_QUANTILE = 0.99
+# Rows scored per step; numpy has no int8 GEMM, so codes are widened one block at a time.
+SCAN_BLOCK = 4096
+
+QUANTIZATION_KINDS = ("none", "int8", "binary")
+
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class QuantizedIndex:
+    """
+    Brute-force cosine index over int8 or binary codes with float re-scoring.
+
+    Mirrors what the Qdrant collection does with `VECTOR_QUANTIZATION`: the quantized codes
+    are scanned to pick `oversampling * k` candidates, which are then re-ranked with the
+    original float32 vectors (kept on disk by Qdrant, in `float_vectors` here). int8 uses a
+    single clipped range from the `INT8_QUANTILE` quantile, like Qdrant's scalar quantization.
+    """
+
+    def __init__(self, vectors: np.ndarray, kind: str = VECTOR_QUANTIZATION):
+        if kind not in QUANTIZATION_KINDS:
+            raise ValueError(f"Unknown quantization '{kind}', expected one of {QUANTIZATION_KINDS}.")
+        self.kind = kind
+        self.float_vectors = normalize(vectors)
+        self.codes: Optional[np.ndarray] = None
+
+        if kind == "int8":
+            bound = float(np.quantile(np.abs(self.float_vectors), INT8_QUANTILE))
+            self.scale = 127.0 / bound
+            self.codes = self._to_int8(self.float_vectors)
+        elif kind == "binary":
+            self.codes = np.packbits(self.float_vectors > 0, axis=1)
+
+    def _to_int8(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors * self.scale), -127, 127).astype(np.int8)
+
+    @property
+    def search_bytes_per_vector(self) -> int:
+        """Bytes that must stay in RAM per vector for the candidate scan."""
+        if self.codes is None:
+            return self.float_vectors.shape[1] * 4
+        return self.codes.shape[1] * self.codes.itemsize
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        if self.kind == "int8":
+            query_codes = self._to_int8(query[None, :])[0].astype(np.float32)
+            for start in range(0, len(self.codes), SCAN_BLOCK):
+                scores[start:start + SCAN_BLOCK] = self.codes[start:start + SCAN_BLOCK].astype(np.float32) @ query_codes
+            return scores
+        # Binary: fewer differing sign bits means a smaller angle.
+        query_bits = np.packbits(query > 0)
+        for start in range(0, len(self.codes), SCAN_BLOCK):
+            differing = np.bitwise_xor(self.codes[start:start + SCAN_BLOCK], query_bits)
+            scores[start:start + SCAN_BLOCK] = -_POPCOUNT[differing].sum(axis=1, dtype=np.int32)
+        return scores
+
+    def search(self, query: np.ndarray, k: int = 5, oversampling: float = VECTOR_RESCORE_OVERSAMPLING, rescore: bool = True) -> np.ndarray:
+        query = normalize(query)
+        if self.codes is None:
+            scores = self.float_vectors @ query
+            return np.argsort(-scores)[:k]
+
+        scores = self._approximate_scores(query)
+        candidates = min(len(scores), max(k, int(k * oversampling)) if rescore else k)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        if not rescore:
+            return top[np.argsort(-scores[top])][:k]
+        exact = self.float_vectors[top] @ query
+        return top[np.argsort(-exact)][:k]
@@ -1,11 +1,22 @@
 import os
+import time
+import pickle
 import logging
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
-from agno.embedder.google import GeminiEmbedder
 from agno.knowledge.pdf import PDFKnowledgeBase, PDFReader
-from agno.vectordb.qdrant import Qdrant
-from agno.document.chunking.agentic import AgenticChunking
+from agno.document import Document
+from pydantic import Field
+
+from app.storage.dedup import NearDuplicateFilter
+from app.storage.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.storage.quantization import VECTOR_QUANTIZATION
+from app.storage.retrieval_cache import RetrievalCache, cache_key
+from app.storage.specialty_router import SPECIALTY_FIELD, SpecialtyRouter, tag_specialty
+from app.monitoring import metrics
 
 
 load_dotenv()
@@ -16,37 +27,268 @@ logger = logging.getLogger(__name__)
 qdrant_api_key = os.getenv("QDRANT_API_KEY")
 qdrant_url = os.getenv("QDRANT_URL")
 collection_name = "pdf_rag"
+knowledge_base_path = os.getenv("KNOWLEDGE_BASE_PATH", "data/pdfs")
 google_api_key = os.getenv("GOOGLE_API_KEY")
+hybrid_search_enabled = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+hybrid_candidates = int(os.getenv("RAG_HYBRID_CANDIDATES", 20))
+retrieval_cache_enabled = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+dedup_enabled = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+specialty_routing_enabled = os.getenv("SPECIALTY_ROUTING_ENABLED", "true").lower() == "true"
+
+
+class HybridPDFKnowledgeBase(PDFKnowledgeBase):
+    """
+    PDFKnowledgeBase that also keeps an in-process BM25 index of the same chunks.
+
+    Chunks are added to the lexical index as they are produced during ingestion (so the
+    agentic chunking runs only once) or, when the collection was loaded by an earlier
+    process, rebuilt from the Qdrant payloads. Searches pull `candidates` chunks from
+    each side and fuse them with reciprocal rank fusion, which recovers exact matches on
+    drug names and codes that the dense embeddings miss without raising `num_documents`.
+
+    Search results are cached per (corpus version, normalized query, top-k, filters); the
+    corpus version is bumped whenever the indexed chunks change, so stale entries are
+    never served after an ingestion.
+
+    Chunks are tagged with a specialty at ingestion (`meta_data.specialty`). When a
+    `router` is set, unfiltered searches only visit the partitions it picks for the query,
+    and fall back to the whole collection if it is unsure or the partitions come back empty.
+    """
+
+    lexical_index: BM25Index = Field(default_factory=BM25Index)
+    hybrid: bool = True
+    candidates: int = 20
+    retrieval_cache: Optional[RetrievalCache] = Field(default_factory=RetrievalCache)
+    corpus_version: int = 0
+    # Drops near-duplicate chunks (repeated headers, disclaimers, tables) before they are embedded.
+    deduplicator: Optional[NearDuplicateFilter] = None
+    # Id of the `ai.knowledge_base_versions` row this worker's lexical index was built from.
+    active_version: Optional[int] = None
+    router: Optional[SpecialtyRouter] = None
+
+    def bump_corpus_version(self) -> int:
+        self.corpus_version += 1
+        logger.info(f"Knowledge base corpus version is now {self.corpus_version}.")
+        return self.corpus_version
+
+    @property
+    async def async_document_lists(self) -> AsyncIterator[List[Document]]:
+        async for documents in super().async_document_lists:
+            for document in documents:
+                tag_specialty(document)
+            if self.deduplicator is not None:
+                documents = self.deduplicator.filter(documents)
+            self.lexical_index.add(documents)
+            yield documents
+
+    @property
+    def document_lists(self):
+        for documents in super().document_lists:
+            for document in documents:
+                tag_specialty(document)
+            if self.deduplicator is not None:
+                documents = self.deduplicator.filter(documents)
+            self.lexical_index.add(documents)
+            yield documents
+
+    def stored_documents(self, batch_size: int = 256, collection: Optional[str] = None) -> Iterator[Document]:
+        """Iterate over the chunks stored in the Qdrant collection (payloads only, no vectors)."""
+        offset = None
+        while True:
+            points, offset = self.vector_db.client.scroll(
+                collection_name=collection or self.vector_db.collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for point in points:
+                if point.payload:
+                    yield Document(
+                        name=point.payload.get("name"),
+                        meta_data=point.payload.get("meta_data") or {},
+                        content=point.payload.get("content") or ""
+                    )
+            if offset is None:
+                break
+
+    def build_lexical_index(self, collection: Optional[str] = None) -> Tuple[BM25Index, Optional[SpecialtyRouter]]:
+        """Build a lexical index (and router) from the chunks stored in `collection`, leaving the live one alone."""
+        lexical_index = BM25Index()
+        lexical_index.add(self.stored_documents(collection=collection))
+        router = SpecialtyRouter().fit(lexical_index.documents()) if self.router is not None else None
+        logger.info(f"Lexical index built from '{collection or self.vector_db.collection}' with {len(lexical_index)} chunks.")
+        return lexical_index, router
+
+    def swap_lexical_index(self, lexical_index: BM25Index, router: Optional[SpecialtyRouter] = None) -> None:
+        """Swap in a built lexical index (and router), bump the corpus version, then drop the cached searches."""
+        self.lexical_index = lexical_index
+        if self.router is not None and router is not None:
+            self.router = router
+            logger.info(f"Specialty router fitted on partitions: {self.router.chunks}")
+        self.bump_corpus_version()
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+
+    def index_from_vector_db(self) -> int:
+        """Rebuild the lexical index from the chunks stored in the Qdrant collection, then swap it in."""
+        self.swap_lexical_index(*self.build_lexical_index())
+        return len(self.lexical_index)
+
+    def save_lexical_snapshot(self, path: str) -> None:
+        """Write the lexical index and the fitted router to `path` (atomically), for other processes to load."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        with open(temporary, "wb") as file:
+            pickle.dump({"lexical_index": self.lexical_index, "router": self.router}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, target)
+
+    def load_lexical_snapshot(self, path: str) -> bool:
+        """Swap in the lexical index (and router) saved at `path`; False when there is no such snapshot."""
+        if not Path(path).is_file():
+            return False
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        self.swap_lexical_index(state["lexical_index"], state["router"])
+        logger.info(f"Lexical index loaded from '{path}' with {len(self.lexical_index)} chunks.")
+        return True
+
+    def _fuse(self, query: str, dense: List[Document], limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        lexical = [document for document, _ in self.lexical_index.search(query, limit=self.candidates, filters=filters)]
+        return reciprocal_rank_fusion([dense, lexical], limit=limit)
+
+    def search(
+        self, query: str, num_documents: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        limit = num_documents or self.num_documents
+        if self.retrieval_cache is None:
+            return self._search(query, limit, filters)
+        key = cache_key(query, limit, filters, self.corpus_version)
+        documents = self.retrieval_cache.get(key)
+        if documents is None:
+            start = time.perf_counter()
+            documents = self._search(query, limit, filters)
+            if documents:
+                self.retrieval_cache.put(key, documents, (time.perf_counter() - start) * 1000)
+        return documents
+
+    async def async_search(
+        self, query: str, num_documents: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        limit = num_documents or self.num_documents
+        if self.retrieval_cache is None:
+            return await self._async_search(query, limit, filters)
+        key = cache_key(query, limit, filters, self.corpus_version)
+        documents = self.retrieval_cache.get(key)
+        if documents is None:
+            start = time.perf_counter()
+            documents = await self._async_search(query, limit, filters)
+            if documents:
+                self.retrieval_cache.put(key, documents, (time.perf_counter() - start) * 1000)
+        return documents
+
+    def _route(self, query: str, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Filters restricted to the routed specialty partitions, or None to search everything."""
+        if self.router is None or (filters and SPECIALTY_FIELD in filters):
+            return None
+        specialties = self.router.route(query)
+        if specialties is None:
+            metrics.increment("routing.global")
+            return None
+        metrics.increment("routing.routed")
+        return {**(filters or {}), SPECIALTY_FIELD: specialties}
+
+    def _search(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        routed = self._route(query, filters)
+        if routed is not None:
+            documents = self._search_partitions(query, limit, routed)
+            if documents:
+                return documents
+            metrics.increment("routing.fallback")
+        return self._search_partitions(query, limit, filters)
+
+    async def _async_search(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        routed = self._route(query, filters)
+        if routed is not None:
+            documents = await self._async_search_partitions(query, limit, routed)
+            if documents:
+                return documents
+            metrics.increment("routing.fallback")
+        return await self._async_search_partitions(query, limit, filters)
+
+    def _search_partitions(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        if not self.hybrid or not len(self.lexical_index):
+            return super().search(query=query, num_documents=limit, filters=filters)
+        dense = super().search(query=query, num_documents=max(limit, self.candidates), filters=filters)
+        return self._fuse(query, dense, limit, filters)
+
+    async def _async_search_partitions(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        if not self.hybrid or not len(self.lexical_index):
+            return await super().async_search(query=query, num_documents=limit, filters=filters)
+        dense = await super().async_search(query=query, num_documents=max(limit, self.candidates), filters=filters)
+        return self._fuse(query, dense, limit, filters)
+
+
+_pdf_knowledge_base: Optional[HybridPDFKnowledgeBase] = None
+_build_lock = threading.Lock()
+
+
+def build_vector_db(collection: str = collection_name):
+    # The Gemini and Qdrant clients are imported and built here, on first use, not at import;
+    # both run on the process-wide HTTP pool.
+    from agno.embedder.google import GeminiEmbedder
+    from app.storage.vector_store import QuantizedQdrant
+    from app.utils.http_pool import genai_http_options
+
+    if not qdrant_url or not qdrant_api_key or not google_api_key:
+        raise ValueError("QDRANT_URL, QDRANT_API_KEY or GOOGLE_API_KEY were not provided.")
+
+    logger.info(f"RAG Config: QDRANT_URL={qdrant_url}, QDRANT_API_KEY={'***' if qdrant_api_key else 'None'}, GOOGLE_API_KEY={'***' if google_api_key else 'None'}, VECTOR_QUANTIZATION={VECTOR_QUANTIZATION}")
+
+    gemini_embedder_instance = GeminiEmbedder(api_key=google_api_key, client_params={"http_options": genai_http_options()})
+
+    return QuantizedQdrant(
+        url=qdrant_url,
+        api_key=qdrant_api_key,
+        collection=collection,
+        embedder=gemini_embedder_instance
+    )
+
+
+def build_pdf_knowledge_base(
+    collection: str = collection_name,
+    path=knowledge_base_path,
+    with_cache: bool = retrieval_cache_enabled,
+) -> HybridPDFKnowledgeBase:
+    from agno.document.chunking.agentic import AgenticChunking
 
-if not qdrant_url or not qdrant_api_key or not google_api_key:
-    raise ValueError("QDRANT_URL, QDRANT_API_KEY or GOOGLE_API_KEY were not provided.")
+    return HybridPDFKnowledgeBase(
+        path=path,
+        vector_db=build_vector_db(collection),
+        reader=PDFReader(chunk=True),
+        chunking_strategy=AgenticChunking(),
+        hybrid=hybrid_search_enabled,
+        candidates=hybrid_candidates,
+        retrieval_cache=RetrievalCache() if with_cache else None,
+        deduplicator=NearDuplicateFilter() if dedup_enabled else None,
+        router=SpecialtyRouter() if specialty_routing_enabled else None
+    )
 
-logger.info(f"RAG Config: QDRANT_URL={qdrant_url}, QDRANT_API_KEY={'***' if qdrant_api_key else 'None'}, GOOGLE_API_KEY={'***' if google_api_key else 'None'}")
 
-gemini_embedder_instance = GeminiEmbedder(api_key=google_api_key)
+def get_knowledge_base() -> HybridPDFKnowledgeBase:
+    global _pdf_knowledge_base
+    if _pdf_knowledge_base is None:
+        with _build_lock:
+            if _pdf_knowledge_base is None:
+                _pdf_knowledge_base = build_pdf_knowledge_base()
+    return _pdf_knowledge_base
 
-vector_db = Qdrant(
-    url=qdrant_url,
-    api_key=qdrant_api_key,
-    collection=collection_name,
-    embedder=gemini_embedder_instance
-)
 
-pdf_knowledge_base = PDFKnowledgeBase(
-    path="data/pdfs",
-    vector_db=vector_db,
-    reader=PDFReader(chunk=True),
-    chunking_strategy=AgenticChunking()
-)
+def peek_knowledge_base() -> Optional[HybridPDFKnowledgeBase]:
+    """The knowledge base if it was already built, without building it."""
+    return _pdf_knowledge_base
 
-async def load_pdf_knowledge_base():
-    logger.info("Loading knowledge base to QDRANT... (Initiated by Agno)")
-    try:
-        await pdf_knowledge_base.aload(recreate=True)
-        logger.info("Knowledge base uploaded to QDRANT with success!")
-    except Exception as e:
-        logger.error(f"Failed to load knowledge base to QDRANT: {e}", exc_info=True)
-        raise
 
 async def get_pdfknowledge_base():
-    return pdf_knowledge_base
+    return get_knowledge_base()
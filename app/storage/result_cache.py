@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Type, TypeVar
+from dotenv import load_dotenv
+
+from pydantic import BaseModel
+
+from app.utils.symptoms import symptoms_key
+from app.utils.text import tokenize
+
+
+load_dotenv()
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 4096))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 6 * 3600))
+
+M = TypeVar("M", bound=BaseModel)
+ResultKey = Tuple[str, str]
+
+
+def diagnosis_key(user_id: str, symptoms: str) -> str:
+    """Equivalent symptom texts ("Tosse seca e febre", "fever, dry cough") of one user share a key."""
+    return f"{user_id}:{symptoms_key(symptoms)}"
+
+
+def protocol_key(user_id: str, diagnosis: str) -> str:
+    return f"{user_id}:{' '.join(tokenize(diagnosis))}"
+
+
+class ResultCache:
+    """
+    LRU cache of the latest agent result (diagnosis or protocol) per normalized input.
+
+    Filled by every successful agent run and read only in degraded mode, when the service
+    answers from it instead of queueing more work for the language model. Results are
+    stored as JSON-ready dicts and validated back into their schema on `get`.
+
+    Keys are per user: the agents answer with the user's memories and session history in
+    the prompt, so a result is never served to anyone but the user it was produced for.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl_seconds: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[ResultKey, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"stored": 0, "hits": 0, "misses": 0}
+
+    def put(self, kind: str, key: str, result: BaseModel) -> None:
+        with self._lock:
+            self._entries.pop((kind, key), None)
+            self._entries[(kind, key)] = (result.model_dump(), time.monotonic())
+            self.stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, kind: str, key: str, schema: Type[M]) -> Optional[M]:
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and time.monotonic() - entry[1] >= self.ttl_seconds:
+                del self._entries[(kind, key)]
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.stats["hits"] += 1
+        return schema.model_validate(entry[0])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+result_cache = ResultCache()
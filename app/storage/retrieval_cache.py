@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from agno.document import Document
+
+from app.utils.text import tokenize
+
+
+load_dotenv()
+
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", 1024))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", 3600))
+
+CacheKey = Tuple[int, str, int, str]
+
+
+@dataclass
+class CachedResult:
+    documents: List[Document]
+    size: int
+    cost_ms: float
+    stored_at: float
+
+
+def normalize_query(query: str) -> str:
+    """'  Febre ALTA,  tosse ' and 'febre alta tosse' share a cache entry."""
+    return " ".join(tokenize(query))
+
+
+def cache_key(query: str, limit: int, filters: Optional[Dict[str, Any]], corpus_version: int) -> CacheKey:
+    return corpus_version, normalize_query(query), limit, json.dumps(filters or {}, sort_keys=True, default=str)
+
+
+class RetrievalCache:
+    """
+    LRU cache of knowledge-base search results.
+
+    Keys include the corpus version, so bumping it at ingestion invalidates every entry at
+    once without walking the cache. Entries are bounded by count and by content bytes, and
+    expire after `ttl_seconds`. Each entry remembers how long the search that produced it
+    took, which is what `stats["latency_saved_ms"]` adds up on hits.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        max_bytes: int = RETRIEVAL_CACHE_MAX_BYTES,
+        ttl_seconds: float = RETRIEVAL_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[CacheKey, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "latency_saved_ms": 0.0,
+        }
+
+    def get(self, key: CacheKey) -> Optional[List[Document]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.stored_at >= self.ttl_seconds:
+                self._remove(key)
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["latency_saved_ms"] += entry.cost_ms
+            return list(entry.documents)
+
+    def put(self, key: CacheKey, documents: List[Document], cost_ms: float) -> None:
+        size = sum(len(document.content or "") for document in documents)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedResult(list(documents), size, cost_ms, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from agno.storage.base import Storage
+from agno.storage.session import Session
+from agno.storage.session.agent import AgentSession
+
+from app.storage.pg_storage import get_pg_storage, PartitionedPostgresStorage
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", 2048))
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", 30))
+SESSION_CACHE_FLUSH_SECONDS = int(os.getenv("SESSION_CACHE_FLUSH_SECONDS", 5))
+MAX_CONFLICT_RETRIES = 3
+
+
+@dataclass
+class CacheEntry:
+    session: AgentSession
+    size: int
+    dirty: bool
+    loaded_at: float
+
+
+def estimate_size(session: AgentSession) -> int:
+    return len(json.dumps(session.to_dict(), default=str))
+
+
+def merge_runs(ours: AgentSession, theirs: Optional[AgentSession]) -> AgentSession:
+    """Keep our session but carry over runs another worker stored that we have not seen."""
+    if theirs is None or not theirs.memory or not theirs.memory.get("runs"):
+        return ours
+    merged = deepcopy(ours)
+    merged.memory = merged.memory or {}
+    runs = list(merged.memory.get("runs") or [])
+    known = {run.get("run_id") for run in runs}
+    runs.extend(run for run in theirs.memory["runs"] if run.get("run_id") not in known)
+    runs.sort(key=lambda run: run.get("created_at") or 0)
+    merged.memory["runs"] = runs
+    return merged
+
+
+class SessionCache:
+    """
+    Write-back LRU cache of agent sessions keyed by (agent, session_id).
+
+    Reads are served from memory while an entry is fresh, writes only mark the entry dirty
+    and are coalesced until `flush` runs (at the end of an orchestrator run, on the flush
+    timer, on eviction and at shutdown). Flushes are conditional on the row `version`, so a
+    write from another worker is detected and its runs are merged instead of overwritten.
+
+    Eviction drops clean entries right away. A dirty one is never written on the request path:
+    it stays (the cache runs over budget) until the background flush writes it back, and is
+    dropped right after. One whose write failed stays dirty until a later flush gets it through.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[PartitionedPostgresStorage] = None,
+        max_bytes: int = SESSION_CACHE_MAX_BYTES,
+        max_entries: int = SESSION_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SESSION_CACHE_TTL_SECONDS,
+    ):
+        self._backend = backend
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced_writes": 0,
+            "db_reads": 0,
+            "db_writes": 0,
+            "conflicts": 0,
+            "evictions": 0,
+        }
+
+    @property
+    def backend(self) -> PartitionedPostgresStorage:
+        """The Postgres storage, created on first use (defaults to `get_pg_storage()`)."""
+        if self._backend is None:
+            self._backend = get_pg_storage()
+        return self._backend
+
+    def storage_for(self, agent_key: str) -> "CachedAgentStorage":
+        return CachedAgentStorage(cache=self, agent_key=agent_key)
+
+    def get(self, agent_key: str, session_id: str) -> Optional[AgentSession]:
+        key = (agent_key, session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.dirty or time.monotonic() - entry.loaded_at < self.ttl_seconds):
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return deepcopy(entry.session)
+            if entry is not None:
+                self._remove(key)
+            self.stats["misses"] += 1
+
+        try:
+            session, version = self.backend.read_with_version(session_id)
+        except Exception as e:
+            logger.warning(f"Session cache could not read session '{session_id}': {e}")
+            return None
+        self.stats["db_reads"] += 1
+
+        with self._lock:
+            self._versions.setdefault(session_id, version)
+            if session is not None:
+                self._store(key, CacheEntry(session, estimate_size(session), False, time.monotonic()))
+        return deepcopy(session)
+
+    def put(self, agent_key: str, session: AgentSession) -> AgentSession:
+        key = (agent_key, session.session_id)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.dirty:
+                self.stats["coalesced_writes"] += 1
+            self._store(key, CacheEntry(deepcopy(session), estimate_size(session), True, time.monotonic()))
+        return session
+
+    def discard(self, agent_key: str, session_id: str) -> None:
+        with self._lock:
+            if (agent_key, session_id) in self._entries:
+                self._remove((agent_key, session_id))
+
+    def flush(self, session_id: Optional[str] = None) -> int:
+        """Write dirty entries (optionally only those of one session) back to Postgres, then evict over budget."""
+        with self._flush_lock:
+            with self._lock:
+                pending = [
+                    (key, entry)
+                    for key, entry in self._entries.items()
+                    if entry.dirty and (session_id is None or key[1] == session_id)
+                ]
+                for _, entry in pending:
+                    entry.dirty = False
+            written = self._write_pending(pending)
+        with self._lock:
+            overdue = self._evict()
+        if overdue:
+            logger.warning(f"Session cache is over budget with {overdue} dirty session(s) it could not write back yet.")
+        return written
+
+    def _write_pending(self, pending: List[Tuple[Tuple[str, str], CacheEntry]]) -> int:
+        """Write entries already marked clean; those that fail are marked dirty again."""
+        written = 0
+        for key, entry in pending:
+            if self._write_back(entry.session):
+                written += 1
+            else:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        entry.dirty = True
+        return written
+
+    def _write_back(self, session: AgentSession) -> bool:
+        session_id = session.session_id
+        for _ in range(MAX_CONFLICT_RETRIES):
+            with self._lock:
+                expected = self._versions.get(session_id, 0)
+            try:
+                new_version = self.backend.write_if_version(session, expected)
+            except Exception as e:
+                logger.error(f"Session cache failed to write session '{session_id}': {e}")
+                return False
+            self.stats["db_writes"] += 1
+
+            if new_version is not None:
+                with self._lock:
+                    self._versions[session_id] = new_version
+                return True
+
+            self.stats["conflicts"] += 1
+            logger.info(f"Session '{session_id}' changed in another worker, merging before write.")
+            try:
+                theirs, their_version = self.backend.read_with_version(session_id)
+            except Exception as e:
+                logger.error(f"Session cache failed to re-read session '{session_id}' after a conflict: {e}")
+                return False
+            self.stats["db_reads"] += 1
+            with self._lock:
+                self._versions[session_id] = their_version
+            session = merge_runs(session, theirs)
+
+        logger.error(f"Giving up writing session '{session_id}' after {MAX_CONFLICT_RETRIES} conflicts.")
+        return False
+
+    def _store(self, key: Tuple[str, str], entry: CacheEntry) -> int:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        return self._evict()
+
+    def _remove(self, key: Tuple[str, str]) -> CacheEntry:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if not any(other[1] == key[1] for other in self._entries):
+            self._versions.pop(key[1], None)
+        return entry
+
+    def _evict(self) -> int:
+        """Drop clean entries from the LRU end until within budget; return how many dirty ones wait for `flush`."""
+        victims = 0
+        entries, size = len(self._entries), self._bytes
+        for key, entry in list(self._entries.items()):
+            if entries <= 1 or (entries <= self.max_entries and size <= self.max_bytes):
+                break
+            if entry.dirty:
+                victims += 1
+            else:
+                self._remove(key)
+                self.stats["evictions"] += 1
+            entries -= 1
+            size -= entry.size
+        return victims
+
+
+class CachedAgentStorage(Storage):
+    """agno `Storage` view of the session cache for a single agent."""
+
+    def __init__(self, cache: SessionCache, agent_key: str):
+        super().__init__(mode="agent")
+        self.cache = cache
+        self.agent_key = agent_key
+
+    def create(self) -> None:
+        self.cache.backend.create()
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[Session]:
+        session = self.cache.get(self.agent_key, session_id)
+        if session is not None and user_id is not None and session.user_id != user_id:
+            return None
+        return session
+
+    def upsert(self, session: Session) -> Optional[Session]:
+        return self.cache.put(self.agent_key, session)
+
+    def get_all_session_ids(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[str]:
+        self.cache.flush()
+        return self.cache.backend.get_all_session_ids(user_id=user_id, entity_id=entity_id)
+
+    def get_all_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[Session]:
+        self.cache.flush()
+        return self.cache.backend.get_all_sessions(user_id=user_id, entity_id=entity_id)
+
+    def get_recent_sessions(
+        self,
+        user_id: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        limit: Optional[int] = 2,
+    ) -> List[Session]:
+        self.cache.flush()
+        return self.cache.backend.get_recent_sessions(user_id=user_id, entity_id=entity_id, limit=limit)
+
+    def delete_session(self, session_id: Optional[str] = None):
+        if session_id is not None:
+            self.cache.discard(self.agent_key, session_id)
+        self.cache.backend.delete_session(session_id=session_id)
+
+    def drop(self) -> None:
+        self.cache.backend.drop()
+
+    def upgrade_schema(self) -> None:
+        self.cache.backend.upgrade_schema()
+
+
+session_cache = SessionCache()
+
+
+def flush_session_cache():
+    written = session_cache.flush()
+    if written:
+        logger.info(f"Session cache flushed {written} session(s). Stats: {session_cache.stats}")
@@ -0,0 +1,112 @@
+import json
+import zlib
+import hashlib
+from copy import deepcopy
+from typing import Any, Dict, Mapping, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CODEC_ZLIB = b"\x01"
+CODEC_ZSTD = b"\x02"
+PROMPT_REF = "$prompt"
+PROMPT_REST = "rest"
+
+# Where agno starts the per-user part of the system message (user memories, session
+# summary). Everything before the first of these is the agent's fixed description and
+# instructions; from there on the text changes from run to run and holds patient data.
+DYNAMIC_SECTION_MARKERS = (
+    "You have access to memories from previous interactions",
+    "You have the capability to retain memories from previous interactions",
+    "Here is a brief summary of your previous interactions",
+)
+
+
+def prompt_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def split_system_prompt(content: str) -> Tuple[str, str]:
+    """Split a system message into its static prefix and the per-user rest."""
+    cut = min((index for index in map(content.find, DYNAMIC_SECTION_MARKERS) if index >= 0), default=len(content))
+    return content[:cut], content[cut:]
+
+
+def compact_memory(memory: Dict[str, Any], keep_runs: int) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Shrink a stored agent memory dict before it is compressed.
+
+    Only the last `keep_runs` runs are kept, messages replayed from history (which agno
+    skips when rebuilding history) are dropped, and the static prefix of system prompts is
+    replaced by a reference to its hash. The per-user rest (memories, summary) stays inline,
+    so it is stored, and expires, with the session. Returns the compact memory and the
+    referenced prompts.
+    """
+    compact = deepcopy(memory)
+    prompts: Dict[str, str] = {}
+
+    runs = compact.get("runs")
+    if isinstance(runs, list):
+        runs = runs[-keep_runs:] if keep_runs > 0 else []
+        for run in runs:
+            messages = run.get("messages")
+            if not messages:
+                continue
+            kept = []
+            for message in messages:
+                if message.get("from_history"):
+                    continue
+                if message.get("role") == "system" and isinstance(message.get("content"), str):
+                    static, rest = split_system_prompt(message["content"])
+                    if static:
+                        ref = prompt_hash(static)
+                        prompts[ref] = static
+                        message["content"] = {PROMPT_REF: ref, PROMPT_REST: rest} if rest else {PROMPT_REF: ref}
+                kept.append(message)
+            run["messages"] = kept
+        compact["runs"] = runs
+
+    return compact, prompts
+
+
+def referenced_prompts(memory: Mapping[str, Any]) -> Set[str]:
+    refs = set()
+    for run in memory.get("runs") or []:
+        for message in run.get("messages") or []:
+            content = message.get("content")
+            if isinstance(content, dict) and PROMPT_REF in content:
+                refs.add(content[PROMPT_REF])
+    return refs
+
+
+def expand_memory(memory: Dict[str, Any], prompts: Mapping[str, str]) -> Dict[str, Any]:
+    for run in memory.get("runs") or []:
+        for message in run.get("messages") or []:
+            content = message.get("content")
+            if isinstance(content, dict) and PROMPT_REF in content:
+                message["content"] = prompts.get(content[PROMPT_REF], "") + content.get(PROMPT_REST, "")
+    return memory
+
+
+def compress(data: Dict[str, Any]) -> bytes:
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+    if zstandard is not None:
+        return CODEC_ZSTD + zstandard.ZstdCompressor(level=6).compress(raw)
+    return CODEC_ZLIB + zlib.compress(raw, 6)
+
+
+def decompress(blob: bytes) -> Dict[str, Any]:
+    blob = bytes(blob)
+    codec, payload = blob[:1], blob[1:]
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Session was stored with zstd but `zstandard` is not installed.")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec == CODEC_ZLIB:
+        raw = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown session codec: {codec!r}")
+    return json.loads(raw)
@@ -0,0 +1,172 @@
+import os
+import math
+from collections import Counter, defaultdict
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agno.document import Document
+
+from app.utils.text import analyze, fold_accents
+
+
+SPECIALTY_FIELD = "specialty"
+GENERAL_SPECIALTY = "geral"
+SPECIALTY_ROUTING_MIN_CONFIDENCE = float(os.getenv("SPECIALTY_ROUTING_MIN_CONFIDENCE", 0.5))
+# Below this score (one keyword-rule hit is worth KEYWORD_WEIGHT) the evidence is too thin to route.
+SPECIALTY_ROUTING_MIN_SCORE = float(os.getenv("SPECIALTY_ROUTING_MIN_SCORE", 0.3))
+SPECIALTY_ROUTING_MAX = int(os.getenv("SPECIALTY_ROUTING_MAX", 2))
+# Weight of a keyword-rule hit next to the centroid cosine (which is in [0, 1]).
+KEYWORD_WEIGHT = 0.5
+MIN_KEYWORD_HITS = 2
+RUNNER_UP_RATIO = 0.5
+
+# Keyword rules used to tag chunks of PDFs that are not under a specialty directory, and as
+# a prior for the router. Directory names under KNOWLEDGE_BASE_PATH should use the same keys.
+SPECIALTY_KEYWORDS = {
+    "respiratoria": """tosse pneumonia asma bronquite bronquiolite dispneia pulmao pulmonar chiado
+        sibilancia escarro expectoracao tuberculose gripe influenza sinusite rinite dpoc enfisema pleura""",
+    "cardiologia": """coracao cardiaco cardiaca peito palpitacao arritmia infarto hipertensao
+        angina taquicardia bradicardia sopro eletrocardiograma miocardio""",
+    "pediatria": """crianca criancas bebe lactente recem nascido neonatal infantil pediatrico pediatria
+        puericultura aleitamento amamentacao escolar adolescente""",
+    "infectologia": """infeccao infeccioso antibiotico antimicrobiano dengue zika chikungunya hiv sepse bacteria
+        bacteriano virus viral fungo parasita malaria hepatite isolamento""",
+}
+
+_KEYWORD_TERMS = {specialty: set(analyze(words)) for specialty, words in SPECIALTY_KEYWORDS.items()}
+
+
+def specialty_from_source(source: Optional[str]) -> Optional[str]:
+    """'cardiologia/diretriz_ic.pdf' -> 'cardiologia'. Files at the root of the PDF directory have no specialty."""
+    if not source:
+        return None
+    parts = PurePosixPath(source).parts
+    if len(parts) < 2:
+        return None
+    return fold_accents(parts[0]).replace(" ", "_")
+
+
+def keyword_scores(terms: Iterable[str]) -> Dict[str, int]:
+    counts = Counter(terms)
+    scores = {}
+    for specialty, keywords in _KEYWORD_TERMS.items():
+        hits = sum(counts[term] for term in keywords)
+        if hits:
+            scores[specialty] = hits
+    return scores
+
+
+def classify_text(text: str) -> str:
+    """Keyword-rule specialty of a chunk; chunks without a clear winner go to the general partition."""
+    scores = keyword_scores(analyze(text))
+    if not scores:
+        return GENERAL_SPECIALTY
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, hits = ranked[0]
+    if hits < MIN_KEYWORD_HITS or (len(ranked) > 1 and ranked[1][1] == hits):
+        return GENERAL_SPECIALTY
+    return best
+
+
+def tag_specialty(document: Document) -> str:
+    """Set `meta_data.specialty` from the PDF's directory, falling back to the keyword rules."""
+    meta_data = document.meta_data if document.meta_data is not None else {}
+    specialty = meta_data.get(SPECIALTY_FIELD) or specialty_from_source(meta_data.get("source")) or classify_text(document.content or "")
+    meta_data[SPECIALTY_FIELD] = specialty
+    document.meta_data = meta_data
+    return specialty
+
+
+class SpecialtyRouter:
+    """
+    Picks which specialty partitions of the knowledge base a query should search.
+
+    Each specialty gets a centroid of the tf-idf term vectors of its chunks; a query is
+    scored by cosine against every centroid plus the keyword rules. When the best
+    specialty scores below `min_score` or takes less than `min_confidence` of the total
+    score, or the corpus has a single specialty, `route` returns None and the caller searches everything. The general
+    partition is always searched alongside the routed specialties.
+    """
+
+    def __init__(
+        self,
+        min_confidence: float = SPECIALTY_ROUTING_MIN_CONFIDENCE,
+        min_score: float = SPECIALTY_ROUTING_MIN_SCORE,
+        max_specialties: int = SPECIALTY_ROUTING_MAX,
+    ):
+        self.min_confidence = min_confidence
+        self.min_score = min_score
+        self.max_specialties = max_specialties
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        self.idf: Dict[str, float] = {}
+        self.chunks: Dict[str, int] = {}
+
+    @property
+    def specialties(self) -> List[str]:
+        return sorted(specialty for specialty in self.chunks if specialty != GENERAL_SPECIALTY)
+
+    def fit(self, documents: Iterable[Document]) -> "SpecialtyRouter":
+        term_counts: Dict[str, List[Counter]] = defaultdict(list)
+        document_freq: Counter = Counter()
+        for document in documents:
+            specialty = (document.meta_data or {}).get(SPECIALTY_FIELD)
+            if not specialty or not document.content:
+                continue
+            counts = Counter(analyze(document.content))
+            term_counts[specialty].append(counts)
+            document_freq.update(counts.keys())
+
+        total = sum(len(chunks) for chunks in term_counts.values())
+        self.idf = {term: math.log(1 + total / freq) for term, freq in document_freq.items()}
+        self.chunks = {specialty: len(chunks) for specialty, chunks in term_counts.items()}
+        self.centroids = {}
+        for specialty, chunks in term_counts.items():
+            centroid: Dict[str, float] = defaultdict(float)
+            for counts in chunks:
+                vector = self._weigh(counts)
+                for term, weight in vector.items():
+                    centroid[term] += weight / len(chunks)
+            self.centroids[specialty] = _unit(centroid)
+        return self
+
+    def _weigh(self, counts: Counter) -> Dict[str, float]:
+        return _unit({term: (1 + math.log(freq)) * self.idf.get(term, 0.0) for term, freq in counts.items()})
+
+    def scores(self, query: str) -> Dict[str, float]:
+        terms = analyze(query)
+        vector = self._weigh(Counter(terms))
+        keywords = keyword_scores(terms)
+        scores = {}
+        for specialty in self.specialties:
+            centroid = self.centroids[specialty]
+            cosine = sum(weight * centroid.get(term, 0.0) for term, weight in vector.items())
+            score = cosine + KEYWORD_WEIGHT * keywords.get(specialty, 0)
+            if score > 0:
+                scores[specialty] = score
+        return scores
+
+    def route(self, query: str) -> Optional[List[str]]:
+        """Specialties to search (plus the general partition), or None to search the whole collection."""
+        if len(self.specialties) < 2:
+            return None
+        scores = self.scores(query)
+        if not scores:
+            return None
+        ranked: List[Tuple[str, float]] = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        total = sum(score for _, score in ranked)
+        best = ranked[0][1]
+        if best < self.min_score or best / total < self.min_confidence:
+            return None
+
+        # Borderline queries ("febre e tosse em criança") also search the close runners-up.
+        routed = [specialty for specialty, score in ranked[: self.max_specialties] if score >= RUNNER_UP_RATIO * best]
+        if GENERAL_SPECIALTY in self.chunks:
+            routed.append(GENERAL_SPECIALTY)
+        return routed
+
+
+def _unit(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return dict(vector)
+    return {term: weight / norm for term, weight in vector.items()}
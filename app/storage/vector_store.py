@@ -0,0 +1,132 @@
+from typing import Any, Dict, List, Optional
+
+from agno.vectordb.distance import Distance
+from agno.vectordb.qdrant import Qdrant
+from agno.utils.log import log_debug
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from app.storage.quantization import VECTOR_QUANTIZATION, VECTOR_RESCORE_OVERSAMPLING
+from app.storage.specialty_router import SPECIALTY_FIELD
+from app.utils.http_pool import http_pool
+
+
+def quantization_config(kind: str) -> Optional[models.QuantizationConfig]:
+    if kind == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+class QuantizedQdrant(Qdrant):
+    """
+    Qdrant vector db whose collections keep int8 or binary codes in RAM and the float32
+    vectors on disk. Searches scan the codes, then re-score `oversampling * limit`
+    candidates with the float vectors, and no longer ship the vectors back with each hit
+    (nothing downstream reads `Document.embedding`). Collections get a keyword payload index
+    on `meta_data.specialty`, so routed searches only visit their specialty partitions. The
+    REST clients run on the process-wide HTTP pool.
+    """
+
+    def __init__(self, *args, quantization: str = VECTOR_QUANTIZATION, oversampling: float = VECTOR_RESCORE_OVERSAMPLING, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.quantization = quantization
+        self.oversampling = oversampling
+
+    @property
+    def client(self) -> QdrantClient:
+        if self._client is None:
+            self._client = self._on_shared_pool(Qdrant.client.fget, http_pool.transport())
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        if self._async_client is None:
+            self._async_client = self._on_shared_pool(Qdrant.async_client.fget, http_pool.async_transport())
+        return self._async_client
+
+    def _on_shared_pool(self, build, transport):
+        """Build a Qdrant client whose REST calls go through the process-wide HTTP pool."""
+        kwargs = self.kwargs
+        self.kwargs = {**kwargs, "transport": transport}
+        try:
+            return build(self)
+        finally:
+            self.kwargs = kwargs
+
+    def _collection_config(self) -> Dict[str, Any]:
+        distance = {
+            Distance.l2: models.Distance.EUCLID,
+            Distance.max_inner_product: models.Distance.DOT,
+        }.get(self.distance, models.Distance.COSINE)
+        quantization = quantization_config(self.quantization)
+        return dict(
+            collection_name=self.collection,
+            vectors_config=models.VectorParams(size=self.dimensions, distance=distance, on_disk=quantization is not None),
+            quantization_config=quantization,
+        )
+
+    def create(self) -> None:
+        if self.use_named_vectors:
+            return super().create()
+        if not self.exists():
+            log_debug(f"Creating collection: {self.collection} (quantization: {self.quantization})")
+            self.client.create_collection(**self._collection_config())
+            self.client.create_payload_index(self.collection, f"meta_data.{SPECIALTY_FIELD}", models.PayloadSchemaType.KEYWORD)
+
+    async def async_create(self) -> None:
+        if self.use_named_vectors:
+            return await super().async_create()
+        if not await self.async_exists():
+            log_debug(f"Creating collection asynchronously: {self.collection} (quantization: {self.quantization})")
+            await self.async_client.create_collection(**self._collection_config())
+            await self.async_client.create_payload_index(
+                self.collection, f"meta_data.{SPECIALTY_FIELD}", models.PayloadSchemaType.KEYWORD
+            )
+
+    def _format_filters(self, filters: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+        """Like agno's, but a list value matches any of its items (used to search several specialty partitions)."""
+        conditions = []
+        for key, value in (filters or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                key = key if "." in key else f"meta_data.{key}"
+                conditions.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(value))))
+            else:
+                conditions.extend(super()._format_filters({key: value}).must)
+        return models.Filter(must=conditions) if conditions else None
+
+    def _search_params(self) -> Optional[models.SearchParams]:
+        if self.quantization not in ("int8", "binary"):
+            return None
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+        )
+
+    def _run_vector_search_sync(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[models.ScoredPoint]:
+        if self.use_named_vectors:
+            return super()._run_vector_search_sync(query, limit, filters)
+        return self.client.query_points(
+            collection_name=self.collection,
+            query=self.embedder.get_embedding(query),
+            with_vectors=False,
+            with_payload=True,
+            limit=limit,
+            query_filter=filters,
+            search_params=self._search_params(),
+        ).points
+
+    async def _run_vector_search_async(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[models.ScoredPoint]:
+        if self.use_named_vectors:
+            return await super()._run_vector_search_async(query, limit, filters)
+        call = await self.async_client.query_points(
+            collection_name=self.collection,
+            query=self.embedder.get_embedding(query),
+            with_vectors=False,
+            with_payload=True,
+            limit=limit,
+            query_filter=filters,
+            search_params=self._search_params(),
+        )
+        return call.points
@@ -0,0 +1,16 @@
+import os
+
+
+# standalone: one process does everything (the default, and what `uvicorn --workers 1` runs).
+# supervisor: `scripts/supervisor.py`, which owns ingestion and the cleanup schedule and starts the workers.
+# worker: serves requests only; it follows the knowledge-base versions the supervisor publishes.
+STANDALONE = "standalone"
+SUPERVISOR = "supervisor"
+WORKER = "worker"
+
+APP_ROLE = os.getenv("APP_ROLE", STANDALONE).lower()
+
+
+def owns_ingestion(role: str = APP_ROLE) -> bool:
+    """Whether this process ingests PDFs and runs the cleanup schedule itself."""
+    return role != WORKER
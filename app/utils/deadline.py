@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Awaitable, Optional, TypeVar
+
+from app.monitoring import metrics
+
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 120))
+REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", 300))
+DISCONNECT_POLL_SECONDS = 0.5
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during '{stage}'.")
+        self.stage = stage
+
+
+class ClientDisconnected(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Client disconnected during '{stage}'.")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute point in time a request must finish by, shared by every stage of that request."""
+
+    def __init__(self, seconds: float = REQUEST_DEADLINE_SECONDS):
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + seconds
+
+    @classmethod
+    def from_client(cls, seconds: Optional[float]) -> "Deadline":
+        """Client-supplied timeout, capped at `REQUEST_DEADLINE_MAX_SECONDS`; the server default otherwise."""
+        if seconds is None or seconds <= 0:
+            return cls(REQUEST_DEADLINE_SECONDS)
+        return cls(min(seconds, REQUEST_DEADLINE_MAX_SECONDS))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            metrics.increment("deadline.expired")
+            metrics.increment(f"deadline.expired.{stage}")
+            raise DeadlineExceeded(stage)
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def use_deadline(deadline: Deadline):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded if the current request (if any) is out of time."""
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def remaining_seconds(default: float) -> float:
+    """`default`, shortened to what is left of the current request's deadline."""
+    deadline = current_deadline()
+    return default if deadline is None else min(default, deadline.remaining())
+
+
+async def run_stage(stage: str, awaitable: Awaitable[T], disconnected: Optional[asyncio.Future] = None) -> T:
+    """
+    Await one stage of a request under the current deadline.
+
+    The stage is cancelled as soon as the deadline passes or `disconnected` (a long-lived
+    task that finishes when the client goes away) completes. Cancelling the task aborts
+    the outbound HTTP calls it is waiting on, such as an in-flight LLM completion.
+    """
+    deadline = current_deadline()
+    if deadline is not None:
+        try:
+            deadline.check(stage)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+
+    if disconnected is not None and disconnected.done():
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        metrics.increment("cancellation.disconnected")
+        raise ClientDisconnected(stage)
+
+    start = time.perf_counter()
+    task = asyncio.ensure_future(awaitable)
+    waiters = {task} if disconnected is None else {task, disconnected}
+    timeout = deadline.remaining() if deadline is not None else None
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    if task in done:
+        metrics.observe(f"stage.{stage}.latency_ms", (time.perf_counter() - start) * 1000)
+        return task.result()
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    metrics.increment("cancellation.inflight_stages")
+    if disconnected is not None and disconnected in done:
+        metrics.increment("cancellation.disconnected")
+        raise ClientDisconnected(stage)
+    metrics.increment("deadline.expired")
+    metrics.increment(f"deadline.expired.{stage}")
+    raise DeadlineExceeded(stage)
+
+
+async def wait_for_websocket_disconnect(websocket) -> None:
+    """Finish when the WebSocket client disconnects; other incoming messages are ignored."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+async def wait_for_http_disconnect(request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
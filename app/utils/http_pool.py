@@ -0,0 +1,259 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import httpx
+
+from app.monitoring import metrics
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_HTTP2 = os.getenv("HTTP_POOL_HTTP2", "true").lower() == "true"
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", 100))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", 20))
+HTTP_POOL_KEEPALIVE_SECONDS = float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", 60))
+# Concurrent requests per host; over HTTP/1.1 this is also the connection cap per host.
+HTTP_POOL_MAX_PER_HOST = int(os.getenv("HTTP_POOL_MAX_PER_HOST", 32))
+HTTP_POOL_RETRIES = int(os.getenv("HTTP_POOL_RETRIES", 1))
+
+
+class _HostStats:
+    """Requests in flight, peak and waits per host, shared by the sync and async transports."""
+
+    def __init__(self):
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.peak: Dict[str, int] = defaultdict(int)
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.waited: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def acquired(self, host: str, wait_ms: float) -> None:
+        with self._lock:
+            self.in_flight[host] += 1
+            self.peak[host] = max(self.peak[host], self.in_flight[host])
+            self.requests[host] += 1
+            if wait_ms >= 1:
+                self.waited[host] += 1
+        if wait_ms >= 1:
+            metrics.observe("http_pool.wait_ms", wait_ms)
+
+    def released(self, host: str) -> None:
+        with self._lock:
+            self.in_flight[host] -= 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                host: {"in_flight": self.in_flight[host], "peak": self.peak[host], "requests": self.requests[host], "waited": self.waited[host]}
+                for host in self.requests
+            }
+
+
+def _once(release: Callable[[], None]) -> Callable[[], None]:
+    done = False
+
+    def call() -> None:
+        nonlocal done
+        if not done:
+            done = True
+            release()
+    return call
+
+
+class _ReleasingAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_POOL_KEEPALIVE_SECONDS,
+    )
+
+
+class SharedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    One keep-alive (HTTP/2 where the server negotiates it) connection pool for every async
+    client in the process. A host gets at most `max_per_host` requests at a time; the slot is
+    held until the response body is closed, so streamed responses count too.
+    """
+
+    def __init__(self, stats: _HostStats, max_per_host: int = HTTP_POOL_MAX_PER_HOST, http2: bool = HTTP_POOL_HTTP2):
+        self.stats = stats
+        self.max_per_host = max_per_host
+        self.transport = httpx.AsyncHTTPTransport(http2=http2, limits=_limits(), retries=HTTP_POOL_RETRIES)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slot = self._slots.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        start = time.perf_counter()
+        await slot.acquire()
+        self.stats.acquired(host, (time.perf_counter() - start) * 1000)
+
+        def release_slot() -> None:
+            slot.release()
+            self.stats.released(host)
+        release = _once(release_slot)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code, headers=response.headers,
+            stream=_ReleasingAsyncStream(response.stream, release), extensions=response.extensions
+        )
+
+    async def aclose(self) -> None:
+        # SDK clients close their httpx client when discarded; the shared pool outlives them.
+        pass
+
+
+class SharedTransport(httpx.BaseTransport):
+    """Sync counterpart of `SharedAsyncTransport`, for clients called from worker threads."""
+
+    def __init__(self, stats: _HostStats, max_per_host: int = HTTP_POOL_MAX_PER_HOST, http2: bool = HTTP_POOL_HTTP2):
+        self.stats = stats
+        self.max_per_host = max_per_host
+        self.transport = httpx.HTTPTransport(http2=http2, limits=_limits(), retries=HTTP_POOL_RETRIES)
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        with self._lock:
+            slot = self._slots.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        start = time.perf_counter()
+        slot.acquire()
+        self.stats.acquired(host, (time.perf_counter() - start) * 1000)
+
+        def release_slot() -> None:
+            slot.release()
+            self.stats.released(host)
+        release = _once(release_slot)
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code, headers=response.headers,
+            stream=_ReleasingStream(response.stream, release), extensions=response.extensions
+        )
+
+    def close(self) -> None:
+        pass
+
+
+def _connections(transport: Any) -> Dict[str, Dict[str, int]]:
+    """Open connections per host, read from httpcore's pool."""
+    hosts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"connections": 0, "idle": 0, "http2": 0})
+    for connection in list(getattr(getattr(transport, "_pool", None), "connections", [])):
+        origin = getattr(connection, "_origin", None)
+        host = origin.host.decode() if origin is not None else "?"
+        hosts[host]["connections"] += 1
+        hosts[host]["idle"] += int(connection.is_idle())
+        hosts[host]["http2"] += int("HTTP/2" in connection.info())
+    return dict(hosts)
+
+
+class HTTPPool:
+    """
+    Process-wide outbound HTTP layer. SDK clients (Groq, Gemini, Qdrant) keep their own
+    httpx client for headers and base URLs but are built on these two transports, so they
+    share keep-alive connections instead of opening a pool each.
+    """
+
+    def __init__(self, max_per_host: int = HTTP_POOL_MAX_PER_HOST, http2: bool = HTTP_POOL_HTTP2):
+        self.max_per_host = max_per_host
+        self.http2 = http2
+        self.stats = _HostStats()
+        self._async_transport: Optional[SharedAsyncTransport] = None
+        self._transport: Optional[SharedTransport] = None
+        self._lock = threading.Lock()
+
+    def async_transport(self) -> SharedAsyncTransport:
+        with self._lock:
+            if self._async_transport is None:
+                self._async_transport = SharedAsyncTransport(self.stats, self.max_per_host, self.http2)
+            return self._async_transport
+
+    def transport(self) -> SharedTransport:
+        with self._lock:
+            if self._transport is None:
+                self._transport = SharedTransport(self.stats, self.max_per_host, self.http2)
+            return self._transport
+
+    def async_client(self, **kwargs) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=self.async_transport(), **kwargs)
+
+    def client(self, **kwargs) -> httpx.Client:
+        return httpx.Client(transport=self.transport(), **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        connections: Dict[str, Dict[str, int]] = {}
+        for shared in (self._async_transport, self._transport):
+            if shared is not None:
+                for host, counts in _connections(shared.transport).items():
+                    total = connections.setdefault(host, {"connections": 0, "idle": 0, "http2": 0})
+                    for key, value in counts.items():
+                        total[key] += value
+        return {
+            "http2": self.http2,
+            "max_connections": HTTP_POOL_MAX_CONNECTIONS,
+            "max_per_host": self.max_per_host,
+            "hosts": self.stats.snapshot(),
+            "connections": connections,
+        }
+
+    async def aclose(self) -> None:
+        if self._async_transport is not None:
+            await self._async_transport.transport.aclose()
+        if self._transport is not None:
+            self._transport.transport.close()
+        logger.info("Shared HTTP pool closed.")
+
+
+http_pool = HTTPPool()
+
+
+def genai_http_options():
+    """`http_options` for google-genai clients (Gemini models and embedder) on the shared pool."""
+    from google.genai.types import HttpOptions
+
+    return HttpOptions(client_args={"transport": http_pool.transport()}, async_client_args={"transport": http_pool.async_transport()})
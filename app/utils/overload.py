@@ -0,0 +1,137 @@
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.monitoring import metrics
+from app.utils.scheduler import FairScheduler, agent_scheduler
+
+
+OVERLOAD_RETRY_AFTER_SECONDS = int(os.getenv("OVERLOAD_RETRY_AFTER_SECONDS", 5))
+# Requests (or orchestrator sockets) each endpoint holds open at once, queued ones included.
+ENDPOINT_MAX_INFLIGHT = {
+    "symptom_analyzer": int(os.getenv("SYMPTOM_ANALYZER_MAX_INFLIGHT", 64)),
+    "clinical_protocol": int(os.getenv("CLINICAL_PROTOCOL_MAX_INFLIGHT", 64)),
+    "orchestrator": int(os.getenv("ORCHESTRATOR_MAX_SOCKETS", 128)),
+}
+DEGRADED_MODE_ENABLED = os.getenv("DEGRADED_MODE_ENABLED", "true").lower() == "true"
+DEGRADED_LATENCY_MS = float(os.getenv("DEGRADED_LATENCY_MS", 20000))
+DEGRADED_QUEUE_DEPTH = int(os.getenv("DEGRADED_QUEUE_DEPTH", 32))
+DEGRADED_WINDOW_SECONDS = float(os.getenv("DEGRADED_WINDOW_SECONDS", 60))
+DEGRADED_MIN_SAMPLES = int(os.getenv("DEGRADED_MIN_SAMPLES", 5))
+DEGRADED_HOLD_SECONDS = float(os.getenv("DEGRADED_HOLD_SECONDS", 30))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class InflightLimiter:
+    """Bounded count of requests each endpoint holds at once; past it they are rejected right away."""
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = dict(limits)
+        self.inflight: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    def acquire(self, endpoint: str) -> None:
+        limit = self.limits.get(endpoint)
+        if limit is not None and self.inflight[endpoint] >= limit:
+            self.rejected[endpoint] += 1
+            metrics.increment(f"overload.rejected.{endpoint}")
+            raise Overloaded(f"Too many '{endpoint}' requests in flight ({limit}). Try again later.")
+        self.inflight[endpoint] += 1
+
+    def release(self, endpoint: str) -> None:
+        self.inflight[endpoint] -= 1
+
+    @contextmanager
+    def hold(self, endpoint: str):
+        self.acquire(endpoint)
+        try:
+            yield
+        finally:
+            self.release(endpoint)
+
+    def snapshot(self) -> Dict:
+        return {
+            endpoint: {"limit": limit, "inflight": self.inflight.get(endpoint, 0), "rejected": self.rejected.get(endpoint, 0)}
+            for endpoint, limit in self.limits.items()
+        }
+
+
+class DegradedMode:
+    """
+    Whether agent endpoints should answer only from cached results, from live signals.
+
+    It turns on when the scheduler's queue is overloaded (CoDel), when more than
+    `queue_depth` agent runs are queued, or when the p95 agent run latency over the last
+    `window_seconds` is above `latency_ms`; and turns off `hold_seconds` after the last of
+    them cleared. The latency window only holds recent runs, so while degraded (and no run
+    reaches the model) the signal ages out and traffic is let through again.
+    """
+
+    def __init__(
+        self,
+        scheduler: FairScheduler,
+        enabled: bool = DEGRADED_MODE_ENABLED,
+        latency_ms: float = DEGRADED_LATENCY_MS,
+        queue_depth: int = DEGRADED_QUEUE_DEPTH,
+        window_seconds: float = DEGRADED_WINDOW_SECONDS,
+        min_samples: int = DEGRADED_MIN_SAMPLES,
+        hold_seconds: float = DEGRADED_HOLD_SECONDS,
+    ):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.latency_ms = latency_ms
+        self.queue_depth = queue_depth
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.hold_seconds = hold_seconds
+        self._latencies: Deque[Tuple[float, float]] = deque()
+        self._until = 0.0
+        self.reason: Optional[str] = None
+
+    def observe(self, latency_ms: float) -> None:
+        """Record the latency of one agent run (queue wait excluded)."""
+        self._latencies.append((time.monotonic(), latency_ms))
+
+    def latency_p95(self) -> float:
+        horizon = time.monotonic() - self.window_seconds
+        while self._latencies and self._latencies[0][0] < horizon:
+            self._latencies.popleft()
+        if len(self._latencies) < self.min_samples:
+            return 0.0
+        return metrics.percentile([latency for _, latency in self._latencies], 0.95)
+
+    def signals(self) -> List[str]:
+        reasons = []
+        if self.scheduler.overloaded:
+            reasons.append("queue_overloaded")
+        if sum(self.scheduler.snapshot()["queued"].values()) > self.queue_depth:
+            reasons.append("queue_depth")
+        if self.latency_p95() > self.latency_ms:
+            reasons.append("latency")
+        return reasons
+
+    @property
+    def active(self) -> bool:
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        reasons = self.signals()
+        if reasons:
+            if now >= self._until:
+                metrics.increment("overload.degraded_entered")
+            self._until = now + self.hold_seconds
+            self.reason = ",".join(reasons)
+        return now < self._until
+
+    def snapshot(self) -> Dict:
+        active = self.active
+        return {"active": active, "reason": self.reason if active else None, "latency_p95_ms": self.latency_p95()}
+
+
+inflight_limiter = InflightLimiter(ENDPOINT_MAX_INFLIGHT)
+degraded_mode = DegradedMode(agent_scheduler)
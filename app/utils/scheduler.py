@@ -0,0 +1,211 @@
+import os
+import time
+import math
+import asyncio
+import itertools
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from app.monitoring import metrics
+
+
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 8))
+AGENT_USER_MAX_INFLIGHT = int(os.getenv("AGENT_USER_MAX_INFLIGHT", 2))
+SCHEDULER_INTERACTIVE_WEIGHT = float(os.getenv("SCHEDULER_INTERACTIVE_WEIGHT", 4))
+SCHEDULER_BATCH_WEIGHT = float(os.getenv("SCHEDULER_BATCH_WEIGHT", 1))
+# CoDel on the queue wait: once even the shortest wait of an interval exceeds the target,
+# the queue is standing and requests queued longer than the target are shed.
+AGENT_QUEUE_TARGET_MS = float(os.getenv("AGENT_QUEUE_TARGET_MS", 2000))
+AGENT_QUEUE_INTERVAL_MS = float(os.getenv("AGENT_QUEUE_INTERVAL_MS", 10000))
+
+# Priority classes: clinicians on the WebSocket orchestrator, and REST/integration traffic.
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+Flow = Tuple[str, str]
+
+
+class QueueOverloaded(Exception):
+    def __init__(self, waited_ms: float):
+        super().__init__(f"Agent queue is overloaded; request shed after waiting {waited_ms:.0f} ms.")
+        self.waited_ms = waited_ms
+
+
+class _Waiter:
+    __slots__ = ("flow", "finish", "seq", "enqueued_at", "future", "timer")
+
+    def __init__(self, flow: Flow, finish: float, seq: int):
+        self.flow = flow
+        self.finish = finish
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class FairScheduler:
+    """
+    Admission control for agent runs: weighted fair queueing across users.
+
+    Every (user, priority class) pair is a flow with its own FIFO queue. A request gets the
+    virtual finish tag max(virtual time, flow's last tag) + 1/weight, and free slots go to the
+    queued head with the smallest tag whose user is under `per_user` runs in flight. A burst
+    from one user therefore only delays that user's own queue, and interactive requests
+    (higher weight) overtake batch ones. The virtual time is the tag of the last request
+    admitted (self-clocked fair queueing).
+
+    The queue wait is managed CoDel-style, as in "Fail at Scale" (Maurer, 2015): at the end
+    of every `interval` the scheduler is `overloaded` when the shortest wait seen during it
+    (admitted requests, or the oldest still queued) was above `target`. While overloaded, a
+    request that has been queued for `target` fails with QueueOverloaded instead of waiting
+    for a slot it would get too late, so the backlog drains in bounded time.
+    """
+
+    def __init__(
+        self,
+        capacity: int = AGENT_MAX_CONCURRENCY,
+        per_user: int = AGENT_USER_MAX_INFLIGHT,
+        weights: Optional[Dict[str, float]] = None,
+        target_ms: float = AGENT_QUEUE_TARGET_MS,
+        interval_ms: float = AGENT_QUEUE_INTERVAL_MS,
+    ):
+        self.capacity = capacity
+        self.per_user = per_user
+        self.weights = weights or {INTERACTIVE: SCHEDULER_INTERACTIVE_WEIGHT, BATCH: SCHEDULER_BATCH_WEIGHT}
+        self.virtual_time = 0.0
+        self.inflight = 0
+        self.user_inflight: Dict[str, int] = defaultdict(int)
+        self.queues: Dict[Flow, Deque[_Waiter]] = {}
+        self.last_finish: Dict[Flow, float] = {}
+        self._seq = itertools.count()
+        self.target = target_ms / 1000
+        self.interval = interval_ms / 1000
+        self._overloaded = False
+        self._interval_end = time.perf_counter() + self.interval
+        self._interval_min = math.inf
+        self.shed = 0
+
+    @property
+    def overloaded(self) -> bool:
+        self._update_state()
+        return self._overloaded
+
+    def _update_state(self) -> None:
+        now = time.perf_counter()
+        if now < self._interval_end:
+            return
+        oldest = min((queue[0].enqueued_at for queue in self.queues.values()), default=None)
+        shortest = min(self._interval_min, now - oldest if oldest is not None else math.inf)
+        overloaded = shortest != math.inf and shortest > self.target
+        if overloaded != self._overloaded:
+            metrics.increment("scheduler.overload_entered" if overloaded else "scheduler.overload_cleared")
+        self._overloaded = overloaded
+        self._interval_min = math.inf
+        self._interval_end = now + self.interval
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: str = BATCH):
+        """Hold one agent slot for `user_id`; waiting is cancellable (deadline, disconnect)."""
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority class '{priority}'.")
+        user_id = str(user_id)
+        waiter = self._enqueue((user_id, priority))
+        self._dispatch()
+        if not waiter.future.done():
+            waiter.timer = asyncio.get_running_loop().call_later(self.target, self._expire, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.timer is not None:
+                waiter.timer.cancel()
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the wait was cancelled: give the slot back.
+                self._release(user_id)
+            else:
+                self._remove(waiter)
+            metrics.increment(f"scheduler.{priority}.abandoned")
+            raise
+        except QueueOverloaded:
+            metrics.increment(f"scheduler.{priority}.shed")
+            raise
+        metrics.observe(f"scheduler.{priority}.queue_wait_ms", (time.perf_counter() - waiter.enqueued_at) * 1000)
+        metrics.increment(f"scheduler.{priority}.admitted")
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def _enqueue(self, flow: Flow) -> _Waiter:
+        start = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+        finish = start + 1.0 / self.weights[flow[1]]
+        self.last_finish[flow] = finish
+        waiter = _Waiter(flow, finish, next(self._seq))
+        self.queues.setdefault(flow, deque()).append(waiter)
+        return waiter
+
+    def _dispatch(self) -> None:
+        while self.inflight < self.capacity:
+            eligible = [
+                queue[0] for (user_id, _), queue in self.queues.items()
+                if self.user_inflight.get(user_id, 0) < self.per_user
+            ]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda item: (item.finish, item.seq))
+            self._pop(waiter)
+            self.virtual_time = max(self.virtual_time, waiter.finish)
+            self.inflight += 1
+            self.user_inflight[waiter.flow[0]] += 1
+            self._interval_min = min(self._interval_min, time.perf_counter() - waiter.enqueued_at)
+            if waiter.timer is not None:
+                waiter.timer.cancel()
+            waiter.future.set_result(None)
+
+    def _expire(self, waiter: _Waiter) -> None:
+        """Runs every `target` while `waiter` is queued: shed it if the queue is overloaded by now."""
+        if waiter.future.done():
+            return
+        if self.overloaded:
+            self._remove(waiter)
+            self.shed += 1
+            waiter.future.set_exception(QueueOverloaded((time.perf_counter() - waiter.enqueued_at) * 1000))
+        else:
+            waiter.timer = asyncio.get_running_loop().call_later(self.target, self._expire, waiter)
+
+    def _pop(self, waiter: _Waiter) -> None:
+        queue = self.queues[waiter.flow]
+        queue.remove(waiter)
+        if not queue:
+            del self.queues[waiter.flow]
+        # Idle flows whose tag the virtual clock has passed carry no credit; forget them.
+        for flow in [flow for flow, finish in self.last_finish.items() if flow not in self.queues and finish <= self.virtual_time]:
+            del self.last_finish[flow]
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self.queues.get(waiter.flow)
+        if queue is not None and waiter in queue:
+            self._pop(waiter)
+
+    def _release(self, user_id: str) -> None:
+        self.inflight -= 1
+        self.user_inflight[user_id] -= 1
+        if not self.user_inflight[user_id]:
+            del self.user_inflight[user_id]
+        self._dispatch()
+
+    def snapshot(self) -> Dict:
+        queued: Dict[str, int] = defaultdict(int)
+        for (_, priority), queue in self.queues.items():
+            queued[priority] += len(queue)
+        return {
+            "capacity": self.capacity,
+            "inflight": self.inflight,
+            "queued": {priority: queued.get(priority, 0) for priority in self.weights},
+            "users_inflight": len(self.user_inflight),
+            "overloaded": self.overloaded,
+            "shed": self.shed,
+        }
+
+
+agent_scheduler = FairScheduler()
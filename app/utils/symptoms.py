@@ -0,0 +1,275 @@
+import os
+import re
+import hashlib
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.text import STOPWORDS, fold_accents, stem_portuguese
+
+
+SYMPTOM_CANONICALIZATION_ENABLED = os.getenv("SYMPTOM_CANONICALIZATION_ENABLED", "true").lower() == "true"
+# Corpus words seen fewer times than this are not used to correct typos.
+SPELLING_MIN_CORPUS_COUNT = int(os.getenv("SPELLING_MIN_CORPUS_COUNT", 2))
+SPELLING_MIN_LENGTH = 5
+MAX_PHRASE_TOKENS = 4
+
+# Canonical symptom (Portuguese, accent-folded) -> Portuguese and English ways of saying it.
+SYMPTOM_SYNONYMS: Dict[str, List[str]] = {
+    "febre": ["febre", "febril", "temperatura alta", "fever", "feverish", "high temperature", "pyrexia"],
+    "calafrios": ["calafrio", "tremores de frio", "chills"],
+    "tosse": ["tosse", "tossindo", "cough", "coughing"],
+    "tosse seca": ["tosse seca", "dry cough"],
+    "tosse produtiva": ["tosse com catarro", "tosse com secrecao", "tosse produtiva", "productive cough", "wet cough"],
+    "hemoptise": ["hemoptise", "tosse com sangue", "coughing blood", "coughing up blood"],
+    "dispneia": [
+        "dispneia", "falta de ar", "dificuldade para respirar", "dificuldade de respirar", "shortness of breath",
+        "short of breath", "breathlessness", "difficulty breathing",
+    ],
+    "sibilancia": ["sibilancia", "chiado no peito", "chiado", "wheezing", "wheeze"],
+    "dor toracica": ["dor toracica", "dor no peito", "aperto no peito", "chest pain", "chest tightness"],
+    "palpitacoes": ["palpitacao", "coracao acelerado", "palpitations"],
+    "cefaleia": ["cefaleia", "dor de cabeca", "headache"],
+    "tontura": ["tontura", "vertigem", "dizziness", "dizzy", "vertigo"],
+    "desmaio": ["desmaio", "desmaiou", "sincope", "fainting", "fainted", "syncope"],
+    "confusao mental": ["confusao mental", "confusao", "desorientacao", "confusion", "disorientation"],
+    "convulsao": ["convulsao", "crise convulsiva", "seizure"],
+    "rigidez de nuca": ["rigidez de nuca", "nuca rigida", "stiff neck", "neck stiffness"],
+    "coriza": ["coriza", "nariz escorrendo", "rinorreia", "runny nose"],
+    "congestao nasal": ["congestao nasal", "nariz entupido", "stuffy nose", "nasal congestion"],
+    "dor de garganta": ["dor de garganta", "garganta inflamada", "odinofagia", "sore throat"],
+    "dor de ouvido": ["dor de ouvido", "otalgia", "earache", "ear pain"],
+    "perda de olfato": ["perda de olfato", "anosmia", "loss of smell"],
+    "perda de paladar": ["perda de paladar", "ageusia", "loss of taste"],
+    "nausea": ["nausea", "enjoo", "enjoado", "nauseous", "nauseated"],
+    "vomito": ["vomito", "vomitando", "vomiting", "vomit", "throwing up"],
+    "diarreia": ["diarreia", "fezes liquidas", "intestino solto", "diarrhea", "diarrhoea"],
+    "dor abdominal": [
+        "dor abdominal", "dor na barriga", "dor de barriga", "dor no estomago", "abdominal pain", "stomach ache",
+        "stomachache", "belly pain",
+    ],
+    "inapetencia": ["inapetencia", "falta de apetite", "sem fome", "loss of appetite"],
+    "perda de peso": ["perda de peso", "emagrecimento", "weight loss"],
+    "fadiga": ["fadiga", "cansaco", "exaustao", "fatigue", "tiredness", "tired"],
+    "astenia": ["astenia", "fraqueza", "weakness"],
+    "mialgia": ["mialgia", "dor muscular", "dor no corpo", "muscle pain", "body aches", "myalgia"],
+    "artralgia": ["artralgia", "dor nas articulacoes", "dor articular", "joint pain"],
+    "dor lombar": ["dor lombar", "dor nas costas", "back pain", "lower back pain"],
+    "disuria": ["disuria", "dor ao urinar", "ardencia ao urinar", "painful urination", "burning urination"],
+    "sudorese": ["sudorese", "suor", "suando", "sweating"],
+    "sudorese noturna": ["sudorese noturna", "suor noturno", "night sweats"],
+    "edema": ["edema", "inchaco", "inchado", "swelling", "swollen"],
+    "erupcao cutanea": ["erupcao cutanea", "exantema", "manchas na pele", "manchas vermelhas", "rash", "skin rash"],
+    "prurido": ["prurido", "coceira", "itching", "itchy"],
+    "visao turva": ["visao turva", "vista embacada", "blurred vision"],
+    "sonolencia": ["sonolencia", "drowsiness", "drowsy"],
+}
+
+# Words that carry no clinical content in a complaint, in either language (accent-folded).
+FILLERS = frozenset("""
+ai ate acho ainda assim bem depois doutor doutora dr dra entao estou estava eu gente hoje minha meu muito muita ne oi ola
+paciente parece relata refere queixa queixando apresenta apresentando sinto sentindo sentiu senti ta tenho tive to tipo
+uns umas vez
+i im ive me my have has had having feel feeling felt been being is am are was the an of with some really like very
+just also since for it its this that um uh please
+""".split())
+
+# Negation scopes over the rest of the clause: 'sem febre ou tosse', 'no fever'.
+NEGATIONS = frozenset("sem nao nega negou nunca no not without denies denied never".split())
+
+# Clauses end at punctuation and at these conjunctions; a comma-less 'febre e tosse' is two clauses.
+# Separators between digits ('38,5', 'PA 160/110') belong to the reading and do not break it.
+_CLAUSE_BREAK = re.compile(r"[;!?\n+]|[,./](?!\d)|(?<!\d)[,./]|\b(?:e|and|mas|but|porem|tambem|also)\b")
+# The slash of a unit after a reading ('250 mg/dL', '5 mg/kg') is not a break either.
+_UNIT_SLASH = re.compile(r"(?<=\d)(\s*[a-z]{1,4})/(?=[a-z]{1,4}\b)")
+_TOKEN = re.compile(r"\d+(?:[.,/]\d+)?|[a-z]+")
+
+
+def _content_stem(token: str) -> Optional[str]:
+    return None if token in STOPWORDS or token in FILLERS else stem_portuguese(token)
+
+
+def _phrase_key(tokens: Iterable[str]) -> Tuple[str, ...]:
+    """Stemmed content words: 'dores de cabeça' and 'dor na cabeça' give the same key."""
+    return tuple(stem for stem in map(_content_stem, tokens) if stem is not None)
+
+
+def _osa_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (transpositions count as one edit), cut off past `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+@dataclass(frozen=True)
+class CanonicalSymptoms:
+    text: str
+    key: str
+    terms: Tuple[str, ...]
+    negated: Tuple[str, ...]
+
+
+class SymptomCanonicalizer:
+    """
+    CPU-only normalization of free-text complaints before they reach the agents.
+
+    The text is accent-folded and split into clauses. In each clause, phrases of the synonym
+    table (matched on stemmed content words, longest first) become their canonical symptom,
+    'sem'/'no' negate the symptoms after them, filler words go, and unknown words within one
+    or two edits of a vocabulary word are corrected. Repeated clauses are dropped and the
+    rest are sorted, so 'Tosse seca e febre!!' and 'fever, dry cough' share `text` and `key`.
+
+    The spelling vocabulary is the synonym table plus the words of the knowledge-base
+    corpus (`fit`), so drug and disease names in the PDFs are corrected too.
+    """
+
+    def __init__(self, synonyms: Dict[str, List[str]] = SYMPTOM_SYNONYMS):
+        self.phrases: Dict[Tuple[str, ...], str] = {}
+        for canonical, variants in synonyms.items():
+            for variant in [canonical, *variants]:
+                key = _phrase_key(_TOKEN.findall(fold_accents(variant)))
+                if key:
+                    self.phrases.setdefault(key, canonical)
+        self.max_phrase = min(MAX_PHRASE_TOKENS, max(len(key) for key in self.phrases))
+        self._base_words = Counter(
+            token for canonical, variants in synonyms.items() for variant in [canonical, *variants]
+            for token in _TOKEN.findall(fold_accents(variant)) if len(token) >= SPELLING_MIN_LENGTH
+        )
+        self._stems: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._set_vocabulary(self._base_words)
+
+    def _set_vocabulary(self, counts: Counter) -> None:
+        words = {word: count for word, count in counts.items() if word.isalpha()}
+        deletes: Dict[str, List[str]] = {}
+        for word in words:
+            for variant in {word, *(word[:i] + word[i + 1:] for i in range(len(word)))}:
+                deletes.setdefault(variant, []).append(word)
+        with self._lock:
+            self.words, self._deletes, self._corrections = words, deletes, {}
+
+    def fit(self, documents: Iterable) -> int:
+        """Add the corpus words (seen at least SPELLING_MIN_CORPUS_COUNT times) to the spelling vocabulary."""
+        counts = Counter(
+            token for document in documents for token in _TOKEN.findall(fold_accents(document.content or ""))
+            if len(token) >= SPELLING_MIN_LENGTH and token not in FILLERS
+        )
+        counts = Counter({word: count for word, count in counts.items() if count >= SPELLING_MIN_CORPUS_COUNT})
+        counts.update(self._base_words)
+        self._set_vocabulary(counts)
+        return len(self.words)
+
+    def correct(self, token: str) -> str:
+        if len(token) < SPELLING_MIN_LENGTH or not token.isalpha() or token in self.words:
+            return token
+        corrections = self._corrections
+        if token in corrections:
+            return corrections[token]
+        limit = 1 if len(token) < 8 else 2
+        candidates = set(self._deletes.get(token, ()))
+        for i in range(len(token)):
+            candidates.update(self._deletes.get(token[:i] + token[i + 1:], ()))
+        best = min(
+            (word for word in candidates if _osa_distance(token, word, limit) <= limit),
+            key=lambda word: (-self.words[word], word),
+            default=token,
+        )
+        if len(corrections) < 100_000:
+            corrections[token] = best
+        return best
+
+    def _stem(self, token: str) -> Optional[str]:
+        stem = self._stems.get(token, "")
+        if stem == "":
+            stem = _content_stem(token)
+            if len(self._stems) < 100_000:
+                self._stems[token] = stem
+        return stem
+
+    def _match(self, stems: List[Optional[str]], start: int) -> Optional[Tuple[int, str]]:
+        """Longest synonym phrase starting at `start`, as (tokens consumed, canonical symptom)."""
+        for size in range(min(self.max_phrase, len(stems) - start), 0, -1):
+            key = tuple(stem for stem in stems[start: start + size] if stem is not None)
+            if key and key in self.phrases:
+                return size, self.phrases[key]
+        return None
+
+    def _clause(self, text: str) -> Tuple[List[str], List[str], List[str]]:
+        tokens = [self.correct(token) for token in _TOKEN.findall(text)]
+        stems = [self._stem(token) for token in tokens]
+        words: List[str] = []
+        terms: List[str] = []
+        negated: List[str] = []
+        negating = pending = False
+        i = 0
+        while i < len(tokens):
+            match = self._match(stems, i) if stems[i] is not None else None
+            if match is not None:
+                size, canonical = match
+                words.append(f"sem {canonical}" if negating else canonical)
+                (negated if negating else terms).append(canonical)
+                pending = False
+                i += size
+                continue
+            token = tokens[i]
+            if token in NEGATIONS:
+                negating = pending = True
+            elif stems[i] is not None:
+                if pending:
+                    words.append("nao")
+                    pending = False
+                words.append(token)
+            i += 1
+        return list(dict.fromkeys(words)), terms, negated
+
+    def canonicalize(self, text: str) -> CanonicalSymptoms:
+        clauses: Dict[str, None] = {}
+        terms: Dict[str, None] = {}
+        negated: Dict[str, None] = {}
+        for part in _CLAUSE_BREAK.split(_UNIT_SLASH.sub(r"\1 ", fold_accents(text))):
+            words, clause_terms, clause_negated = self._clause(part)
+            if words:
+                clauses[" ".join(words)] = None
+            terms.update(dict.fromkeys(clause_terms))
+            negated.update(dict.fromkeys(clause_negated))
+        canonical_text = "; ".join(sorted(clauses))
+        return CanonicalSymptoms(
+            text=canonical_text,
+            key=hashlib.sha256(canonical_text.encode("utf-8")).hexdigest()[:16],
+            terms=tuple(sorted(terms)),
+            negated=tuple(sorted(negated)),
+        )
+
+
+symptom_canonicalizer = SymptomCanonicalizer()
+
+
+def prompt_symptoms(symptoms: str) -> str:
+    """What the agents and their memory get for `symptoms`: the raw text, whitespace collapsed."""
+    return " ".join(symptoms.split())
+
+
+def symptoms_key(symptoms: str) -> str:
+    """
+    Dedup key of `symptoms`: equivalent texts ("Tosse seca e febre", "fever, dry cough") share it.
+
+    The canonical text drops words and reorders complaints, so it is only ever used as a key,
+    never sent to a model. With canonicalization disabled, the key is the collapsed raw text.
+    """
+    text = prompt_symptoms(symptoms)
+    canonical = symptom_canonicalizer.canonicalize(text) if SYMPTOM_CANONICALIZATION_ENABLED else None
+    if canonical is None or not canonical.text:
+        return hashlib.sha256(text.lower().encode("utf-8")).hexdigest()[:16]
+    return canonical.key
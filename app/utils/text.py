@@ -0,0 +1,59 @@
+import re
+import unicodedata
+from typing import List
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Accent-folded Portuguese stopwords; clinical negations ("nao", "sem") are kept on purpose.
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre era essa esse esta este foi ha isso la lhe mais mas me
+na nas no nos o os ou para pela pelas pelo pelos por que se seu seus sua suas ser sao tambem tem um uma
+umas uns
+""".split())
+
+MIN_STEM = 3
+
+# Suffix rules applied on accent-folded tokens, in the spirit of the RSLP stemmer (Orengo & Huyck):
+# plural, then feminine, then one derivational suffix, then the final vowel. Each list is ordered
+# longest first and the first matching rule wins.
+_PLURAL = [("coes", "cao"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"),
+           ("is", "il"), ("res", "r"), ("zes", "z"), ("ses", "s"), ("ns", "m"), ("s", "")]
+_FEMININE = [("ona", "ao"), ("ora", "or"), ("osa", "oso"), ("iva", "ivo"), ("ica", "ico"), ("ada", "ado"),
+             ("ida", "ido"), ("ina", "ino"), ("esa", "es")]
+_DERIVATIONAL = ["amento", "imento", "mente", "idade", "acao", "icao", "ismo", "ista", "avel", "ivel",
+                 "ador", "ante", "ento", "cao", "oso", "ivo", "ico", "al", "ao"]
+
+
+def fold_accents(text: str) -> str:
+    """Lowercase and strip diacritics: 'Pneumonia Atípica' -> 'pneumonia atipica'."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(fold_accents(text))
+
+
+def _strip(token: str, rules, min_stem: int = MIN_STEM) -> str:
+    for suffix, replacement in rules:
+        if token.endswith(suffix) and len(token) - len(suffix) + len(replacement) >= min_stem:
+            return token[: len(token) - len(suffix)] + replacement
+    return token
+
+
+def stem_portuguese(token: str) -> str:
+    """Light Portuguese stemmer for accent-folded tokens: 'infecções' -> 'infec', 'torácicas' -> 'torac'."""
+    if len(token) <= MIN_STEM or not token.isalpha():
+        return token
+    token = _strip(token, _PLURAL)
+    token = _strip(token, _FEMININE)
+    token = _strip(token, [(suffix, "") for suffix in _DERIVATIONAL], min_stem=MIN_STEM + 1)
+    if len(token) > MIN_STEM + 1 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Tokens for lexical search: accent-folded, stopwords removed, Portuguese-stemmed. Codes like 'j18' pass through."""
+    return [stem_portuguese(token) for token in tokenize(text) if token not in STOPWORDS]
@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+import logging
+import datetime
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.monitoring import metrics
+
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", 4))
+WARMUP_QUERIES = [
+    query.strip()
+    for query in os.getenv("WARMUP_QUERIES", "febre alta e tosse|dor no peito e falta de ar|diarreia e vômito em criança").split("|")
+    if query.strip()
+]
+WARMUP_TOP_INPUTS = int(os.getenv("WARMUP_TOP_INPUTS", 20))
+WARMUP_RECENT_HOURS = float(os.getenv("WARMUP_RECENT_HOURS", 24))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", 60))
+
+
+@dataclass
+class WarmupReport:
+    steps: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    total_ms: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"total_ms": round(self.total_ms, 1), "steps": self.steps}
+
+
+last_report: Optional[WarmupReport] = None
+
+
+def open_connections(engine: Engine, count: int) -> int:
+    """Check out `count` connections at once so the pool holds that many open ones afterwards."""
+    with ExitStack() as stack:
+        connections = [stack.enter_context(engine.connect()) for _ in range(count)]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+    return len(connections)
+
+
+async def warm_db_pools(engines: Iterable[Engine], count: int = WARMUP_DB_CONNECTIONS) -> int:
+    unique = {id(engine): engine for engine in engines if engine is not None}
+    opened = await asyncio.gather(*(asyncio.to_thread(open_connections, engine, count) for engine in unique.values()))
+    return sum(opened)
+
+
+async def warm_models(backends: Iterable[Any]) -> int:
+    from app.agents.model_router import warm_backend
+
+    unique = {id(backend): backend for backend in backends}
+    await asyncio.gather(*(warm_backend(backend) for backend in unique.values()))
+    return len(unique)
+
+
+async def warm_retrieval(knowledge, queries: Iterable[str]) -> int:
+    """Run `queries` through the knowledge base the way the agents' retriever does, filling the retrieval cache."""
+    from app.agents.prompt_budget import CANDIDATE_MULTIPLIER
+
+    searched = 0
+    for query in dict.fromkeys(queries):
+        await asyncio.to_thread(knowledge.search, query=query, num_documents=5 * CANDIDATE_MULTIPLIER)
+        searched += 1
+    return searched
+
+
+async def recent_inputs(limit: int = WARMUP_TOP_INPUTS, hours: float = WARMUP_RECENT_HOURS) -> List[str]:
+    from app.storage.case_history import DIAGNOSIS, frequent_inputs
+
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours)
+    return await asyncio.to_thread(frequent_inputs, DIAGNOSIS, since, limit)
+
+
+async def _timed(report: WarmupReport, name: str, step: Awaitable[int]) -> None:
+    start = time.perf_counter()
+    try:
+        count = await step
+        report.steps[name] = {"ok": True, "count": count}
+    except Exception as e:
+        logger.warning(f"Warm-up step '{name}' failed: {e}")
+        report.steps[name] = {"ok": False, "error": str(e)}
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    report.steps[name]["ms"] = round(elapsed_ms, 1)
+    metrics.observe(f"warmup.{name}.ms", elapsed_ms)
+
+
+async def warm_up(agents: Iterable[Any], engines: Iterable[Engine], timeout: float = WARMUP_TIMEOUT_SECONDS) -> WarmupReport:
+    """
+    Open DB pools, provider connections and Qdrant, and prefill the retrieval cache.
+
+    Every step is best-effort: a failure is logged and reported, never raised, and the whole
+    warm-up is cut off after `timeout` seconds.
+    """
+    global last_report
+    from app.agents.model_router import model_backends
+
+    agents = [agent for agent in agents if agent is not None]
+    report = WarmupReport()
+    start = time.perf_counter()
+
+    engines = list(engines) + [getattr(getattr(agent.memory, "db", None), "db_engine", None) for agent in agents]
+    backends = [
+        backend for agent in agents
+        for backend in model_backends(agent.model) + model_backends(getattr(agent.memory, "model", None))
+    ]
+    knowledge = next((agent.knowledge for agent in agents if agent.knowledge is not None), None)
+
+    async def retrieval() -> int:
+        if knowledge is None:
+            return 0
+        searched = await warm_retrieval(knowledge, WARMUP_QUERIES)
+        # Most frequent recent inputs go last: they are what the next requests will ask for.
+        try:
+            inputs = await recent_inputs()
+        except Exception as e:
+            logger.warning(f"Could not read recent inputs for warm-up: {e}")
+            inputs = []
+        return searched + await warm_retrieval(knowledge, inputs)
+
+    steps = asyncio.gather(
+        _timed(report, "db_pools", warm_db_pools(engines)),
+        _timed(report, "model_backends", warm_models(backends)),
+        _timed(report, "retrieval", retrieval()),
+    )
+    try:
+        await asyncio.wait_for(steps, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up cut off after {timeout}s.")
+        report.steps["timeout"] = {"ok": False, "ms": round(timeout * 1000, 1)}
+
+    report.total_ms = (time.perf_counter() - start) * 1000
+    metrics.observe("warmup.total.ms", report.total_ms)
+    last_report = report
+    logger.info(f"Warm-up finished in {report.total_ms:.0f} ms: {report.steps}")
+    return report
@@ -0,0 +1,159 @@
+"""Partition agent sessions and memory tables
+
+Revision ID: 3f9a1c2d7b64
+Revises: b35fa9961c21
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import AGENT_SCHEMA, PARTITIONED_TABLES, PARTITION_LOOKAHEAD, create_partitions, interval_step
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b64'
+down_revision: Union[str, Sequence[str], None] = 'b35fa9961c21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SESSION_COLUMNS = """
+    session_id VARCHAR NOT NULL,
+    user_id VARCHAR,
+    memory JSONB,
+    session_data JSONB,
+    extra_data JSONB,
+    created_at BIGINT NOT NULL DEFAULT (extract(epoch from now()))::bigint,
+    updated_at BIGINT,
+    agent_id VARCHAR,
+    team_session_id VARCHAR,
+    agent_data JSONB,
+    PRIMARY KEY (session_id, created_at)
+"""
+
+MEMORY_COLUMNS = """
+    id VARCHAR NOT NULL,
+    user_id VARCHAR,
+    memory JSONB DEFAULT '{}'::jsonb,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ,
+    PRIMARY KEY (id, created_at)
+"""
+
+SESSION_COPY_COLUMNS = (
+    "session_id, user_id, memory, session_data, extra_data, created_at, updated_at, "
+    "agent_id, team_session_id, agent_data"
+)
+MEMORY_COPY_COLUMNS = "id, user_id, memory, created_at, updated_at"
+
+TABLE_DDL = {
+    "agent_sessions": (SESSION_COLUMNS, [
+        "CREATE INDEX ix_agent_sessions_session_id ON {schema}.agent_sessions (session_id)",
+        "CREATE INDEX ix_agent_sessions_user_id ON {schema}.agent_sessions (user_id)",
+        "CREATE INDEX ix_agent_sessions_agent_id ON {schema}.agent_sessions (agent_id)",
+        "CREATE INDEX ix_agent_sessions_team_session_id ON {schema}.agent_sessions (team_session_id)",
+    ]),
+    "symptom_analyzer_memories": (MEMORY_COLUMNS, [
+        "CREATE INDEX ix_symptom_analyzer_memories_id ON {schema}.symptom_analyzer_memories (id)",
+        "CREATE INDEX ix_symptom_analyzer_memories_user_created ON {schema}.symptom_analyzer_memories (user_id, created_at DESC)",
+    ]),
+    "clinical_protocol_memories": (MEMORY_COLUMNS, [
+        "CREATE INDEX ix_clinical_protocol_memories_id ON {schema}.clinical_protocol_memories (id)",
+        "CREATE INDEX ix_clinical_protocol_memories_user_created ON {schema}.clinical_protocol_memories (user_id, created_at DESC)",
+    ]),
+}
+
+
+def _table_exists(connection, name: str) -> bool:
+    return connection.execute(
+        sa.text("SELECT to_regclass(:name)"), {"name": f"{AGENT_SCHEMA}.{name}"}
+    ).scalar() is not None
+
+
+def _first_day(connection, spec, legacy_table: str) -> datetime.date:
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    oldest = connection.execute(sa.text(f"SELECT min(created_at) FROM {AGENT_SCHEMA}.{legacy_table}")).scalar()
+    if oldest is None:
+        return today
+    if spec.epoch_key:
+        oldest = datetime.datetime.fromtimestamp(oldest, datetime.timezone.utc)
+    return min(oldest.astimezone(datetime.timezone.utc).date(), today)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    op.execute(f"CREATE SCHEMA IF NOT EXISTS {AGENT_SCHEMA}")
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+
+    for spec in PARTITIONED_TABLES:
+        columns, indexes = TABLE_DDL[spec.table_name]
+        legacy_table = f"{spec.table_name}_unpartitioned"
+        had_table = _table_exists(connection, spec.table_name)
+
+        if had_table:
+            op.execute(f"ALTER TABLE {AGENT_SCHEMA}.{spec.table_name} RENAME TO {legacy_table}")
+            op.execute(
+                f"ALTER TABLE {AGENT_SCHEMA}.{legacy_table} "
+                f"RENAME CONSTRAINT {spec.table_name}_pkey TO {legacy_table}_pkey"
+            )
+            if spec.epoch_key:
+                op.execute(
+                    f"UPDATE {AGENT_SCHEMA}.{legacy_table} "
+                    f"SET created_at = coalesce(updated_at, (extract(epoch from now()))::bigint) "
+                    f"WHERE created_at IS NULL"
+                )
+            else:
+                op.execute(f"UPDATE {AGENT_SCHEMA}.{legacy_table} SET created_at = now() WHERE created_at IS NULL")
+
+        op.execute(
+            f"CREATE TABLE {AGENT_SCHEMA}.{spec.table_name} ({columns}) PARTITION BY RANGE (created_at)"
+        )
+        first_day = _first_day(connection, spec, legacy_table) if had_table else today
+        create_partitions(connection, spec, first_day, today + interval_step(spec) * PARTITION_LOOKAHEAD)
+        op.execute(
+            f"CREATE TABLE {AGENT_SCHEMA}.{spec.table_name}_default "
+            f"PARTITION OF {AGENT_SCHEMA}.{spec.table_name} DEFAULT"
+        )
+
+        if had_table:
+            copy_columns = SESSION_COPY_COLUMNS if spec.epoch_key else MEMORY_COPY_COLUMNS
+            op.execute(
+                f"INSERT INTO {AGENT_SCHEMA}.{spec.table_name} ({copy_columns}) "
+                f"SELECT {copy_columns} FROM {AGENT_SCHEMA}.{legacy_table}"
+            )
+            op.execute(f"DROP TABLE {AGENT_SCHEMA}.{legacy_table}")
+
+        for index in indexes:
+            op.execute(index.format(schema=AGENT_SCHEMA))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for spec in PARTITIONED_TABLES:
+        partitioned_table = f"{spec.table_name}_partitioned"
+        op.execute(f"ALTER TABLE {AGENT_SCHEMA}.{spec.table_name} RENAME TO {partitioned_table}")
+        op.execute(
+            f"ALTER TABLE {AGENT_SCHEMA}.{partitioned_table} "
+            f"RENAME CONSTRAINT {spec.table_name}_pkey TO {partitioned_table}_pkey"
+        )
+        for index in TABLE_DDL[spec.table_name][1]:
+            index_name = index.split()[2]
+            op.execute(f"DROP INDEX IF EXISTS {AGENT_SCHEMA}.{index_name}")
+        op.execute(
+            f"CREATE TABLE {AGENT_SCHEMA}.{spec.table_name} "
+            f"(LIKE {AGENT_SCHEMA}.{partitioned_table} INCLUDING DEFAULTS)"
+        )
+        key_column = "session_id" if spec.epoch_key else "id"
+        op.execute(
+            f"INSERT INTO {AGENT_SCHEMA}.{spec.table_name} "
+            f"SELECT DISTINCT ON ({key_column}) * FROM {AGENT_SCHEMA}.{partitioned_table} "
+            f"ORDER BY {key_column}, created_at DESC"
+        )
+        op.execute(f"ALTER TABLE {AGENT_SCHEMA}.{spec.table_name} ADD PRIMARY KEY ({key_column})")
+        op.execute(f"DROP TABLE {AGENT_SCHEMA}.{partitioned_table} CASCADE")
+        op.execute(f"CREATE INDEX ix_{spec.table_name}_user_id ON {AGENT_SCHEMA}.{spec.table_name} (user_id)")
@@ -0,0 +1,32 @@
+"""Add version column to agent sessions
+
+Revision ID: 7c2e5d91a0f3
+Revises: 3f9a1c2d7b64
+Create Date: 2026-10-19 11:04:52.330917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e5d91a0f3'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'agent_sessions',
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default=sa.text('0')),
+        schema='ai'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('agent_sessions', 'version', schema='ai')
@@ -0,0 +1,58 @@
+"""Keep only static system prompt prefixes in agent_session_prompts
+
+Revision ID: 9b4e2c7d1f08
+Revises: f1c6a8e3d425
+Create Date: 2026-10-20 10:41:17.503212
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.storage.session_codec import compact_memory, compress, decompress, expand_memory, referenced_prompts
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e2c7d1f08'
+down_revision: Union[str, Sequence[str], None] = 'f1c6a8e3d425'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Whole system messages were stored by hash, user memories included: one row per run,
+    # outside the sessions' partition retention. Re-encode every session so only the static
+    # prefix is shared, then delete the prompt rows no session references any more.
+    connection = op.get_bind()
+    prompts = dict(connection.execute(sa.text("SELECT hash, content FROM ai.agent_session_prompts")).fetchall())
+    rows = connection.execute(
+        sa.text("SELECT session_id, created_at, memory_blob FROM ai.agent_sessions WHERE memory_blob IS NOT NULL")
+    ).fetchall()
+    referenced = set()
+    for session_id, created_at, blob in rows:
+        memory = expand_memory(decompress(blob), prompts)
+        compact, static_prompts = compact_memory(memory, keep_runs=len(memory.get("runs") or []))
+        for ref, content in static_prompts.items():
+            connection.execute(
+                sa.text("INSERT INTO ai.agent_session_prompts (hash, content) VALUES (:hash, :content) ON CONFLICT DO NOTHING"),
+                {"hash": ref, "content": content}
+            )
+        connection.execute(
+            sa.text(
+                "UPDATE ai.agent_sessions SET memory_blob = :blob "
+                "WHERE session_id = :session_id AND created_at = :created_at"
+            ),
+            {"blob": compress(compact), "session_id": session_id, "created_at": created_at}
+        )
+        referenced |= referenced_prompts(compact)
+    for ref in set(prompts) - referenced:
+        connection.execute(sa.text("DELETE FROM ai.agent_session_prompts WHERE hash = :hash"), {"hash": ref})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Sessions stay in the new encoding, which the previous code reads without the per-user
+    # part of the system message (never replayed from history).
+    pass
@@ -0,0 +1,51 @@
+"""Compact session storage
+
+Revision ID: a41d8e6f2b57
+Revises: 7c2e5d91a0f3
+Create Date: 2026-10-19 13:47:05.602184
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.storage.session_codec import decompress, expand_memory
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d8e6f2b57'
+down_revision: Union[str, Sequence[str], None] = '7c2e5d91a0f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('agent_session_prompts',
+    sa.Column('hash', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('hash'),
+    schema='ai'
+    )
+    op.add_column('agent_sessions', sa.Column('memory_blob', sa.LargeBinary(), nullable=True), schema='ai')
+    # The blob is already compressed, keep Postgres from trying to compress it again.
+    op.execute("ALTER TABLE ai.agent_sessions ALTER COLUMN memory_blob SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    prompts = dict(connection.execute(sa.text("SELECT hash, content FROM ai.agent_session_prompts")).fetchall())
+    rows = connection.execute(
+        sa.text("SELECT session_id, memory_blob FROM ai.agent_sessions WHERE memory_blob IS NOT NULL")
+    ).fetchall()
+    for session_id, blob in rows:
+        connection.execute(
+            sa.text("UPDATE ai.agent_sessions SET memory = :memory WHERE session_id = :session_id")
+            .bindparams(sa.bindparam("memory", type_=postgresql.JSONB)),
+            {"memory": expand_memory(decompress(blob), prompts), "session_id": session_id}
+        )
+    op.drop_column('agent_sessions', 'memory_blob', schema='ai')
+    op.drop_table('agent_session_prompts', schema='ai')
@@ -0,0 +1,47 @@
+"""Track ingested knowledge base versions
+
+Revision ID: c5e8f1a3b9d2
+Revises: a41d8e6f2b57
+Create Date: 2026-10-19 15:12:08.114203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8f1a3b9d2'
+down_revision: Union[str, Sequence[str], None] = 'a41d8e6f2b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'knowledge_base_versions',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), primary_key=True),
+        sa.Column('collection_name', sa.String(), nullable=False),
+        sa.Column('manifest', postgresql.JSONB(), nullable=False),
+        sa.Column('chunks', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('active', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        schema='ai'
+    )
+    op.create_index(
+        'knowledge_base_versions_active_idx',
+        'knowledge_base_versions',
+        ['active'],
+        unique=True,
+        schema='ai',
+        postgresql_where=sa.text('active')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('knowledge_base_versions_active_idx', table_name='knowledge_base_versions', schema='ai')
+    op.drop_table('knowledge_base_versions', schema='ai')
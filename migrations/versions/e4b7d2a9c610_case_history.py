@@ -0,0 +1,72 @@
+"""Append-only case history
+
+Revision ID: e4b7d2a9c610
+Revises: c5e8f1a3b9d2
+Create Date: 2026-10-19 18:41:27.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7d2a9c610'
+down_revision: Union[str, Sequence[str], None] = 'c5e8f1a3b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'case_history',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), primary_key=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('diagnosis', sa.String(), nullable=True),
+        sa.Column('severity', sa.String(), nullable=True),
+        sa.Column('urgency', sa.String(), nullable=True),
+        sa.Column('served_by', sa.String(), nullable=True),
+        sa.Column('payload', postgresql.JSONB(), nullable=False),
+        schema='ai'
+    )
+    # Every index ends in (created_at, id) so filtered queries page with the same keyset.
+    op.create_index('case_history_created_idx', 'case_history', ['created_at', 'id'], schema='ai')
+    op.create_index('case_history_user_idx', 'case_history', ['user_id', 'created_at', 'id'], schema='ai')
+    op.create_index(
+        'case_history_severity_idx', 'case_history', [sa.text('lower(severity)'), 'created_at', 'id'], schema='ai'
+    )
+    op.create_index(
+        'case_history_diagnosis_idx', 'case_history', [sa.text('lower(diagnosis)'), 'created_at', 'id'], schema='ai'
+    )
+
+    # Audit trail: rows can be inserted, never changed.
+    op.execute("""
+        CREATE FUNCTION ai.case_history_append_only() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'ai.case_history is append-only';
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER case_history_append_only
+        BEFORE UPDATE OR DELETE ON ai.case_history
+        FOR EACH ROW EXECUTE FUNCTION ai.case_history_append_only()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS case_history_append_only ON ai.case_history")
+    op.execute("DROP FUNCTION IF EXISTS ai.case_history_append_only()")
+    op.drop_index('case_history_diagnosis_idx', table_name='case_history', schema='ai')
+    op.drop_index('case_history_severity_idx', table_name='case_history', schema='ai')
+    op.drop_index('case_history_user_idx', table_name='case_history', schema='ai')
+    op.drop_index('case_history_created_idx', table_name='case_history', schema='ai')
+    op.drop_table('case_history', schema='ai')
@@ -0,0 +1,28 @@
+"""Store the agent input in the case history
+
+Revision ID: f1c6a8e3d425
+Revises: e4b7d2a9c610
+Create Date: 2026-10-19 20:03:51.272940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6a8e3d425'
+down_revision: Union[str, Sequence[str], None] = 'e4b7d2a9c610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('case_history', sa.Column('input', sa.Text(), nullable=True), schema='ai')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('case_history', 'input', schema='ai')
@@ -0,0 +1,77 @@
+"""
+Measure the symptom canonicalization stage: throughput, prompt size and how many raw inputs
+collapse onto the same canonical text (the ceiling on exact-match cache hits).
+
+Inputs are one symptom description per line. Without --inputs, synthetic cases are built by
+combining random variants (Portuguese and English synonyms, casing, punctuation, order) of
+the terms in SYMPTOM_SYNONYMS.
+
+    python -m scripts.benchmark_canonicalization --synthetic 20000
+    python -m scripts.benchmark_canonicalization --inputs symptoms.txt --corpus
+
+--corpus fits the spelling vocabulary on the loaded knowledge base first (needs QDRANT_URL,
+QDRANT_API_KEY and GOOGLE_API_KEY, and a collection loaded by the API).
+"""
+import time
+import random
+import argparse
+from typing import List
+
+from app.utils.symptoms import SYMPTOM_SYNONYMS, SymptomCanonicalizer
+
+
+CONNECTORS = [", ", " e ", "; ", " and ", ". ", " + "]
+PREFIXES = ["", "", "estou com ", "tenho ", "paciente com ", "i have ", "queixa de "]
+
+
+def synthetic_cases(count: int, seed: int = 7) -> List[str]:
+    generator = random.Random(seed)
+    terms = [[canonical, *variants] for canonical, variants in SYMPTOM_SYNONYMS.items()]
+    # A skewed draw, like real traffic: a few symptom combinations are far more common than the rest.
+    weights = [1 / (rank + 1) for rank in range(len(terms))]
+    cases = []
+    for _ in range(count):
+        picked = {tuple(term) for term in generator.choices(terms, weights=weights, k=generator.randint(1, 3))}
+        phrases = [generator.choice(term) for term in picked]
+        generator.shuffle(phrases)
+        text = generator.choice(PREFIXES) + generator.choice(CONNECTORS).join(phrases)
+        if generator.random() < 0.3:
+            text = text.upper() if generator.random() < 0.5 else text.capitalize()
+        cases.append(text + generator.choice(["", "", ".", "!!", " "]))
+    return cases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=None)
+    parser.add_argument("--synthetic", type=int, default=10000)
+    parser.add_argument("--corpus", action="store_true")
+    args = parser.parse_args()
+
+    if args.inputs:
+        with open(args.inputs, encoding="utf-8") as file:
+            cases = [line.strip() for line in file if line.strip()]
+    else:
+        cases = synthetic_cases(args.synthetic)
+
+    canonicalizer = SymptomCanonicalizer()
+    if args.corpus:
+        from app.storage.rag import get_knowledge_base
+
+        pdf_knowledge_base = get_knowledge_base()
+        pdf_knowledge_base.index_from_vector_db()
+        print(f"Spelling vocabulary: {canonicalizer.fit(pdf_knowledge_base.lexical_index.documents())} words")
+
+    start = time.perf_counter()
+    canonical = [canonicalizer.canonicalize(case) for case in cases]
+    elapsed = time.perf_counter() - start
+
+    raw_chars = sum(len(case) for case in cases)
+    canonical_chars = sum(len(item.text or case.strip()) for item, case in zip(canonical, cases))
+    raw_distinct = len(set(cases))
+    keys_distinct = len({item.key for item in canonical})
+
+    print(f"{len(cases)} cases in {elapsed * 1000:.1f} ms ({len(cases) / elapsed:,.0f} cases/s, {elapsed / len(cases) * 1e6:.1f} us/case)")
+    print(f"prompt chars     raw {raw_chars:>10,}  canonical {canonical_chars:>10,}  ({1 - canonical_chars / raw_chars:.1%} smaller)")
+    print(f"distinct inputs  raw {raw_distinct:>10,}  canonical {keys_distinct:>10,}")
+    print(f"exact-match hit ceiling  raw {1 - raw_distinct / len(cases):.1%}  canonical {1 - keys_distinct / len(cases):.1%}")
@@ -0,0 +1,154 @@
+"""
+Compare float32, int8 and binary embeddings: RAM per million chunks, search latency and
+recall@k against exact float32 search, with and without float re-scoring.
+
+By default it runs offline on synthetic clustered vectors with the Gemini embedding size.
+With `--live` it embeds the chunks of the loaded knowledge base, uploads them to one
+temporary Qdrant collection per quantization and queries those instead.
+
+    python -m scripts.benchmark_quantization --vectors 50000 --k 5 10
+    python -m scripts.benchmark_quantization --oversampling 1 2 4
+    python -m scripts.benchmark_quantization --live --k 5
+
+`--live` needs QDRANT_URL, QDRANT_API_KEY and GOOGLE_API_KEY, and a collection loaded by the API.
+"""
+import time
+import argparse
+import statistics
+from typing import Dict, List
+
+import numpy as np
+
+from app.storage.quantization import QUANTIZATION_KINDS, QuantizedIndex, normalize
+
+
+def synthetic_vectors(count: int, dimensions: int, clusters: int, seed: int = 7) -> np.ndarray:
+    """Unit vectors grouped around `clusters` topics, closer to real chunk embeddings than uniform noise."""
+    generator = np.random.default_rng(seed)
+    centers = normalize(generator.standard_normal((clusters, dimensions)))
+    labels = generator.integers(0, clusters, size=count)
+    return normalize(centers[labels] + 0.6 * normalize(generator.standard_normal((count, dimensions))))
+
+
+def perturbed_queries(vectors: np.ndarray, count: int, noise: float, seed: int = 11) -> np.ndarray:
+    """Queries near stored chunks (a paraphrase lands close to the passage it asks about)."""
+    generator = np.random.default_rng(seed)
+    picked = vectors[generator.integers(0, len(vectors), size=count)]
+    return normalize(picked + noise * normalize(generator.standard_normal(picked.shape)))
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    return len(set(found.tolist()) & set(expected.tolist())) / len(expected)
+
+
+def evaluate(index: QuantizedIndex, exact: QuantizedIndex, queries: np.ndarray, k: int, oversampling: float, rescore: bool) -> Dict[str, float]:
+    recalls = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        found = index.search(query, k=k, oversampling=oversampling, rescore=rescore)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(recall(found, exact.search(query, k=k)))
+    return {
+        "recall": statistics.mean(recalls),
+        "latency_ms": statistics.median(latencies),
+    }
+
+
+def run_offline(args) -> None:
+    vectors = synthetic_vectors(args.vectors, args.dimensions, args.clusters)
+    queries = perturbed_queries(vectors, args.queries, args.query_noise)
+    exact = QuantizedIndex(vectors, kind="none")
+
+    print(f"{args.vectors} vectors x {args.dimensions} dims, {args.queries} queries")
+    print(f"{'mode':<22}{'MB/1M chunks (RAM)':>20}{'k':>4}{'recall':>9}{'p50 ms':>9}")
+    for kind in QUANTIZATION_KINDS:
+        index = exact if kind == "none" else QuantizedIndex(vectors, kind=kind)
+        megabytes = index.search_bytes_per_vector * 1_000_000 / 2**20
+        variants = [(False, 1.0)] if kind == "none" else [(False, 1.0)] + [(True, value) for value in args.oversampling]
+        for rescore, oversampling in variants:
+            label = kind if not rescore else f"{kind} rescore x{oversampling:g}"
+            for k in args.k:
+                result = evaluate(index, exact, queries, k, oversampling, rescore)
+                print(f"{label:<22}{megabytes:>20.0f}{k:>4}{result['recall']:>9.3f}{result['latency_ms']:>9.2f}")
+
+
+def run_live(args) -> None:
+    from qdrant_client import models
+
+    from app.storage.rag import get_knowledge_base
+    from app.storage.vector_store import quantization_config
+
+    knowledge_base = get_knowledge_base()
+    vector_db = knowledge_base.vector_db
+    client = vector_db.client
+    points = []
+    offset = None
+    while True:
+        batch, offset = client.scroll(collection_name=vector_db.collection, limit=256, offset=offset, with_vectors=True)
+        points.extend(batch)
+        if offset is None:
+            break
+    if not points:
+        raise SystemExit("The knowledge base collection is empty, load it through the API first.")
+
+    sample = [point.payload.get("content", "") for point in points[: args.queries]]
+    query_vectors = [vector_db.embedder.get_embedding(text[:500]) for text in sample]
+    dimensions = len(points[0].vector)
+    print(f"{len(points)} chunks x {dimensions} dims from '{vector_db.collection}', {len(query_vectors)} queries")
+
+    exact_ids: Dict[int, List] = {}
+    print(f"{'mode':<22}{'k':>4}{'recall':>9}{'p50 ms':>9}")
+    for kind in QUANTIZATION_KINDS:
+        collection = f"{vector_db.collection}_bench_{kind}"
+        client.recreate_collection(
+            collection_name=collection,
+            vectors_config=models.VectorParams(size=dimensions, distance=models.Distance.COSINE, on_disk=kind != "none"),
+            quantization_config=quantization_config(kind),
+        )
+        try:
+            client.upsert(
+                collection_name=collection,
+                points=[models.PointStruct(id=point.id, vector=point.vector) for point in points],
+                wait=True,
+            )
+            variants = [None] if kind == "none" else [None] + list(args.oversampling)
+            for oversampling in variants:
+                params = None
+                if kind != "none":
+                    params = models.SearchParams(
+                        quantization=models.QuantizationSearchParams(rescore=oversampling is not None, oversampling=oversampling)
+                    )
+                label = kind if oversampling is None else f"{kind} rescore x{oversampling:g}"
+                for k in args.k:
+                    recalls = []
+                    latencies = []
+                    for position, query in enumerate(query_vectors):
+                        start = time.perf_counter()
+                        found = client.query_points(collection_name=collection, query=query, limit=k, search_params=params).points
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        ids = [point.id for point in found]
+                        if kind == "none":
+                            exact_ids[(position, k)] = ids
+                        recalls.append(len(set(ids) & set(exact_ids[(position, k)])) / k)
+                    print(f"{label:<22}{k:>4}{statistics.mean(recalls):>9.3f}{statistics.median(latencies):>9.2f}")
+        finally:
+            client.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--query-noise", type=float, default=0.5)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[2.0, 4.0, 8.0])
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args)
+    else:
+        run_offline(args)
@@ -0,0 +1,73 @@
+"""
+Compare recall@k of dense-only, BM25-only and hybrid (RRF) retrieval over the loaded knowledge base.
+
+A chunk counts as relevant to a query when it contains one of the query's `relevant` terms
+(accent-insensitive). Edit `scripts/retrieval_queries.jsonl` to match the PDFs in use.
+
+    python -m scripts.benchmark_retrieval --k 3 5 10
+    python -m scripts.benchmark_retrieval --queries my_queries.jsonl --k 5
+
+Needs QDRANT_URL, QDRANT_API_KEY and GOOGLE_API_KEY, and a collection loaded by the API.
+"""
+import json
+import time
+import argparse
+import statistics
+from typing import Callable, Dict, List
+
+from agno.document import Document
+
+from app.storage.rag import get_knowledge_base
+from app.utils.text import fold_accents
+
+
+def load_queries(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def is_relevant(document: Document, terms: List[str]) -> bool:
+    content = fold_accents(document.content)
+    return any(fold_accents(term) in content for term in terms)
+
+
+def evaluate(search: Callable[[str, int], List[Document]], queries: List[Dict], k: int) -> Dict[str, float]:
+    hits = []
+    precision = []
+    latencies = []
+    for item in queries:
+        start = time.perf_counter()
+        documents = search(item["query"], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        relevant = [is_relevant(document, item["relevant"]) for document in documents]
+        hits.append(1.0 if any(relevant) else 0.0)
+        precision.append(sum(relevant) / k)
+    return {
+        "recall": statistics.mean(hits),
+        "precision": statistics.mean(precision),
+        "latency_ms": statistics.median(latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default="scripts/retrieval_queries.jsonl")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    pdf_knowledge_base = get_knowledge_base()
+    pdf_knowledge_base.index_from_vector_db()
+
+    strategies = {
+        "dense": lambda query, k: pdf_knowledge_base.vector_db.search(query=query, limit=k),
+        "bm25": lambda query, k: [doc for doc, _ in pdf_knowledge_base.lexical_index.search(query, limit=k)],
+        "hybrid": lambda query, k: pdf_knowledge_base.search(query=query, num_documents=k),
+    }
+
+    print(f"{len(queries)} queries, {len(pdf_knowledge_base.lexical_index)} chunks")
+    print(f"{'strategy':<8} {'k':>3} {'recall@k':>9} {'precision@k':>12} {'p50 ms':>8}")
+    for k in args.k:
+        for name, search in strategies.items():
+            result = evaluate(search, queries, k)
+            print(f"{name:<8} {k:>3} {result['recall']:>9.2f} {result['precision']:>12.2f} {result['latency_ms']:>8.1f}")
@@ -0,0 +1,125 @@
+"""
+Compare the stored size and read latency of agent sessions in the JSON and compact formats.
+
+    python -m scripts.benchmark_session_storage --runs 12 --iterations 200
+    python -m scripts.benchmark_session_storage --live      # also measures Postgres rows (needs DB_URL)
+"""
+import os
+import json
+import time
+import uuid
+import argparse
+import statistics
+
+from app.storage.session_codec import compact_memory, compress, decompress, expand_memory, zstandard
+
+
+SYSTEM_PROMPT = "\n".join([
+    "Analyzes patient symptoms to suggest diagnostic hypotheses.",
+    "<instructions>",
+    *[f"- Instruction {i}: Use ONLY the information provided in the context of the knowledge base (RAG). "
+      f"Your ONLY final result MUST be a valid JSON object that fits EXACTLY into the schema." for i in range(12)],
+    "</instructions>",
+    '{"diagnosis": "Potential Condition Name", "confidence": "High", "justification": "...", "severity": "Moderate"}',
+] * 3)
+
+
+def build_session_memory(num_runs: int) -> dict:
+    runs = []
+    history = []
+    for i in range(num_runs):
+        user = {"role": "user", "content": f"High fever and persistent dry cough for {i + 2} days, chest pain when breathing."}
+        assistant = {
+            "role": "assistant",
+            "content": json.dumps({
+                "diagnosis": "Community-acquired pneumonia",
+                "confidence": "Medium",
+                "justification": "Fever, productive cough and pleuritic chest pain are consistent with pneumonia. " * 3,
+                "severity": "Moderate",
+            }),
+        }
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        messages += [{**m, "from_history": True} for m in history[-6:]]
+        messages += [user, assistant]
+        runs.append({
+            "run_id": str(uuid.uuid4()),
+            "agent_id": "symptom-analyzer",
+            "session_id": "benchmark",
+            "content": assistant["content"],
+            "messages": messages,
+            "metrics": {"input_tokens": [1800], "output_tokens": [220], "time": [2.4]},
+            "created_at": 1760000000 + i,
+        })
+        history += [user, assistant]
+    return {"runs": runs, "memories": {}, "summaries": {}}
+
+
+def timed(fn, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def offline(num_runs: int, keep_runs: int, iterations: int) -> None:
+    memory = build_session_memory(num_runs)
+    json_bytes = json.dumps(memory).encode("utf-8")
+    compact, prompts = compact_memory(memory, keep_runs)
+    blob = compress(compact)
+
+    print(f"codec: {'zstd' if zstandard is not None else 'zlib'}, runs stored: {num_runs}, kept: {keep_runs}")
+    print(f"json row payload:    {len(json_bytes):>9,} bytes")
+    print(f"compact row payload: {len(blob):>9,} bytes ({len(json_bytes) / len(blob):.1f}x smaller)")
+    print(f"prompt table (once): {sum(len(p) for p in prompts.values()):>9,} bytes")
+    print(f"json decode:    {timed(lambda: json.loads(json_bytes), iterations):.3f} ms (median)")
+    print(f"compact decode: {timed(lambda: expand_memory(decompress(blob), prompts), iterations):.3f} ms (median)")
+    print(f"compact encode: {timed(lambda: compress(compact_memory(memory, keep_runs)[0]), iterations):.3f} ms (median)")
+
+
+def live(num_runs: int, keep_runs: int, iterations: int) -> None:
+    from sqlalchemy import create_engine, text
+
+    memory = build_session_memory(num_runs)
+    blob = compress(compact_memory(memory, keep_runs)[0])
+    engine = create_engine(os.environ["DB_URL"])
+
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TEMP TABLE bench_json (session_id text primary key, memory jsonb)"))
+        connection.execute(text("CREATE TEMP TABLE bench_blob (session_id text primary key, memory_blob bytea)"))
+        connection.execute(text("ALTER TABLE bench_blob ALTER COLUMN memory_blob SET STORAGE EXTERNAL"))
+        connection.execute(
+            text("INSERT INTO bench_json VALUES (:id, CAST(:memory AS jsonb))"),
+            {"id": "s", "memory": json.dumps(memory)}
+        )
+        connection.execute(text("INSERT INTO bench_blob VALUES (:id, :blob)"), {"id": "s", "blob": blob})
+
+        json_size = connection.execute(text("SELECT pg_column_size(memory) FROM bench_json")).scalar()
+        blob_size = connection.execute(text("SELECT pg_column_size(memory_blob) FROM bench_blob")).scalar()
+        read_json = timed(
+            lambda: connection.execute(text("SELECT memory FROM bench_json WHERE session_id = 's'")).scalar(),
+            iterations
+        )
+        read_blob = timed(
+            lambda: decompress(connection.execute(text("SELECT memory_blob FROM bench_blob WHERE session_id = 's'")).scalar()),
+            iterations
+        )
+
+    print(f"postgres column size json:    {json_size:>9,} bytes")
+    print(f"postgres column size compact: {blob_size:>9,} bytes")
+    print(f"postgres read json:    {read_json:.3f} ms (median)")
+    print(f"postgres read compact: {read_blob:.3f} ms (median, including decompress)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=12, help="Runs accumulated in the session.")
+    parser.add_argument("--keep-runs", type=int, default=3, help="Runs kept by the compact format.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--live", action="store_true", help="Also measure row size and read latency in Postgres.")
+    args = parser.parse_args()
+
+    offline(args.runs, args.keep_runs, args.iterations)
+    if args.live:
+        live(args.runs, args.keep_runs, args.iterations)
@@ -0,0 +1,103 @@
+"""
+Compare putting every user memory in the prompt with the per-user top-k index, as a user's
+memory count grows: memory tokens in the system message, ranking latency (cold, after one
+memory was added, and warm) and whether the memory that matches the query made it into the
+top k.
+
+Memories are synthetic ("O usuário ..." sentences over SYMPTOM_SYNONYMS terms, spread over
+the last two weeks). One more specific memory per term is planted at a random age; each
+query asks about one term and should find its planted memory.
+
+    python -m scripts.benchmark_user_memories --counts 50 100 500 1000 --k 8
+"""
+import time
+import random
+import argparse
+import datetime
+import statistics
+from typing import List
+
+from agno.memory.v2.schema import UserMemory
+
+from app.agents.prompt_budget import count_tokens
+from app.storage.memory_index import UserMemoryIndex
+from app.utils.symptoms import SYMPTOM_SYNONYMS
+
+
+TEMPLATES = [
+    "O usuário relatou {term} há alguns dias.",
+    "O usuário tem histórico de {term} e faz acompanhamento.",
+    "O usuário perguntou sobre o tratamento de {term}.",
+    "O usuário disse que a {term} melhorou com repouso.",
+]
+
+
+def synthetic_memories(count: int, now: datetime.datetime, generator: random.Random) -> List[UserMemory]:
+    terms = list(SYMPTOM_SYNONYMS)
+    return [
+        UserMemory(
+            memory=generator.choice(TEMPLATES).format(term=generator.choice(terms)),
+            memory_id=f"m{position}",
+            last_updated=now - datetime.timedelta(hours=generator.uniform(0, 14 * 24)),
+        )
+        for position in range(count)
+    ]
+
+
+def planted_memories(now: datetime.datetime, generator: random.Random) -> List[UserMemory]:
+    return [
+        UserMemory(
+            memory=f"O usuário teve {term} com piora progressiva.", memory_id=f"planted-{term}",
+            last_updated=now - datetime.timedelta(hours=generator.uniform(0, 14 * 24)),
+        )
+        for term in SYMPTOM_SYNONYMS
+    ]
+
+
+def memory_block_tokens(memories: List[UserMemory]) -> int:
+    return count_tokens("".join(f"\n- {memory.memory}" for memory in memories))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[50, 100, 250, 500, 1000])
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    print(
+        f"{'memories':>8} {'all tokens':>11} {'top-k tokens':>13} {'cold ms':>8} {'add ms':>7} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {'hit@k':>6}"
+    )
+    for count in args.counts:
+        generator = random.Random(count)
+        planted = planted_memories(now, generator)
+        memories = synthetic_memories(max(0, count - len(planted)), now, generator) + planted
+        index = UserMemoryIndex()
+
+        start = time.perf_counter()
+        index.top_k("user", memories, "febre", args.k, now=now)
+        cold = (time.perf_counter() - start) * 1000
+
+        memories = memories + synthetic_memories(1, now, generator)
+        memories[-1].memory_id = "added"
+        start = time.perf_counter()
+        index.top_k("user", memories, "febre", args.k, now=now)
+        added = (time.perf_counter() - start) * 1000
+
+        latencies, tokens, hits = [], [], 0
+        for _ in range(args.queries):
+            term = generator.choice(list(SYMPTOM_SYNONYMS))
+            start = time.perf_counter()
+            ranked = index.top_k("user", memories, f"{term} com piora", args.k, now=now)
+            latencies.append((time.perf_counter() - start) * 1000)
+            tokens.append(memory_block_tokens([memory for _, memory in ranked]))
+            hits += any(memory.memory_id == f"planted-{term}" for _, memory in ranked)
+
+        latencies.sort()
+        print(
+            f"{len(memories):>8} {memory_block_tokens(memories):>11,} {statistics.mean(tokens):>13,.0f} {cold:>8.2f} "
+            f"{added:>7.2f} {statistics.median(latencies):>7.2f} {latencies[int(len(latencies) * 0.95) - 1]:>7.2f} "
+            f"{hits / args.queries:>6.0%}"
+        )
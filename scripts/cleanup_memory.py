@@ -1,22 +1,18 @@
 import logging
 
-from sqlalchemy import text
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from app.db.connection import engine as db_engine
+from app.db.connection import get_engine
+from app.db.partitions import maintain_partitions
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def clear_agents_memory():
-    logger.info("Executing scheduled memory cleanup...")
-    try:
-        with db_engine.connect() as connection:
-            connection.execute(text("TRUNCATE TABLE clinical_protocol_memories, symptom_analyzer_memories;"))
-            connection.commit()
-        logger.info("Agent memory tables truncated successfully.")
-    except Exception as e:
-        logger.error(f"Failed to clear agent memories: {e}")
+# Agent memories are not truncated any more: they expire with their weekly partitions
+# (MEMORY_RETENTION_WEEKS), dropped by `rotate_agent_partitions`.
+def rotate_agent_partitions():
+    logger.info("Executing scheduled partition maintenance...")
+    maintain_partitions(get_engine())
 
 scheduler = AsyncIOScheduler()
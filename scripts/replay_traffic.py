@@ -0,0 +1,208 @@
+"""
+Re-issue recorded agent traffic against a running build and report latency and output diffs.
+
+Record on the current build with AGENT_REPLAY_MODE=record. Start the build under test with
+AGENT_REPLAY_MODE=replay and the same AGENT_REPLAY_FILE, so no request reaches Groq or Gemini,
+then drive it:
+
+    python -m scripts.replay_traffic --token <JWT> --speed 1       # original pace
+    python -m scripts.replay_traffic --token <JWT> --speed 20      # 20x faster
+    python -m scripts.replay_traffic --token <JWT> --token <JWT2> --speed 0 --concurrency 32
+
+Recorded users are spread over the given tokens; with a single token the replay is bound by
+AGENT_USER_MAX_INFLIGHT on the server.
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+import websockets
+
+from app.agents.output_parser import OutputParseError, parse_output
+from app.agents.replay import AGENT_REPLAY_FILE, Recording, RecordingFile
+from app.monitoring.metrics import percentile
+from app.schemas.agents_schemas import ClinicalAction, DiagnosisHypothesis
+from app.utils.scheduler import BATCH, INTERACTIVE
+
+
+CLINICAL_INPUT = re.compile(r"^Diagnostic hypothesis: (.*)\. Justification: (.*)\.$", re.DOTALL)
+
+
+@dataclass
+class Entry:
+    """One request to re-issue: a REST call or a whole orchestrator session."""
+    kind: str
+    recording: Recording
+    expected: Dict[str, Optional[Dict[str, Any]]]
+
+
+@dataclass
+class Outcome:
+    kind: str
+    latency_ms: float
+    status: str
+    diffs: List[str] = field(default_factory=list)
+
+
+def expected_output(recording: Optional[Recording], schema) -> Optional[Dict[str, Any]]:
+    if recording is None:
+        return None
+    try:
+        return parse_output(recording.content or "", schema)[0].model_dump()
+    except OutputParseError:
+        return None
+
+
+def load_entries(path: str) -> List[Entry]:
+    recordings = sorted(RecordingFile(path), key=lambda recording: recording.started_at)
+    protocols = defaultdict(list)
+    for recording in recordings:
+        if recording.stage == "clinical_protocol" and recording.priority == INTERACTIVE:
+            protocols[recording.session_id].append(recording)
+
+    entries = []
+    for recording in recordings:
+        if recording.stage == "symptom_analyzer" and recording.priority == INTERACTIVE:
+            protocol = next((item for item in protocols[recording.session_id] if item.started_at >= recording.started_at), None)
+            entries.append(Entry("orchestrator", recording, {
+                "diagnosis": expected_output(recording, DiagnosisHypothesis),
+                "protocol": expected_output(protocol, ClinicalAction),
+            }))
+        elif recording.stage == "symptom_analyzer" and recording.priority == BATCH:
+            entries.append(Entry("symptom_analyzer", recording, {"diagnosis": expected_output(recording, DiagnosisHypothesis)}))
+        elif recording.stage == "clinical_protocol" and recording.priority == BATCH and CLINICAL_INPUT.match(recording.message):
+            entries.append(Entry("clinical_protocol", recording, {"protocol": expected_output(recording, ClinicalAction)}))
+    return entries
+
+
+def diff(name: str, expected: Optional[Dict[str, Any]], actual: Optional[Dict[str, Any]]) -> List[str]:
+    if expected is None:
+        return []
+    if actual is None:
+        return [f"{name}: missing"]
+    return [f"{name}.{key}" for key in sorted(set(expected) | set(actual)) if expected.get(key) != actual.get(key)]
+
+
+def token_for(recording: Recording, tokens: List[str]) -> str:
+    digest = hashlib.sha256(str(recording.user_id).encode()).digest()
+    return tokens[digest[0] % len(tokens)]
+
+
+async def replay_http(client: httpx.AsyncClient, entry: Entry, token: str, session_id: str) -> Outcome:
+    recording = entry.recording
+    if entry.kind == "symptom_analyzer":
+        path, body, key = "/agent/symptom_analyzer", {"symptoms": recording.message, "session_id": session_id}, "diagnosis"
+    else:
+        diagnosis, justification = CLINICAL_INPUT.match(recording.message).groups()
+        hypothesis = {"diagnosis": diagnosis, "justification": justification, "confidence": "", "severity": ""}
+        path, body, key = "/agent/clinical_protocol", {"session_id": session_id, "diagnosis": hypothesis}, "protocol"
+
+    start = time.perf_counter()
+    response = await client.post(path, json=body, headers={"Authorization": f"Bearer {token}"})
+    latency_ms = (time.perf_counter() - start) * 1000
+    if response.status_code != 200:
+        return Outcome(entry.kind, latency_ms, str(response.status_code))
+    return Outcome(entry.kind, latency_ms, "ok", diff(key, entry.expected[key], response.json()))
+
+
+async def replay_websocket(ws_url: str, entry: Entry, token: str, session_id: str) -> Outcome:
+    actual: Dict[str, Optional[Dict[str, Any]]] = {"diagnosis": None, "protocol": None}
+    status = "incomplete"
+    start = time.perf_counter()
+    async with websockets.connect(f"{ws_url}/agent/ws/orchestrator?token={token}") as websocket:
+        await websocket.send(json.dumps({"symptoms": entry.recording.message, "session_id": session_id}))
+        async for raw in websocket:
+            message = json.loads(raw)
+            if message.get("type") == "diagnosis_result":
+                actual["diagnosis"] = message["data"]
+            elif message.get("type") == "protocol_result":
+                actual["protocol"] = message["data"]
+            elif "error" in message:
+                status = "error"
+                break
+            elif message.get("status") == "Completed!":
+                status = "ok"
+                break
+    latency_ms = (time.perf_counter() - start) * 1000
+    diffs = diff("diagnosis", entry.expected["diagnosis"], actual["diagnosis"]) + diff("protocol", entry.expected["protocol"], actual["protocol"])
+    return Outcome(entry.kind, latency_ms, status, diffs)
+
+
+async def drive(args, entries: List[Entry]) -> List[Outcome]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    ws_url = args.base_url.replace("http", "ws", 1)
+    first = entries[0].recording.started_at
+    began = time.perf_counter()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        async def issue(entry: Entry) -> Outcome:
+            if args.speed > 0:
+                await asyncio.sleep(max(0.0, (entry.recording.started_at - first) / args.speed - (time.perf_counter() - began)))
+            token = token_for(entry.recording, args.token)
+            session_id = f"{args.session_prefix}{entry.recording.session_id}"
+            async with semaphore:
+                try:
+                    if entry.kind == "orchestrator":
+                        return await replay_websocket(ws_url, entry, token, session_id)
+                    return await replay_http(client, entry, token, session_id)
+                except Exception as e:
+                    return Outcome(entry.kind, 0.0, type(e).__name__)
+
+        return await asyncio.gather(*(issue(entry) for entry in entries))
+
+
+def report(outcomes: List[Outcome], elapsed: float, show_diffs: int) -> None:
+    print(f"{len(outcomes)} request(s) in {elapsed:.1f}s")
+    print(f"{'kind':<18} {'n':>5} {'ok':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'diffs':>6}  errors")
+    by_kind = defaultdict(list)
+    for outcome in outcomes:
+        by_kind[outcome.kind].append(outcome)
+    for kind, items in sorted(by_kind.items()):
+        ok = [item for item in items if item.status == "ok"]
+        latencies = [item.latency_ms for item in ok]
+        errors = defaultdict(int)
+        for item in items:
+            if item.status != "ok":
+                errors[item.status] += 1
+        print(
+            f"{kind:<18} {len(items):>5} {len(ok):>5} {percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f} "
+            f"{percentile(latencies, 0.99):>9.1f} {sum(1 for item in ok if item.diffs):>6}  {dict(errors) or '-'}"
+        )
+
+    changed = defaultdict(int)
+    for outcome in outcomes:
+        for field_name in outcome.diffs:
+            changed[field_name] += 1
+    if changed:
+        print("\nfields that differ from the recording:")
+        for field_name, count in sorted(changed.items(), key=lambda item: item[1], reverse=True)[:show_diffs]:
+            print(f"  {field_name:<40} {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=AGENT_REPLAY_FILE)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", action="append", required=True, help="JWT; repeat to spread recorded users over several accounts")
+    parser.add_argument("--speed", type=float, default=1.0, help="pace multiplier; 0 issues everything as fast as --concurrency allows")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--session-prefix", default="replay-")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--show-diffs", type=int, default=20)
+    args = parser.parse_args()
+
+    entries = load_entries(args.file)[: args.limit]
+    if not entries:
+        raise SystemExit(f"No replayable requests in '{args.file}'.")
+    print(f"Replaying {len(entries)} request(s) from '{args.file}' against {args.base_url} (speed {args.speed or 'max'}).")
+    start = time.perf_counter()
+    outcomes = asyncio.run(drive(args, entries))
+    report(outcomes, time.perf_counter() - start, args.show_diffs)
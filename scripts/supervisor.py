@@ -0,0 +1,109 @@
+"""
+Run the API as several uvicorn workers under one owner process.
+
+The supervisor ingests the knowledge base (at start, on PDF changes and on reload requests
+from the workers' admin endpoint) and runs the partition schedule. The workers run with
+APP_ROLE=worker: they only serve requests, and load each knowledge base version the
+supervisor publishes (Postgres NOTIFY on `kb_version`) from the lexical snapshot it wrote
+under KB_SNAPSHOT_DIR, instead of every worker re-ingesting and re-indexing on its own.
+Without KB_SNAPSHOT_DIR the supervisor creates a private directory (mode 0700) for them.
+
+    python -m scripts.supervisor --workers 4 --port 8000
+"""
+import os
+import sys
+import shutil
+import signal
+import asyncio
+import argparse
+import datetime
+import logging
+import tempfile
+
+from app.db.notifications import PgListener
+from app.storage import kb_reload
+from app.storage.kb_reload import KB_RELOAD_CHANNEL, KB_WATCH_SECONDS, sync_knowledge_base, watch_knowledge_base
+from app.utils.cluster import APP_ROLE, WORKER
+from app.utils.http_pool import http_pool
+from scripts.cleanup_memory import rotate_agent_partitions, scheduler
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def reload_knowledge_base(lock: asyncio.Lock, force: bool = False) -> None:
+    async with lock:
+        try:
+            result = await sync_knowledge_base(force=force, ingest=True)
+            logger.info(f"Knowledge base sync finished: {result}")
+        except Exception as e:
+            logger.error(f"Knowledge base sync failed: {e}", exc_info=True)
+
+
+async def start_workers(args) -> asyncio.subprocess.Process:
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", args.host, "--port", str(args.port), "--workers", str(args.workers),
+    ]
+    logger.info(f"Starting {args.workers} worker(s): {' '.join(command)}")
+    return await asyncio.create_subprocess_exec(
+        *command, env={**os.environ, "APP_ROLE": WORKER, "KB_SNAPSHOT_DIR": kb_reload.KB_SNAPSHOT_DIR}
+    )
+
+
+async def supervise(args) -> int:
+    if APP_ROLE == WORKER:
+        raise SystemExit("The supervisor must not run with APP_ROLE=worker.")
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    # Snapshots are pickles: share them only through a directory nobody else can write to.
+    private_snapshot_dir = kb_reload.KB_SNAPSHOT_DIR is None
+    if private_snapshot_dir:
+        kb_reload.KB_SNAPSHOT_DIR = tempfile.mkdtemp(prefix="kb_snapshots_")
+    kb_reload.snapshot_dir()
+
+    lock = asyncio.Lock()
+    scheduler.add_job(rotate_agent_partitions, 'interval', hours=24, next_run_time=datetime.datetime.now())
+    if KB_WATCH_SECONDS > 0:
+        scheduler.add_job(watch_knowledge_base, 'interval', seconds=KB_WATCH_SECONDS)
+    scheduler.start()
+
+    def on_reload_request(payload):
+        if payload is not None:
+            asyncio.run_coroutine_threadsafe(reload_knowledge_base(lock, force=payload == "force"), loop)
+    listener = PgListener(KB_RELOAD_CHANNEL, on_reload_request).start()
+
+    # Workers come up (live, not ready) while the first sync runs; they get ready when it is published.
+    workers = await start_workers(args)
+    asyncio.create_task(reload_knowledge_base(lock))
+
+    exited = asyncio.create_task(workers.wait())
+    stopped = asyncio.create_task(stop.wait())
+    await asyncio.wait({exited, stopped}, return_when=asyncio.FIRST_COMPLETED)
+    if not exited.done():
+        logger.info("Stopping workers...")
+        workers.terminate()
+        await exited
+    stopped.cancel()
+
+    listener.stop()
+    scheduler.shutdown()
+    await http_pool.aclose()
+    if private_snapshot_dir:
+        shutil.rmtree(kb_reload.KB_SNAPSHOT_DIR, ignore_errors=True)
+    logger.info(f"Workers exited with code {workers.returncode}.")
+    return workers.returncode or 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(supervise(args)))
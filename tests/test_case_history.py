@@ -0,0 +1,83 @@
+import asyncio
+import datetime
+import logging
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from app.schemas.agents_schemas import ClinicalAction, DiagnosisHypothesis
+from app.storage.case_history import (
+    DIAGNOSIS, PROTOCOL, CaseFilters, CaseHistoryWriter, case_history_table, case_record, csv_line,
+    frequent_inputs, iter_cases, query_cases
+)
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def attach_schema(connection, _):
+        connection.execute("ATTACH DATABASE ':memory:' AS ai")
+
+    case_history_table.create(engine)
+    return engine
+
+
+def diagnosis(name: str, severity: str) -> DiagnosisHypothesis:
+    return DiagnosisHypothesis(diagnosis=name, confidence="alta", justification="sintomas", severity=severity)
+
+
+def test_batched_writes_and_keyset_pages(engine):
+    logger.info("--- STARTING CASE HISTORY TEST ---")
+    writer = CaseHistoryWriter(engine=engine, batch_size=4)
+    start = datetime.datetime.now(datetime.timezone.utc)
+    for i in range(10):
+        writer.record(case_record(DIAGNOSIS, "orchestrator", i % 2, f"s{i}", diagnosis("Pneumonia", "Alta" if i % 3 else "leve")))
+    writer.record(case_record(PROTOCOL, "clinical_protocol", 1, "s10", ClinicalAction(condition="Asma", severity="alta", urgency="imediata")))
+    writer.flush()
+    assert writer.stats["written"] == 11 and writer.stats["batches"] >= 3 and writer.pending == 0
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = query_cases(CaseFilters(severity="ALTA", start=start), limit=3, cursor=cursor, engine=engine)
+        seen.extend(row["id"] for row in rows)
+        if cursor is None:
+            break
+    assert len(seen) == 7 and seen == sorted(seen, reverse=True)
+
+    rows, _ = query_cases(CaseFilters(user_id="1", diagnosis="asma"), engine=engine)
+    assert [row["urgency"] for row in rows] == ["imediata"]
+
+
+def test_failed_flush_keeps_rows_and_export_streams_pages(engine):
+    broken = CaseHistoryWriter(engine=create_engine("sqlite://"), batch_size=100)
+    broken.record(case_record(DIAGNOSIS, "symptom_analyzer", 7, None, diagnosis("Gripe", "leve")))
+    assert broken.flush() == 0 and broken.pending == 1
+
+    writer = CaseHistoryWriter(engine=engine, batch_size=100)
+    for i in range(5):
+        writer.record(case_record(DIAGNOSIS, "symptom_analyzer", 7, None, diagnosis(f"Gripe {i}", "leve")))
+    writer.flush()
+
+    async def export():
+        return [csv_line(row) async for row in iter_cases(CaseFilters(user_id="7"), page_size=2, engine=engine)]
+
+    lines = asyncio.run(export())
+    assert len(lines) == 5 and lines[0].split(",")[6] == "Gripe 4"
+    assert csv_line().startswith("id,created_at,user_id")
+
+
+def test_frequent_inputs_are_counted_per_kind(engine):
+    writer = CaseHistoryWriter(engine=engine, batch_size=100)
+    start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    for symptoms in ["febre", "tosse", "febre", "febre", "tosse", "dor"]:
+        writer.record(case_record(DIAGNOSIS, "symptom_analyzer", 1, None, diagnosis("Gripe", "leve"), input_text=symptoms))
+    writer.record(case_record(PROTOCOL, "clinical_protocol", 1, None, ClinicalAction(condition="Gripe", severity="leve", urgency="eletiva"), input_text="febre"))
+    writer.flush()
+    assert frequent_inputs(DIAGNOSIS, start, 2, engine=engine) == ["febre", "tosse"]
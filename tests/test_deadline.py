@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+import pytest
+
+from app.utils.deadline import ClientDisconnected, Deadline, DeadlineExceeded, check_deadline, remaining_seconds, run_stage, use_deadline
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SlowCall:
+    def __init__(self):
+        self.cancelled = False
+
+    async def __call__(self, seconds: float) -> str:
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "done"
+
+
+def test_stage_is_cancelled_at_the_deadline():
+    logger.info("--- STARTING REQUEST DEADLINE TEST ---")
+    call = SlowCall()
+
+    async def scenario():
+        with use_deadline(Deadline(0.05)):
+            assert remaining_seconds(60) <= 0.05
+            assert await run_stage("fast", call(0)) == "done"
+            await run_stage("slow", call(5))
+
+    with pytest.raises(DeadlineExceeded) as error:
+        asyncio.run(scenario())
+    assert error.value.stage == "slow" and call.cancelled
+
+
+def test_stage_is_cancelled_when_the_client_disconnects():
+    call = SlowCall()
+
+    async def scenario():
+        disconnected = asyncio.ensure_future(asyncio.sleep(0.05))
+        with use_deadline(Deadline(10)):
+            await run_stage("agent", call(5), disconnected)
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(scenario())
+    assert call.cancelled
+
+
+def test_client_timeout_is_capped_and_checked():
+    assert Deadline.from_client(None).seconds == Deadline().seconds
+    assert Deadline.from_client(10_000).seconds <= 300
+
+    check_deadline("outside_a_request")
+    with use_deadline(Deadline(0)), pytest.raises(DeadlineExceeded):
+        check_deadline("retrieval")
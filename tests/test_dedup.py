@@ -0,0 +1,45 @@
+import logging
+
+from agno.document import Document
+
+from app.storage.dedup import NearDuplicateFilter
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DISCLAIMER = (
+    "Aviso: este material não substitui a consulta médica. Procure um serviço de saúde em caso de "
+    "febre persistente, falta de ar ou dor no peito. Conteúdo educativo."
+)
+TREATMENT = (
+    "Pneumonia adquirida na comunidade: tratamento empírico com amoxicilina por sete dias em adultos "
+    "sem comorbidades, reavaliando em 48 a 72 horas."
+)
+
+
+def test_near_and_exact_duplicates_are_dropped():
+    logger.info("--- STARTING NEAR DUPLICATE FILTER TEST ---")
+    dedup = NearDuplicateFilter()
+    chunks = [
+        Document(content=DISCLAIMER, meta_data={"page": 1}),
+        Document(content=DISCLAIMER.replace("Conteúdo educativo.", "Conteúdo educativo revisado."), meta_data={"page": 7}),
+        Document(content=TREATMENT, meta_data={"page": 8}),
+        Document(content=DISCLAIMER, meta_data={"page": 12}),
+    ]
+
+    kept = dedup.filter(chunks)
+
+    assert [doc.meta_data["page"] for doc in kept] == [1, 8]
+    assert dedup.stats["near_duplicates"] == 1
+    assert dedup.stats["exact_duplicates"] == 1
+    assert dedup.stats["embedding_calls_avoided"] == 2
+
+
+def test_seeded_chunks_are_not_ingested_again():
+    dedup = NearDuplicateFilter()
+    assert dedup.seed([TREATMENT]) == 1
+
+    kept = dedup.filter([Document(content=TREATMENT + " "), Document(content=DISCLAIMER)])
+
+    assert [doc.content for doc in kept] == [DISCLAIMER]
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+import httpx
+
+from app.agents.model_router import build_backend
+from app.utils.http_pool import HTTPPool, http_pool
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_requests_per_host_are_capped_until_the_body_is_closed():
+    logger.info("--- STARTING HTTP POOL TEST ---")
+    pool = HTTPPool(max_per_host=2)
+    in_flight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return httpx.Response(200, text=request.url.host)
+
+    async def run():
+        pool.async_transport().transport = httpx.MockTransport(handler)
+        async with pool.async_client() as first, pool.async_client() as second:
+            responses = await asyncio.gather(
+                *(client.get(f"http://{host}/") for client in (first, second) for host in ("a.test", "a.test", "a.test", "b.test"))
+            )
+            async with first.stream("GET", "http://a.test/") as streamed:
+                held = pool.snapshot()["hosts"]["a.test"]["in_flight"]
+        return responses, held
+
+    responses, held = asyncio.run(run())
+    hosts = pool.snapshot()["hosts"]
+    assert [response.text for response in responses].count("a.test") == 6
+    assert hosts["a.test"]["peak"] == 2 and hosts["a.test"]["waited"] > 0 and hosts["a.test"]["requests"] == 7
+    assert held == 1 and hosts["a.test"]["in_flight"] == 0 and hosts["b.test"]["requests"] == 2
+
+
+def test_backends_share_the_process_wide_transports():
+    groq = build_backend("groq:qwen/qwen3-32b", "key")
+    gemini = build_backend("gemini:gemini-2.0-flash").get_client()
+    assert groq.async_client._client._transport is http_pool.async_transport()
+    assert groq.get_client()._client._transport is http_pool.transport()
+    assert gemini._api_client._async_httpx_client._transport is http_pool.async_transport()
+
@@ -0,0 +1,46 @@
+import logging
+
+from agno.document import Document
+
+from app.storage.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.utils.text import analyze
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNKS = [
+    Document(content="Pneumonia adquirida na comunidade: iniciar amoxicilina 500 mg.", meta_data={"source": "a.pdf"}),
+    Document(content="Infecções respiratórias virais costumam melhorar com repouso.", meta_data={"source": "a.pdf"}),
+    Document(content="Hipertensão arterial sistêmica: medir a pressão em duas consultas.", meta_data={"source": "b.pdf"}),
+]
+
+
+def test_analyze_folds_accents_and_stems_plurals():
+    assert analyze("Infecções Respiratórias") == analyze("infecção respiratória")
+    assert analyze("CID J18") == ["cid", "j18"]
+    assert "na" not in analyze("pneumonia na comunidade")
+
+
+def test_bm25_ranks_exact_terms_and_applies_filters():
+    logger.info("--- STARTING BM25 INDEX TEST ---")
+    index = BM25Index()
+    assert index.add(CHUNKS) == 3
+    assert index.add(CHUNKS[:1]) == 0
+
+    results = index.search("amoxicilina para pneumonia", limit=2)
+    assert results[0][0] is CHUNKS[0]
+
+    results = index.search("infecção respiratória", limit=5)
+    assert [document for document, _ in results] == [CHUNKS[1]]
+
+    assert index.search("pressão arterial", limit=5, filters={"source": "a.pdf"}) == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    dense = [CHUNKS[2], CHUNKS[0], CHUNKS[1]]
+    lexical = [CHUNKS[0], CHUNKS[1]]
+
+    fused = reciprocal_rank_fusion([dense, lexical], limit=2)
+
+    assert fused == [CHUNKS[0], CHUNKS[1]]
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from app.storage import kb_reload
+from app.storage.kb_reload import (
+    KnowledgeBaseVersion, build_manifest, copy_unchanged_points, diff_manifests, drop_old_collections, swap_alias
+)
+from app.storage.rag import HybridPDFKnowledgeBase
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FakeQdrant:
+    """The slice of QdrantClient the reload uses: collections of points, and aliases resolved on access."""
+
+    def __init__(self):
+        self.collections = {}
+        self.aliases = {}
+        self.alias_updates = []
+
+    def resolve(self, name: str) -> str:
+        return self.aliases.get(name, name)
+
+    def scroll(self, collection_name, limit, offset=None, with_payload=True, with_vectors=True):
+        points = list(self.collections[self.resolve(collection_name)].values())
+        start = offset or 0
+        end = start + limit
+        return points[start:end], (end if end < len(points) else None)
+
+    def upsert(self, collection_name, points, wait=True):
+        target = self.collections.setdefault(self.resolve(collection_name), {})
+        for point in points:
+            target[point.id] = point
+
+    def get_aliases(self):
+        return SimpleNamespace(aliases=[
+            SimpleNamespace(alias_name=alias, collection_name=collection) for alias, collection in self.aliases.items()
+        ])
+
+    def get_collections(self):
+        return SimpleNamespace(collections=[SimpleNamespace(name=name) for name in self.collections])
+
+    def collection_exists(self, name):
+        return name in self.collections
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+    def update_collection_aliases(self, change_aliases_operations):
+        # Qdrant applies the whole list in one step: copy, apply, then publish.
+        aliases = dict(self.aliases)
+        for operation in change_aliases_operations:
+            if getattr(operation, "delete_alias", None) is not None:
+                del aliases[operation.delete_alias.alias_name]
+            else:
+                assert operation.create_alias.alias_name not in aliases, "alias created twice"
+                aliases[operation.create_alias.alias_name] = operation.create_alias.collection_name
+        self.alias_updates.append(change_aliases_operations)
+        self.aliases = aliases
+
+
+def point(point_id: int, source: str, vector=None, specialty=None):
+    meta_data = {"source": source}
+    if specialty:
+        meta_data["specialty"] = specialty
+    return SimpleNamespace(
+        id=point_id, vector=vector or [float(point_id)],
+        payload={"content": f"Trecho {point_id} de {source}: febre e tosse.", "meta_data": meta_data},
+    )
+
+
+def test_manifest_diff_finds_changed_added_and_removed_files(tmp_path):
+    logger.info("--- STARTING KNOWLEDGE BASE RELOAD TEST ---")
+    (tmp_path / "cardiologia").mkdir()
+    (tmp_path / "a.pdf").write_bytes(b"a")
+    (tmp_path / "cardiologia" / "b.pdf").write_bytes(b"b")
+    (tmp_path / "notes.txt").write_bytes(b"ignored")
+    old = build_manifest(str(tmp_path))
+    assert sorted(old) == ["a.pdf", "cardiologia/b.pdf"]
+    assert diff_manifests(old, build_manifest(str(tmp_path))) == (set(), set())
+
+    (tmp_path / "a.pdf").write_bytes(b"a, revised")
+    (tmp_path / "cardiologia" / "b.pdf").unlink()
+    (tmp_path / "c.pdf").write_bytes(b"c")
+    assert diff_manifests(old, build_manifest(str(tmp_path))) == ({"a.pdf", "c.pdf"}, {"cardiologia/b.pdf"})
+    assert build_manifest(str(tmp_path / "missing")) == {}
+
+
+def test_unchanged_points_are_copied_with_their_vectors(monkeypatch):
+    monkeypatch.setattr(kb_reload, "SCROLL_BATCH", 2)
+    client = FakeQdrant()
+    client.collections["pdf_rag_v1"] = {
+        1: point(1, "kept.pdf", specialty="cardiologia"),
+        2: point(2, "changed.pdf"),
+        3: point(3, "kept.pdf"),
+        4: point(4, "removed.pdf"),
+        5: point(5, "kept.pdf", vector={"dense": [0.5]}),
+    }
+
+    copied = copy_unchanged_points(client, "pdf_rag_v1", "pdf_rag_v2", {"changed.pdf", "removed.pdf"})
+    target = client.collections["pdf_rag_v2"]
+    assert copied == 3 and sorted(target) == [1, 3, 5]
+    assert target[5].vector == {"dense": [0.5]}
+    assert target[1].payload["meta_data"]["specialty"] == "cardiologia"
+    # Points stored before specialty routing are tagged on the way, without re-embedding.
+    assert target[3].payload["meta_data"]["specialty"]
+
+
+def test_alias_swap_is_a_single_atomic_update():
+    client = FakeQdrant()
+    client.collections = {"pdf_rag_v1": {1: point(1, "a.pdf")}, "pdf_rag_v2": {2: point(2, "a.pdf")}}
+    client.aliases = {"pdf_rag": "pdf_rag_v1"}
+
+    swap_alias(client, "pdf_rag", "pdf_rag_v2")
+    assert len(client.alias_updates) == 1
+    assert [type(operation).__name__ for operation in client.alias_updates[0]] == [
+        "DeleteAliasOperation", "CreateAliasOperation"
+    ]
+    assert client.aliases == {"pdf_rag": "pdf_rag_v2"}
+    assert [item.id for item in client.scroll("pdf_rag", limit=10)[0]] == [2]
+
+
+def test_legacy_collection_becomes_an_alias():
+    client = FakeQdrant()
+    client.collections = {"pdf_rag": {1: point(1, "a.pdf")}, "pdf_rag_v2": {2: point(2, "a.pdf")}}
+
+    swap_alias(client, "pdf_rag", "pdf_rag_v2")
+    assert sorted(client.collections) == ["pdf_rag_v2"]
+    assert client.aliases == {"pdf_rag": "pdf_rag_v2"}
+
+
+def test_old_collections_are_dropped_but_the_active_one_is_kept():
+    client = FakeQdrant()
+    client.collections = {name: {} for name in ("pdf_rag_v1", "pdf_rag_v2", "pdf_rag_v10", "pdf_rag_v11", "other")}
+    # Rolled back: the alias points at an older version than the newest collection.
+    client.aliases = {"pdf_rag": "pdf_rag_v2"}
+
+    assert drop_old_collections(client, "pdf_rag", keep=2) == ["pdf_rag_v1"]
+    assert sorted(client.collections) == ["other", "pdf_rag_v10", "pdf_rag_v11", "pdf_rag_v2"]
+
+
+class FakeLockConnection:
+    """Connection whose pg_try_advisory_lock / pg_advisory_unlock share one lock between all connections."""
+
+    held = False
+
+    def execute(self, statement):
+        sql = str(statement)
+        acquired = None
+        if "pg_try_advisory_lock" in sql:
+            acquired = not FakeLockConnection.held
+            FakeLockConnection.held = True
+        elif "pg_advisory_unlock" in sql:
+            FakeLockConnection.held = False
+        return SimpleNamespace(scalar=lambda: acquired)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_only_one_worker_ingests_a_change(monkeypatch):
+    manifest = {"a.pdf": "new"}
+    versions = [KnowledgeBaseVersion(1, "pdf_rag_v1", {"a.pdf": "old"}, 3)]
+    ingested = []
+
+    async def ingest_version(manifest, active, force=False):
+        ingested.append(active.id)
+        await asyncio.sleep(0.05)
+        versions.append(KnowledgeBaseVersion(active.id + 1, f"pdf_rag_v{active.id + 1}", manifest, 3))
+        return versions[-1], {}
+
+    kb = SimpleNamespace(active_version=None)
+    FakeLockConnection.held = False
+    monkeypatch.setattr(kb_reload, "LOCK_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(kb_reload, "get_engine", lambda: SimpleNamespace(connect=FakeLockConnection))
+    monkeypatch.setattr(kb_reload, "get_knowledge_base", lambda: kb)
+    monkeypatch.setattr(kb_reload, "build_manifest", lambda: manifest)
+    monkeypatch.setattr(kb_reload, "get_active_version", lambda: versions[-1])
+    monkeypatch.setattr(kb_reload, "ingest_version", ingest_version)
+    monkeypatch.setattr(kb_reload, "load_version", lambda kb, version: "snapshot")
+    monkeypatch.setattr(kb_reload, "notify", lambda *args: None)
+
+    async def two_workers():
+        return await asyncio.gather(kb_reload.sync_knowledge_base(ingest=True), kb_reload.sync_knowledge_base(ingest=True))
+
+    results = asyncio.run(two_workers())
+    # The second worker waited on the lock, then saw the new active version and did not ingest again.
+    assert ingested == [1]
+    assert sorted(result["ingested"] for result in results) == [False, True]
+    assert {result["active_version"] for result in results} == {2}
+    assert not FakeLockConnection.held
+
+
+class TracedKnowledgeBase(HybridPDFKnowledgeBase):
+    """Live knowledge base that logs when its lexical index is built and swapped."""
+
+    events: list = []
+
+    def build_lexical_index(self, collection=None):
+        self.events.append(("build", collection))
+        return super().build_lexical_index(collection)
+
+    def swap_lexical_index(self, lexical_index, router=None):
+        self.events.append(("swap_lexical", len(lexical_index)))
+        super().swap_lexical_index(lexical_index, router)
+
+
+def test_ingestion_builds_the_lexical_index_before_swapping_everything_together(monkeypatch):
+    client = FakeQdrant()
+    client.collections = {"pdf_rag_v1": {1: point(1, "a.pdf")}}
+    client.aliases = {"pdf_rag": "pdf_rag_v1"}
+    client.get_collection = lambda name: SimpleNamespace(status="green")
+    client.count = lambda collection_name, exact: SimpleNamespace(count=len(client.collections[collection_name]))
+    live = TracedKnowledgeBase(path="unused", events=[])
+    object.__setattr__(live, "vector_db", SimpleNamespace(client=client, collection="pdf_rag"))
+    live.retrieval_cache.put(("stale",), [], 1.0)
+    events = live.events
+
+    async def aload(recreate, skip_existing):
+        client.upsert(target["name"], [point(2, "b.pdf")])
+
+    def staging(collection, path, with_cache):
+        target["name"] = collection
+        return SimpleNamespace(vector_db=SimpleNamespace(create=lambda: None), deduplicator=None, aload=aload)
+
+    def swap(client, alias, collection):
+        events.append(("alias", collection))
+        swap_alias(client, alias, collection)
+
+    target = {}
+    monkeypatch.setattr(kb_reload, "get_knowledge_base", lambda: live)
+    monkeypatch.setattr(kb_reload, "build_pdf_knowledge_base", staging)
+    monkeypatch.setattr(kb_reload, "wait_until_indexed", lambda client, collection: len(client.collections[collection]))
+    monkeypatch.setattr(kb_reload, "swap_alias", swap)
+    monkeypatch.setattr(kb_reload, "record_version", lambda *args: events.append(("version",)) or KnowledgeBaseVersion(2, *args))
+    monkeypatch.setattr(kb_reload, "fit_spelling", lambda kb: None)
+    monkeypatch.setattr(kb_reload, "KB_SNAPSHOT_DIR", None)
+
+    active = KnowledgeBaseVersion(1, "pdf_rag_v1", {"a.pdf": "old"}, 1)
+    version, _ = asyncio.run(kb_reload.ingest_version({"a.pdf": "old", "b.pdf": "new"}, active))
+    assert events == [("build", target["name"]), ("alias", target["name"]), ("swap_lexical", 2), ("version",)]
+    assert version.id == 2 and live.active_version == 2
+    assert live.corpus_version == 1 and live.retrieval_cache.snapshot()["entries"] == 0
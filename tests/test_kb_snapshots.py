@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+from agno.document import Document
+
+from app.storage import kb_reload
+from app.storage.kb_reload import KnowledgeBaseVersion, load_version, snapshot_path
+from app.storage.lexical_index import BM25Index
+from app.storage.rag import HybridPDFKnowledgeBase
+from app.storage.specialty_router import SpecialtyRouter, tag_specialty
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNKS = [
+    Document(content="Pneumonia adquirida na comunidade: iniciar amoxicilina 500 mg.", meta_data={"source": "a.pdf"}),
+    Document(content="Hipertensão arterial sistêmica: medir a pressão em duas consultas.", meta_data={"source": "b.pdf"}),
+    Document(content="Crise asmática: salbutamol inalatório e avaliar saturação.", meta_data={"source": "c.pdf"}),
+]
+
+
+class StoredKnowledgeBase(HybridPDFKnowledgeBase):
+    """Knowledge base whose 'Qdrant collection' is CHUNKS, counting how often it is scrolled."""
+
+    scrolls: int = 0
+
+    def stored_documents(self, batch_size: int = 256, collection=None):
+        self.scrolls += 1
+        for chunk in CHUNKS:
+            document = Document(content=chunk.content, meta_data=dict(chunk.meta_data))
+            tag_specialty(document)
+            yield document
+
+
+
+def stored_knowledge_base(**kwargs) -> StoredKnowledgeBase:
+    kb = StoredKnowledgeBase(path="unused", **kwargs)
+    object.__setattr__(kb, "vector_db", SimpleNamespace(collection="pdf_rag"))
+    return kb
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(kb_reload, "KB_SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_first_process_builds_the_snapshot_and_the_next_ones_load_it(snapshot_dir):
+    logger.info("--- STARTING KNOWLEDGE BASE SNAPSHOT TEST ---")
+    version = KnowledgeBaseVersion(7, "pdf_rag_v1", {}, len(CHUNKS))
+    owner = stored_knowledge_base(router=SpecialtyRouter())
+    assert load_version(owner, version) == "vector_db" and owner.scrolls == 1
+    assert snapshot_path(7).is_file()
+
+    worker = stored_knowledge_base(router=SpecialtyRouter())
+    assert load_version(worker, version) == "snapshot" and worker.scrolls == 0
+    assert worker.corpus_version == 1 and worker.router.chunks == owner.router.chunks
+    query = "amoxicilina para pneumonia"
+    assert [document.content for document, _ in worker.lexical_index.search(query)] == \
+        [document.content for document, _ in owner.lexical_index.search(query)]
+
+    worker.lexical_index.add([Document(content="Dengue: hidratação oral vigorosa.")])
+    assert len(worker.lexical_index) == len(CHUNKS) + 1
+
+
+def test_old_snapshots_are_dropped(snapshot_dir, monkeypatch):
+    index = BM25Index()
+    index.add(CHUNKS)
+    kb = HybridPDFKnowledgeBase(path="unused", lexical_index=index)
+    for version_id in (1, 2, 3):
+        kb.save_lexical_snapshot(str(snapshot_path(version_id)))
+    kb_reload.drop_old_snapshots(keep=2)
+    assert sorted(path.name for path in snapshot_dir.iterdir()) == ["lexical_v2.pickle", "lexical_v3.pickle"]
+
+
+def test_workers_follow_the_active_version_without_reading_the_pdfs(snapshot_dir, monkeypatch):
+    kb = stored_knowledge_base()
+    notified = []
+    monkeypatch.setattr(kb_reload, "get_knowledge_base", lambda: kb)
+    monkeypatch.setattr(kb_reload, "get_active_version", lambda: KnowledgeBaseVersion(3, "pdf_rag_v3", {"a.pdf": "x"}, 3))
+    monkeypatch.setattr(kb_reload, "build_manifest", lambda: pytest.fail("workers must not read the PDF directory"))
+    monkeypatch.setattr(kb_reload, "notify", lambda *args: notified.append(args))
+
+    result = asyncio.run(kb_reload.follow_active_version())
+    assert result["active_version"] == 3 and not result["ingested"] and kb.active_version == 3
+    assert asyncio.run(kb_reload.follow_active_version())["loaded_from"] is None
+    assert notified == []
+
+    monkeypatch.setattr(kb_reload, "get_active_version", lambda: None)
+    with pytest.raises(RuntimeError):
+        asyncio.run(kb_reload.follow_active_version())
+
+
+def test_snapshots_need_a_private_directory(tmp_path, monkeypatch):
+    kb = stored_knowledge_base()
+    version = KnowledgeBaseVersion(4, "pdf_rag_v4", {}, len(CHUNKS))
+
+    monkeypatch.setattr(kb_reload, "KB_SNAPSHOT_DIR", None)
+    assert snapshot_path(4) is None
+    assert load_version(kb, version) == "vector_db" and not any(tmp_path.iterdir())
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    (shared / "lexical_v4.pickle").write_bytes(b"planted")
+    monkeypatch.setattr(kb_reload, "KB_SNAPSHOT_DIR", str(shared))
+    with pytest.raises(PermissionError):
+        kb_reload.snapshot_dir()
+    # The planted file is never unpickled: the index is rebuilt from Qdrant instead.
+    assert load_version(kb, version) == "vector_db" and kb.scrolls == 2
+
+    private = tmp_path / "private"
+    monkeypatch.setattr(kb_reload, "KB_SNAPSHOT_DIR", str(private))
+    assert kb_reload.snapshot_dir() == private and private.stat().st_mode & 0o777 == 0o700
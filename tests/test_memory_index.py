@@ -0,0 +1,64 @@
+import datetime
+import logging
+from types import SimpleNamespace
+
+from agno.memory.v2.schema import UserMemory
+
+from app.agents.prompt_budget import BudgetedMemory, PromptBudget, count_tokens, track_prompt
+from app.storage.memory_index import UserMemoryIndex
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NOW = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+
+
+def memory(memory_id: str, text: str, hours_ago: float = 1) -> UserMemory:
+    return UserMemory(memory=text, memory_id=memory_id, last_updated=NOW - datetime.timedelta(hours=hours_ago))
+
+
+MEMORIES = [
+    memory("m0", "O usuário é alérgico a penicilina."),
+    memory("m1", "O usuário tem asma desde a infância e usa broncodilatador."),
+    memory("m2", "O usuário pratica corrida três vezes por semana."),
+    memory("m3", "O usuário relatou tosse seca e febre na semana passada.", hours_ago=200),
+]
+
+
+def test_top_k_ranks_by_similarity_then_recency():
+    logger.info("--- STARTING USER MEMORY INDEX TEST ---")
+    index = UserMemoryIndex(dimensions=256)
+
+    ranked = index.top_k("u1", MEMORIES, "febre e tosse seca", k=2, now=NOW)
+    assert [item.memory_id for _, item in ranked][0] == "m3"
+    assert len(ranked) == 2 and ranked[0][0] >= ranked[1][0]
+    assert index.top_k("u1", MEMORIES, "crise de asma", k=1, now=NOW)[0][1].memory_id == "m1"
+
+    # Nothing in common with the query: the most recent memories come first.
+    assert index.top_k("u1", MEMORIES, "xyz", k=1, now=NOW)[0][1].memory_id != "m3"
+
+
+def test_memories_are_embedded_once():
+    index = UserMemoryIndex(dimensions=256)
+    index.top_k("u1", MEMORIES, "febre", now=NOW)
+    index.top_k("u1", MEMORIES, "asma", now=NOW)
+    assert index.stats["embedded"] == 4 and index.stats["rebuilds"] == 1
+
+    changed = MEMORIES[:3] + [memory("m3", "O usuário não tem mais febre.")]
+    index.top_k("u1", changed, "febre", now=NOW)
+    assert index.stats["embedded"] == 5 and index.stats["rebuilds"] == 2
+
+
+def test_budgeted_memory_narrows_user_memories_in_tracked_runs():
+    budget = PromptBudget(total_tokens=4000, history_tokens=1000, memory_tokens=count_tokens(MEMORIES[1].memory) + 1)
+    agent_memory = BudgetedMemory(budget=budget, top_k=3)
+    agent_memory.memories = {"u1": {item.memory_id: item for item in MEMORIES}}
+    agent = SimpleNamespace(name="Symptom Analyzer Agent", memory=agent_memory)
+
+    assert len(agent_memory.get_user_memories("u1")) == 4
+    with track_prompt(agent, "tenho asma") as report:
+        kept = agent_memory.get_user_memories("u1")
+    assert [item.memory_id for item in kept] == ["m1"]
+    assert report.memories_kept == 1 and report.memories_dropped == 3
+    assert 0 < report.memory_tokens <= budget.memory_tokens
@@ -0,0 +1,93 @@
+import logging
+import threading
+from types import SimpleNamespace
+
+from agno.memory.v2.db.schema import MemoryRow
+
+from app.storage.memory_writes import MemoryWriteBuffer, overlay_changes
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FakeMemoryDb:
+    def __init__(self, table: str, fail: bool = False):
+        self.table = SimpleNamespace(fullname=table)
+        self.fail = fail
+        self.batches = []
+
+    def write_changes(self, changes):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.batches.append(dict(changes))
+
+
+def memory(memory_id: str, text: str, user_id: str = "u1") -> MemoryRow:
+    return MemoryRow(id=memory_id, user_id=user_id, memory={"memory": text})
+
+
+def test_changes_are_coalesced_and_batched_per_table():
+    logger.info("--- STARTING MEMORY WRITE BUFFER TEST ---")
+    buffer = MemoryWriteBuffer(batch_size=3, max_pending=100)
+    # Keep the size-triggered background flush out of the way.
+    with buffer._flush_lock:
+        symptoms, protocols = FakeMemoryDb("ai.symptom_analyzer_memories"), FakeMemoryDb("ai.clinical_protocol_memories")
+        for i in range(4):
+            buffer.upsert(symptoms, memory(f"m{i}", "first"))
+        buffer.upsert(symptoms, memory("m0", "second"))
+        buffer.delete(symptoms, "m1")
+        buffer.upsert(protocols, memory("p0", "asma"))
+        assert buffer.pending == 5 and buffer.stats["coalesced"] == 2
+
+    assert buffer.flush() == 5
+    assert [len(batch) for batch in symptoms.batches] == [3, 1]
+    # A rewritten memory moves to the back of the queue with its latest change.
+    assert list(symptoms.batches[0]) == ["m2", "m3", "m0"]
+    assert symptoms.batches[0]["m0"].memory == {"memory": "second"}
+    assert symptoms.batches[1] == {"m1": None}
+    assert list(protocols.batches[0]) == ["p0"]
+    assert buffer.stats["batches"] == 3 and buffer.pending == 0
+
+
+def test_failed_flush_keeps_changes_behind_newer_ones():
+    buffer = MemoryWriteBuffer(batch_size=10, max_pending=100)
+    db = FakeMemoryDb("ai.symptom_analyzer_memories", fail=True)
+    buffer.upsert(db, memory("m0", "old"))
+    buffer.upsert(db, memory("m1", "kept"))
+
+    assert buffer.flush() == 0
+    assert buffer.stats["failed_flushes"] == 1 and buffer.pending == 2
+
+    buffer.upsert(db, memory("m0", "new"))
+    db.fail = False
+    assert buffer.flush() == 2
+    assert db.batches[0]["m0"].memory == {"memory": "new"}
+    assert db.batches[0]["m1"].memory == {"memory": "kept"}
+
+
+def test_reads_see_unflushed_changes():
+    stored = [memory("m1", "stored"), memory("m0", "stored")]
+    changes = {"m0": None, "m1": memory("m1", "updated"), "m2": memory("m2", "new"), "m3": memory("m3", "other", "u2")}
+
+    merged = overlay_changes(stored, changes, user_id="u1")
+    assert [(row.id, row.memory["memory"]) for row in merged] == [("m2", "new"), ("m1", "updated")]
+    assert [row.id for row in overlay_changes(stored, changes, sort="asc")] == ["m1", "m2", "m3"]
+    assert len(overlay_changes(stored, changes, limit=1)) == 1
+
+
+def test_size_threshold_flushes_in_the_background():
+    buffer = MemoryWriteBuffer(batch_size=2, max_pending=100)
+    flushed = threading.Event()
+
+    class SignallingDb(FakeMemoryDb):
+        def write_changes(self, changes):
+            super().write_changes(changes)
+            flushed.set()
+
+    db = SignallingDb("ai.symptom_analyzer_memories")
+    buffer.upsert(db, memory("m0", "a"))
+    assert not flushed.is_set()
+    buffer.upsert(db, memory("m1", "b"))
+    assert flushed.wait(5)
+    assert len(db.batches[0]) == 2
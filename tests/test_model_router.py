@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import pytest
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from app.agents import model_router
+from app.agents.model_router import CircuitBreaker, ModelUnavailableError, RoutedModel, get_breaker, track_model
+from app.utils.deadline import Deadline, DeadlineExceeded, use_deadline
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FakeModel(Model):
+    delay: float = 0.0
+    fail: bool = False
+
+    def invoke(self, *args, **kwargs): ...
+    async def ainvoke(self, *args, **kwargs): ...
+    def invoke_stream(self, *args, **kwargs): ...
+    async def ainvoke_stream(self, *args, **kwargs): ...
+    def parse_provider_response(self, response, **kwargs): ...
+    def parse_provider_response_delta(self, response): ...
+
+    async def aresponse(self, messages, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.id} is down")
+        messages.append(Message(role="assistant", content=self.id))
+        return ModelResponse(content=self.id)
+
+
+def run(model: RoutedModel, messages=None):
+    async def call():
+        with track_model() as trace:
+            response = await model.aresponse(messages=messages if messages is not None else [])
+        return response, trace
+    return asyncio.run(call())
+
+
+def test_hedged_request_wins_when_primary_is_slow(monkeypatch):
+    logger.info("--- STARTING MODEL ROUTER TEST ---")
+    monkeypatch.setattr(model_router, "MODEL_HEDGE_DELAY_SECONDS", 0.05)
+    messages = [Message(role="user", content="tosse")]
+
+    response, trace = run(RoutedModel(backends=[FakeModel(id="slow-a", delay=2), FakeModel(id="fast-b", delay=0.01)]), messages)
+
+    assert response.content == "fast-b"
+    assert [message.content for message in messages] == ["tosse", "fast-b"]
+    assert trace.served_by == "fakemodel:fast-b" and trace.calls[0].hedged
+
+
+def test_failover_and_deadline():
+    response, trace = run(RoutedModel(backends=[FakeModel(id="down-a", fail=True), FakeModel(id="up-b")], hedging=False))
+    assert response.content == "up-b" and trace.calls[0].failover
+
+    with pytest.raises(ModelUnavailableError):
+        run(RoutedModel(backends=[FakeModel(id="hung-a", delay=5)], timeout=0.1, hedging=False))
+
+
+def test_request_deadline_does_not_trip_the_breakers():
+    hung = FakeModel(id="hung-deadline", delay=5)
+
+    async def call():
+        with use_deadline(Deadline(0.1)):
+            await RoutedModel(backends=[hung], timeout=10, hedging=False).aresponse(messages=[])
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(call())
+    assert get_breaker("fakemodel:hung-deadline").failures == 0
+
+
+def test_circuit_opens_after_failures_and_half_opens(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    breaker.opened_at -= 61
+    assert breaker.state == model_router.HALF_OPEN and breaker.allow()
+    breaker.record_success()
+    assert breaker.state == model_router.CLOSED
+
+    monkeypatch.setattr(model_router, "_breakers", {"fakemodel:open-a": breaker})
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(ModelUnavailableError):
+        run(RoutedModel(backends=[FakeModel(id="open-a")]))
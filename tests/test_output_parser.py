@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import pytest
+from agno.models.base import Model
+from agno.models.response import ModelResponse
+
+from app.agents.output_parser import OutputParseError, extract_output, iter_json_objects, parse_output
+from app.monitoring import metrics
+from app.schemas.agents_schemas import ClinicalAction, DiagnosisHypothesis
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIAGNOSIS = '{"diagnosis": "Pneumonia", "confidence": "alta", "justification": "Febre e tosse {produtiva}", "severity": "moderada"}'
+
+
+@dataclass
+class RepairModel(Model):
+    reply: str = ""
+    calls: int = 0
+
+    def invoke(self, *args, **kwargs): ...
+    async def ainvoke(self, *args, **kwargs): ...
+    def invoke_stream(self, *args, **kwargs): ...
+    async def ainvoke_stream(self, *args, **kwargs): ...
+    def parse_provider_response(self, response, **kwargs): ...
+    def parse_provider_response_delta(self, response): ...
+
+    async def aresponse(self, messages, **kwargs):
+        self.calls += 1
+        assert kwargs["response_format"] == {"type": "json_object"}
+        return ModelResponse(content=self.reply)
+
+
+def test_reasoning_fences_and_defects_are_handled_locally():
+    logger.info("--- STARTING OUTPUT PARSER TEST ---")
+    obj, repaired = parse_output(f"<think>O usuário relata {{febre}}...</think>\n```json\n{DIAGNOSIS}\n```", DiagnosisHypothesis)
+    assert obj.diagnosis == "Pneumonia" and obj.justification == "Febre e tosse {produtiva}" and not repaired
+
+    sloppy = "Resposta: {'condition': 'Asma', 'urgency': \"d'urgência\", exam_recommendations: ['Espirometria',], 'severity': None,}"
+    action, repaired = parse_output(sloppy, ClinicalAction)
+    assert repaired
+    assert action.condition == "Asma" and action.urgency == "d'urgência"
+    assert action.exam_recommendations == ["Espirometria"] and action.severity is None
+
+
+def test_truncated_output_and_prose_braces():
+    assert list(iter_json_objects('veja {abaixo} e {"a": [1, {"b": "x}')) == ["{abaixo}", '{"a": [1, {"b": "x}"}]}']
+    obj, _ = parse_output("Segue {abaixo}: " + DIAGNOSIS[:-1], DiagnosisHypothesis)
+    assert obj.severity == "moderada"
+
+
+def test_repair_call_only_when_local_parse_fails():
+    model = RepairModel(id="repair", reply=DIAGNOSIS)
+    before = metrics.snapshot()["counters"].get("output.repair_call", 0)
+
+    asyncio.run(extract_output(model, DIAGNOSIS, DiagnosisHypothesis))
+    assert model.calls == 0
+
+    obj = asyncio.run(extract_output(model, "Diagnóstico: pneumonia, confiança alta.", DiagnosisHypothesis))
+    assert obj.diagnosis == "Pneumonia" and model.calls == 1
+    assert metrics.snapshot()["counters"]["output.repair_call"] == before + 1
+
+    model.reply = "não sei"
+    with pytest.raises(OutputParseError):
+        asyncio.run(extract_output(model, '{"diagnosis": "Pneumonia"}', DiagnosisHypothesis))
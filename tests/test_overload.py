@@ -0,0 +1,78 @@
+import time
+import asyncio
+import logging
+
+import pytest
+
+from app.schemas.agents_schemas import DiagnosisHypothesis
+from app.storage.case_history import DIAGNOSIS
+from app.storage.result_cache import ResultCache, diagnosis_key
+from app.utils.overload import DegradedMode, InflightLimiter, Overloaded
+from app.utils.scheduler import BATCH, FairScheduler, QueueOverloaded
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_standing_queue_is_shed():
+    logger.info("--- STARTING OVERLOAD PROTECTION TEST ---")
+
+    async def scenario():
+        scheduler = FairScheduler(capacity=1, per_user=1, target_ms=20, interval_ms=50)
+        release = asyncio.Event()
+
+        async def hold(user_id: str):
+            async with scheduler.slot(user_id, BATCH):
+                await release.wait()
+
+        blocker = asyncio.create_task(hold("blocker"))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(hold(f"user{i}")) for i in range(3)]
+        results = await asyncio.wait_for(asyncio.gather(*queued, return_exceptions=True), timeout=2)
+        assert scheduler.overloaded
+        release.set()
+        await blocker
+        return scheduler, results
+
+    scheduler, results = asyncio.run(scenario())
+    assert all(isinstance(result, QueueOverloaded) for result in results)
+    assert scheduler.shed == 3
+    assert scheduler.snapshot()["queued"][BATCH] == 0
+    assert scheduler.inflight == 0
+
+
+def test_inflight_limit_rejects_fast():
+    limiter = InflightLimiter({"symptom_analyzer": 2})
+    limiter.acquire("symptom_analyzer")
+    with limiter.hold("symptom_analyzer"):
+        with pytest.raises(Overloaded):
+            limiter.acquire("symptom_analyzer")
+    limiter.acquire("symptom_analyzer")
+    assert limiter.snapshot()["symptom_analyzer"] == {"limit": 2, "inflight": 2, "rejected": 1}
+
+
+def test_degraded_mode_follows_latency_and_holds():
+    degraded = DegradedMode(
+        FairScheduler(capacity=1), enabled=True, latency_ms=100, queue_depth=8,
+        window_seconds=0.2, min_samples=3, hold_seconds=0.1
+    )
+    assert not degraded.active
+    for latency in (50, 400, 500):
+        degraded.observe(latency)
+    assert degraded.active
+    assert degraded.reason == "latency"
+    # The slow runs age out of the window, then the hold runs out.
+    time.sleep(0.35)
+    assert not degraded.active
+
+
+def test_result_cache_hits_equivalent_symptoms():
+    cache = ResultCache(max_entries=2)
+    diagnosis = DiagnosisHypothesis(diagnosis="Gripe", confidence="alta", justification="Febre e tosse seca.", severity="leve")
+    cache.put(DIAGNOSIS, diagnosis_key("u1", "Tosse seca e febre"), diagnosis)
+    assert cache.get(DIAGNOSIS, diagnosis_key("u1", "fever, dry cough"), DiagnosisHypothesis) == diagnosis
+    assert cache.get(DIAGNOSIS, diagnosis_key("u1", "dor de cabeça"), DiagnosisHypothesis) is None
+    # Produced with u1's memories and history in the prompt: never served to another user.
+    assert cache.get(DIAGNOSIS, diagnosis_key("u2", "Tosse seca e febre"), DiagnosisHypothesis) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
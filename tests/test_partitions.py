@@ -0,0 +1,98 @@
+import datetime
+import logging
+
+from app.db.partitions import (
+    PartitionSpec, interval_start, partition_name, drain_default_partition, drop_expired_partitions
+)
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FakeConnection:
+    def __init__(self, partitions, default_rows=(None, None, 0)):
+        self.partitions = partitions
+        self.default_rows = default_rows
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        rows = [(name,) for name in self.partitions]
+        existing = {f"ai.{name}" for name in self.partitions}
+        default_rows = self.default_rows
+
+        class Result:
+            def fetchall(self_inner):
+                return rows
+
+            def scalar(self_inner):
+                return params["name"] if params and params.get("name") in existing else None
+
+            def one(self_inner):
+                return default_rows
+        return Result()
+
+
+def test_week_partitions_start_on_monday():
+    spec = PartitionSpec("clinical_protocol_memories", "week", False, 4)
+    start = interval_start(spec, datetime.date(2026, 10, 22))
+    assert start == datetime.date(2026, 10, 19)
+    assert partition_name(spec, start) == "clinical_protocol_memories_p20261019"
+
+
+def test_drop_expired_partitions_only_drops_partitions_past_retention():
+    logger.info("--- STARTING PARTITION RETENTION TEST ---")
+    spec = PartitionSpec("agent_sessions", "day", True, 2)
+    connection = FakeConnection([
+        "agent_sessions_p20261015",
+        "agent_sessions_p20261016",
+        "agent_sessions_p20261017",
+        "agent_sessions_p20261018",
+        "agent_sessions_default",
+    ])
+
+    dropped = drop_expired_partitions(connection, spec, datetime.date(2026, 10, 19))
+
+    assert dropped == ["agent_sessions_p20261015", "agent_sessions_p20261016"]
+    assert not any("agent_sessions_default" in sql for sql in connection.statements if sql.startswith("DROP"))
+
+
+def test_expired_partitions_are_detached_before_they_are_dropped():
+    spec = PartitionSpec("agent_sessions", "day", True, 2)
+    partitions = ["agent_sessions_p20261015", "agent_sessions_p20261018"]
+
+    connection = FakeConnection(partitions)
+    drop_expired_partitions(connection, spec, datetime.date(2026, 10, 19))
+    detach = next(sql for sql in connection.statements if "DETACH" in sql)
+    assert detach.endswith("DETACH PARTITION ai.agent_sessions_p20261015 CONCURRENTLY")
+    assert connection.statements.index(detach) < connection.statements.index("DROP TABLE IF EXISTS ai.agent_sessions_p20261015")
+
+    # Postgres refuses CONCURRENTLY while a DEFAULT partition exists: plain detach, bounded lock wait.
+    connection = FakeConnection(partitions + ["agent_sessions_default"])
+    drop_expired_partitions(connection, spec, datetime.date(2026, 10, 19))
+    assert not any("CONCURRENTLY" in sql for sql in connection.statements)
+    assert any(sql.startswith("SET lock_timeout") for sql in connection.statements)
+    assert connection.statements[-1] == "RESET lock_timeout"
+
+
+def test_rows_in_the_default_partition_are_moved_to_range_partitions():
+    spec = PartitionSpec("symptom_analyzer_memories", "week", False, 4)
+    oldest = datetime.datetime(2026, 9, 2, 10, tzinfo=datetime.timezone.utc)
+    newest = datetime.datetime(2026, 9, 9, 10, tzinfo=datetime.timezone.utc)
+    connection = FakeConnection(["symptom_analyzer_memories_default"], default_rows=(oldest, newest, 3))
+
+    assert drain_default_partition(connection, spec) == 3
+    statements = [sql for sql in connection.statements if not sql.startswith("SELECT")]
+    assert statements == [
+        "ALTER TABLE ai.symptom_analyzer_memories DETACH PARTITION ai.symptom_analyzer_memories_default",
+        "CREATE TABLE ai.symptom_analyzer_memories_p20260831 PARTITION OF ai.symptom_analyzer_memories "
+        "FOR VALUES FROM ('2026-08-31T00:00:00+00:00') TO ('2026-09-07T00:00:00+00:00')",
+        "CREATE TABLE ai.symptom_analyzer_memories_p20260907 PARTITION OF ai.symptom_analyzer_memories "
+        "FOR VALUES FROM ('2026-09-07T00:00:00+00:00') TO ('2026-09-14T00:00:00+00:00')",
+        "INSERT INTO ai.symptom_analyzer_memories SELECT * FROM ai.symptom_analyzer_memories_default",
+        "TRUNCATE TABLE ai.symptom_analyzer_memories_default",
+        "ALTER TABLE ai.symptom_analyzer_memories ATTACH PARTITION ai.symptom_analyzer_memories_default DEFAULT",
+    ]
+    assert drain_default_partition(FakeConnection(["symptom_analyzer_memories_default"]), spec) == 0
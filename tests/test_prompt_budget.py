@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import datetime
+from types import SimpleNamespace
+
+from agno.document import Document
+from agno.memory.v2.schema import UserMemory
+
+from app.agents import prompt_budget
+from app.agents.prompt_budget import (
+    BudgetedMemory, PromptBudget, count_tokens, make_budgeted_retriever, pack, track_prompt, truncate_to_tokens
+)
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNK = "Pneumonia adquirida na comunidade causa febre, tosse produtiva e dor torácica. " * 20
+NOW = datetime.datetime.now(datetime.timezone.utc)
+MEMORIES = [
+    UserMemory(memory=text, memory_id=f"m{i}", last_updated=NOW - datetime.timedelta(hours=i + 1))
+    for i, text in enumerate([
+        "O usuário relatou febre alta e tosse seca há três dias.",
+        "O usuário teve febre e dor de garganta no mês passado.",
+        "O usuário tem tosse crônica por causa do tabagismo.",
+        "O usuário é alérgico a penicilina.",
+        "O usuário pratica corrida três vezes por semana.",
+    ])
+]
+
+
+def test_truncate_to_tokens_respects_budget():
+    truncated = truncate_to_tokens(CHUNK, 60)
+
+    assert count_tokens(truncated) <= 60
+    assert truncated.endswith("[...]")
+    assert truncate_to_tokens("febre alta", 60) == "febre alta"
+
+
+def test_pack_keeps_best_items_within_budget():
+    logger.info("--- STARTING PROMPT BUDGET PACK TEST ---")
+    items = [(0.1, CHUNK, "low"), (0.9, CHUNK, "high"), (0.5, "febre e tosse", "short")]
+    budget = count_tokens(CHUNK) + 100
+
+    kept, used, truncated, dropped = pack(items, budget)
+
+    assert [payload for _, payload in kept] == ["high", "short", "low"]
+    assert used <= budget
+    assert truncated == 1 and dropped == 0
+
+    kept, _, truncated, dropped = pack(items, budget, allow_truncate=False)
+    assert [payload for _, payload in kept] == ["high", "short"]
+    assert truncated == 0 and dropped == 1
+
+
+def test_tokenizer_is_only_read_from_a_local_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(prompt_budget, "_tokenizer", None)
+    approximate = count_tokens(CHUNK)
+    # A hub model name is not a file: nothing is downloaded and counts stay approximate.
+    monkeypatch.setattr(prompt_budget, "PROMPT_TOKENIZER", "Qwen/Qwen3-32B")
+    assert asyncio.run(prompt_budget.load_tokenizer()) is False
+    monkeypatch.setattr(prompt_budget, "PROMPT_TOKENIZER", str(tmp_path / "tokenizer.json"))
+    assert asyncio.run(prompt_budget.load_tokenizer()) is False
+    assert count_tokens(CHUNK) == approximate
+
+
+def budgeted_memory(memory_tokens: int, top_k: int) -> BudgetedMemory:
+    budget = PromptBudget(total_tokens=4000, history_tokens=1000, memory_tokens=memory_tokens)
+    agent_memory = BudgetedMemory(budget=budget, top_k=top_k)
+    agent_memory.memories = {"u1": {item.memory_id: item for item in MEMORIES}}
+    return agent_memory
+
+
+def test_budgeted_memory_keeps_the_top_k():
+    agent_memory = budgeted_memory(memory_tokens=4000, top_k=2)
+    agent = SimpleNamespace(name="Symptom Analyzer Agent", memory=agent_memory)
+    ranked = [item.memory_id for _, item in agent_memory.index.top_k("u1", MEMORIES, "febre e tosse", k=5)]
+
+    with track_prompt(agent, "febre e tosse") as report:
+        kept = agent_memory.get_user_memories("u1")
+    assert [item.memory_id for item in kept] == ranked[:2]
+    assert report.memories_kept == 2 and report.memories_dropped == 3
+
+
+def test_budgeted_memory_drops_over_budget_memories_in_rank_order():
+    ranked = [item for _, item in budgeted_memory(0, 5).index.top_k("u1", MEMORIES, "febre e tosse", k=5)]
+    # Room for exactly the two best: the rest is dropped whole, never truncated.
+    agent_memory = budgeted_memory(memory_tokens=sum(count_tokens(item.memory) for item in ranked[:2]), top_k=5)
+    agent = SimpleNamespace(name="Symptom Analyzer Agent", memory=agent_memory)
+
+    with track_prompt(agent, "febre e tosse") as report:
+        kept = agent_memory.get_user_memories("u1")
+    assert [item.memory_id for item in kept] == [item.memory_id for item in ranked[:2]]
+    assert report.memories_kept == 2 and report.memories_dropped == 3
+    assert report.memory_tokens == agent_memory.budget.memory_tokens
+
+
+def knowledge_agent(budget: PromptBudget, docs):
+    knowledge = SimpleNamespace(search=lambda query, num_documents: docs[:num_documents])
+    return SimpleNamespace(name="Clinical Protocol Agent", knowledge=knowledge, memory=SimpleNamespace(budget=budget))
+
+
+def test_budgeted_retriever_drops_over_budget_chunks_in_rank_order():
+    docs = [Document(name=f"doc{i}", content=f"Trecho {i}. " + CHUNK) for i in range(4)]
+    query = "pneumonia"
+    chunk_tokens = count_tokens(docs[0].content)
+    # What is left after the message fits two chunks, and too little of a third to truncate it.
+    budget = PromptBudget(total_tokens=count_tokens(query) + 2 * chunk_tokens + 10, history_tokens=0, memory_tokens=0)
+    agent = knowledge_agent(budget, docs)
+    retriever = make_budgeted_retriever(budget)
+
+    with track_prompt(agent, query) as report:
+        references = retriever(agent, query)
+    assert [reference["name"] for reference in references] == ["doc0", "doc1"]
+    assert report.chunks_kept == 2 and report.chunks_dropped == 2 and report.chunks_truncated == 0
+    assert report.knowledge_tokens == 2 * chunk_tokens
+
+    # A roomy budget is still capped at `num_documents`, best ranked first.
+    roomy = PromptBudget(total_tokens=100000, history_tokens=0, memory_tokens=0)
+    references = make_budgeted_retriever(roomy)(knowledge_agent(roomy, docs), query, num_documents=3)
+    assert [reference["name"] for reference in references] == ["doc0", "doc1", "doc2"]
@@ -0,0 +1,33 @@
+import logging
+
+import numpy as np
+
+from app.storage.quantization import QuantizedIndex
+from scripts.benchmark_quantization import perturbed_queries, recall, synthetic_vectors
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_quantized_codes_shrink_search_memory():
+    logger.info("--- STARTING QUANTIZATION MEMORY TEST ---")
+    vectors = synthetic_vectors(200, 1536, clusters=10)
+    assert QuantizedIndex(vectors, kind="none").search_bytes_per_vector == 1536 * 4
+    assert QuantizedIndex(vectors, kind="int8").search_bytes_per_vector == 1536
+    assert QuantizedIndex(vectors, kind="binary").search_bytes_per_vector == 1536 // 8
+
+
+def test_rescoring_recovers_float_recall():
+    vectors = synthetic_vectors(3000, 256, clusters=30)
+    queries = perturbed_queries(vectors, 30, noise=0.5)
+    exact = QuantizedIndex(vectors, kind="none")
+    int8 = QuantizedIndex(vectors, kind="int8")
+    binary = QuantizedIndex(vectors, kind="binary")
+
+    def mean_recall(index, **kwargs):
+        return np.mean([recall(index.search(query, k=10, **kwargs), exact.search(query, k=10)) for query in queries])
+
+    assert mean_recall(int8, oversampling=4.0) >= 0.98
+    assert mean_recall(binary, oversampling=8.0) > mean_recall(binary, rescore=False)
+    assert mean_recall(binary, oversampling=8.0) >= 0.9
@@ -0,0 +1,48 @@
+import time
+import logging
+
+from agno.document import Document
+
+from app.storage.retrieval_cache import RetrievalCache, cache_key
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DOCS = [Document(content="Pneumonia adquirida na comunidade."), Document(content="Amoxicilina 500 mg.")]
+
+
+def test_cache_key_normalizes_query_and_filters():
+    assert cache_key("  Febre ALTA,  tosse ", 5, {"b": 1, "a": 2}, 1) == cache_key("febre alta tosse", 5, {"a": 2, "b": 1}, 1)
+    assert cache_key("febre", 5, None, 1) != cache_key("febre", 3, None, 1)
+    assert cache_key("febre", 5, None, 1) != cache_key("febre", 5, None, 2)
+
+
+def test_hits_misses_and_latency_saved():
+    logger.info("--- STARTING RETRIEVAL CACHE TEST ---")
+    cache = RetrievalCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    key = cache_key("pneumonia", 5, None, 1)
+
+    assert cache.get(key) is None
+    cache.put(key, DOCS, cost_ms=120.0)
+    assert cache.get(key) == DOCS
+    assert cache.get(cache_key("Pneumonia!", 5, None, 1)) == DOCS
+
+    stats = cache.snapshot()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["latency_saved_ms"] == 240.0
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_cache_is_bounded_and_expires():
+    cache = RetrievalCache(max_entries=2, max_bytes=10_000, ttl_seconds=0.05)
+    keys = [cache_key(f"query {i}", 5, None, 1) for i in range(3)]
+    for key in keys:
+        cache.put(key, DOCS, cost_ms=1.0)
+
+    assert cache.get(keys[0]) is None
+    assert cache.snapshot()["evictions"] == 1
+
+    time.sleep(0.06)
+    assert cache.get(keys[2]) is None
+    assert cache.snapshot()["expired"] == 1
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+from app.monitoring import metrics
+from app.utils.scheduler import BATCH, INTERACTIVE, FairScheduler
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def admissions(scheduler: FairScheduler, requests):
+    """Queue every (user, priority) request behind one blocker and return the order they are admitted in."""
+    order = []
+    release = asyncio.Event()
+
+    async def run(user_id: str, priority: str, label: str):
+        async with scheduler.slot(user_id, priority):
+            order.append(label)
+            await release.wait()
+
+    blocker = asyncio.create_task(run("blocker", BATCH, "blocker"))
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(run(user_id, priority, label)) for user_id, priority, label in requests]
+    await asyncio.sleep(0)
+    # One slot: each release admits exactly the next request.
+    for _ in requests:
+        release.set()
+        await asyncio.sleep(0)
+        release.clear()
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+    return order[1:]
+
+
+def test_burst_from_one_user_does_not_starve_others():
+    logger.info("--- STARTING FAIR SCHEDULER TEST ---")
+    burst = [("partner", BATCH, f"p{i}") for i in range(4)]
+    order = asyncio.run(admissions(FairScheduler(capacity=1, per_user=1), burst + [("clinic", BATCH, "c0")]))
+    assert order.index("c0") <= 1
+
+
+def test_interactive_overtakes_batch():
+    burst = [("partner", BATCH, f"p{i}") for i in range(4)]
+    before = metrics.summary(f"scheduler.{INTERACTIVE}.queue_wait_ms")["count"]
+    order = asyncio.run(admissions(FairScheduler(capacity=1, per_user=4), burst + [("doctor", INTERACTIVE, "d0")]))
+    assert order[0] == "d0"
+    assert metrics.summary(f"scheduler.{INTERACTIVE}.queue_wait_ms")["count"] == before + 1
+
+
+def test_per_user_cap_and_cancelled_wait():
+    async def scenario():
+        scheduler = FairScheduler(capacity=4, per_user=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("partner", BATCH):
+                await release.wait()
+
+        first = asyncio.create_task(hold())
+        second = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        assert scheduler.snapshot()["inflight"] == 1 and scheduler.snapshot()["queued"][BATCH] == 1
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        assert scheduler.snapshot()["queued"][BATCH] == 0
+
+        release.set()
+        await first
+        assert scheduler.snapshot()["inflight"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,127 @@
+import logging
+from copy import deepcopy
+
+from agno.storage.session.agent import AgentSession
+
+from app.storage.session_cache import SessionCache, estimate_size, merge_runs
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FakeSessionBackend:
+    """In-memory stand-in for PartitionedPostgresStorage's versioned reads and writes."""
+
+    def __init__(self):
+        self.rows = {}
+        self.fail = False
+        self.writes = 0
+
+    def read_with_version(self, session_id: str):
+        session, version = self.rows.get(session_id, (None, 0))
+        return deepcopy(session), version
+
+    def write_if_version(self, session: AgentSession, expected_version: int):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.writes += 1
+        if self.rows.get(session.session_id, (None, 0))[1] != expected_version:
+            return None
+        self.rows[session.session_id] = (deepcopy(session), expected_version + 1)
+        return expected_version + 1
+
+
+def session(session_id: str, *run_ids: str, created_at: int = 0) -> AgentSession:
+    runs = [{"run_id": run_id, "created_at": created_at + position} for position, run_id in enumerate(run_ids)]
+    return AgentSession(session_id=session_id, agent_id="agent", user_id="u1", memory={"runs": runs})
+
+
+def run_ids(stored: AgentSession):
+    return [run["run_id"] for run in stored.memory["runs"]]
+
+
+def test_writes_are_coalesced_until_flush():
+    logger.info("--- STARTING SESSION CACHE TEST ---")
+    backend = FakeSessionBackend()
+    cache = SessionCache(backend=backend)
+    cache.put("symptom_analyzer", session("s1", "r1"))
+    cache.put("symptom_analyzer", session("s1", "r1", "r2"))
+
+    assert backend.writes == 0 and cache.stats["coalesced_writes"] == 1
+    assert run_ids(cache.get("symptom_analyzer", "s1")) == ["r1", "r2"]
+    assert cache.flush() == 1
+    assert run_ids(backend.rows["s1"][0]) == ["r1", "r2"] and backend.rows["s1"][1] == 1
+    assert cache.flush() == 0
+
+
+def test_eviction_is_size_aware_and_leaves_dirty_entries_to_the_flush():
+    backend = FakeSessionBackend()
+    size = estimate_size(session("s0", "r0"))
+    cache = SessionCache(backend=backend, max_bytes=int(size * 2.5), max_entries=100)
+    for i in range(3):
+        cache.put("symptom_analyzer", session(f"s{i}", "r0"))
+
+    # The third session pushed the cache over its byte budget, but the request path never writes.
+    assert cache.stats["evictions"] == 0 and backend.writes == 0
+    # The flush writes everything back, then evicts the oldest.
+    assert cache.flush() == 3
+    assert cache.stats["evictions"] == 1
+    assert cache.get("symptom_analyzer", "s1") is not None and cache.stats["db_reads"] == 0
+    assert cache.get("symptom_analyzer", "s0") is not None
+    assert cache.stats["db_reads"] == 1
+
+
+def test_failed_eviction_write_back_keeps_the_session():
+    backend = FakeSessionBackend()
+    backend.fail = True
+    cache = SessionCache(backend=backend, max_entries=1)
+    cache.put("symptom_analyzer", session("s0", "r0"))
+    cache.put("symptom_analyzer", session("s1", "r0"))
+
+    assert cache.flush() == 0
+    assert cache.stats["evictions"] == 0
+    assert run_ids(cache.get("symptom_analyzer", "s0")) == ["r0"]
+
+    backend.fail = False
+    cache.put("symptom_analyzer", session("s2", "r0"))
+    assert cache.flush() == 3
+    assert cache.stats["evictions"] == 2
+    assert set(backend.rows) == {"s0", "s1", "s2"}
+
+
+def test_merge_runs_keeps_both_workers_runs_in_order():
+    ours = session("s1", "r1", "r3")
+    ours.memory["runs"][1]["created_at"] = 3
+    theirs = session("s1", "r1", "r2", created_at=1)
+
+    assert run_ids(merge_runs(ours, theirs)) == ["r1", "r2", "r3"]
+    assert merge_runs(ours, None) is ours
+    assert run_ids(ours) == ["r1", "r3"]
+
+
+def test_version_conflict_merges_the_other_workers_runs():
+    backend = FakeSessionBackend()
+    worker_a, worker_b = SessionCache(backend=backend), SessionCache(backend=backend)
+    worker_a.get("symptom_analyzer", "s1")
+    worker_b.get("symptom_analyzer", "s1")
+    worker_a.put("symptom_analyzer", session("s1", "a1", created_at=1))
+    worker_b.put("symptom_analyzer", session("s1", "b1", created_at=2))
+
+    assert worker_a.flush() == 1
+    assert worker_b.flush() == 1
+    stored, version = backend.rows["s1"]
+    assert run_ids(stored) == ["a1", "b1"] and version == 2
+    assert worker_b.stats["conflicts"] == 1
+
+
+def test_failed_flush_keeps_the_entry_dirty():
+    backend = FakeSessionBackend()
+    backend.fail = True
+    cache = SessionCache(backend=backend)
+    cache.put("symptom_analyzer", session("s1", "r1"))
+
+    assert cache.flush() == 0
+    backend.fail = False
+    assert cache.flush() == 1
+    assert run_ids(backend.rows["s1"][0]) == ["r1"]
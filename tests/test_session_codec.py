@@ -0,0 +1,65 @@
+import logging
+
+from app.storage.session_codec import compact_memory, compress, decompress, expand_memory, referenced_prompts
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are an experienced Symptom Analyzer. " * 50
+
+
+def build_memory(num_runs: int) -> dict:
+    runs = []
+    for i in range(num_runs):
+        runs.append({
+            "run_id": str(i),
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"previous symptoms {i}", "from_history": True},
+                {"role": "user", "content": f"symptoms {i}"},
+                {"role": "assistant", "content": '{"diagnosis": "Flu"}'},
+            ],
+        })
+    return {"runs": runs, "memories": {"1": {}}}
+
+
+def test_compact_memory_keeps_last_runs_and_references_prompt():
+    compact, prompts = compact_memory(build_memory(5), keep_runs=3)
+
+    assert [run["run_id"] for run in compact["runs"]] == ["2", "3", "4"]
+    assert len(prompts) == 1
+    assert referenced_prompts(compact) == set(prompts)
+    assert all(not m.get("from_history") for run in compact["runs"] for m in run["messages"])
+
+
+def test_compressed_session_round_trips():
+    logger.info("--- STARTING SESSION CODEC ROUND TRIP TEST ---")
+    memory = build_memory(3)
+    compact, prompts = compact_memory(memory, keep_runs=3)
+    blob = compress(compact)
+
+    restored = expand_memory(decompress(blob), prompts)
+
+    assert len(blob) < len(str(memory))
+    assert restored["runs"][0]["messages"][0]["content"] == SYSTEM_PROMPT
+    assert restored["runs"][2]["messages"][-1]["content"] == '{"diagnosis": "Flu"}'
+    assert restored["memories"] == {"1": {}}
+
+
+def test_user_memories_stay_inline_and_out_of_the_prompt_table():
+    memory = build_memory(2)
+    for i, run in enumerate(memory["runs"]):
+        run["messages"][0]["content"] = (
+            SYSTEM_PROMPT + "You have access to memories from previous interactions with the user that you can use:\n\n"
+            f"<memories_from_previous_interactions>\n- O usuário teve febre há {i + 2} dias.\n</memories_from_previous_interactions>\n\n"
+        )
+    compact, prompts = compact_memory(memory, keep_runs=2)
+
+    # Every run shares the agent's static prompt; the memories are stored with the session.
+    assert prompts == {next(iter(prompts)): SYSTEM_PROMPT}
+    assert not any("febre" in content for content in prompts.values())
+    restored = expand_memory(decompress(compress(compact)), prompts)
+    assert [run["messages"][0]["content"] for run in restored["runs"]] == [
+        run["messages"][0]["content"] for run in memory["runs"]
+    ]
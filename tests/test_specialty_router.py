@@ -0,0 +1,57 @@
+import logging
+
+from agno.document import Document
+
+from app.storage.lexical_index import BM25Index
+from app.storage.specialty_router import GENERAL_SPECIALTY, SpecialtyRouter, specialty_from_source, tag_specialty
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def chunks():
+    documents = [
+        Document(content="Pneumonia e tosse com escarro: iniciar amoxicilina.", meta_data={"source": "respiratoria/pneumonia.pdf"}),
+        Document(content="Asma: chiado e dispneia, usar broncodilatador.", meta_data={"source": "respiratoria/asma.pdf"}),
+        Document(content="Infarto agudo do miocárdio: dor no peito e eletrocardiograma.", meta_data={"source": "cardiologia/sca.pdf"}),
+        Document(content="Arritmia com palpitação e taquicardia: avaliar o ritmo.", meta_data={"source": "cardiologia/arritmias.pdf"}),
+        Document(content="Aviso: procure atendimento presencial.", meta_data={"source": "avisos.pdf"}),
+    ]
+    for document in documents:
+        tag_specialty(document)
+    return documents
+
+
+def test_chunks_are_tagged_by_directory_then_keywords():
+    assert specialty_from_source("Cardiologia/diretriz.pdf") == "cardiologia"
+    assert specialty_from_source("manual.pdf") is None
+
+    untagged = Document(content="Bronquiolite em lactente: tosse, chiado e dispneia.", meta_data={"source": "manual.pdf"})
+    assert tag_specialty(untagged) == "respiratoria"
+    assert tag_specialty(Document(content="Aviso: procure atendimento.", meta_data={})) == GENERAL_SPECIALTY
+    assert [document.meta_data["specialty"] for document in chunks()] == [
+        "respiratoria", "respiratoria", "cardiologia", "cardiologia", GENERAL_SPECIALTY
+    ]
+
+
+def test_router_picks_partitions_and_falls_back_to_global():
+    logger.info("--- STARTING SPECIALTY ROUTER TEST ---")
+    router = SpecialtyRouter().fit(chunks())
+
+    assert router.route("dor no peito e palpitação") == ["cardiologia", GENERAL_SPECIALTY]
+    assert router.route("tosse com chiado") == ["respiratoria", GENERAL_SPECIALTY]
+    assert router.route("febre alta há três dias") is None
+    assert sorted(router.route("tosse e palpitação")) == ["cardiologia", GENERAL_SPECIALTY, "respiratoria"]
+
+    single = SpecialtyRouter().fit(chunks()[:2])
+    assert single.route("tosse com chiado") is None
+
+
+def test_lexical_index_filters_on_routed_partitions():
+    index = BM25Index()
+    index.add(chunks())
+
+    results = index.search("tosse palpitação aviso", limit=5, filters={"specialty": ["cardiologia", GENERAL_SPECIALTY]})
+
+    assert {document.meta_data["specialty"] for document, _ in results} == {"cardiologia", GENERAL_SPECIALTY}
@@ -0,0 +1,66 @@
+import logging
+
+from agno.document import Document
+
+from app.utils.symptoms import SymptomCanonicalizer, prompt_symptoms, symptoms_key
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_equivalent_inputs_share_text_and_key():
+    logger.info("--- STARTING SYMPTOM CANONICALIZATION TEST ---")
+    canonicalizer = SymptomCanonicalizer()
+    portuguese = canonicalizer.canonicalize("Tosse seca e febre!!")
+    english = canonicalizer.canonicalize("fever, dry cough")
+
+    assert portuguese.text == "febre; tosse seca"
+    assert portuguese.key == english.key
+    assert portuguese.terms == ("febre", "tosse seca")
+    assert canonicalizer.canonicalize("estou com febre alta desde ontem").key != portuguese.key
+
+
+def test_negations_and_synonyms():
+    canonicalizer = SymptomCanonicalizer()
+    assert canonicalizer.canonicalize("sem febre ou tosse").text == "sem febre sem tosse"
+    assert canonicalizer.canonicalize("sem febre ou tosse").negated == ("febre", "tosse")
+    assert canonicalizer.canonicalize("dor na barriga e enjoo, sem fome").text == "dor abdominal; inapetencia; nausea"
+
+
+def test_numbers_are_kept_and_output_is_stable():
+    canonicalizer = SymptomCanonicalizer()
+    canonical = canonicalizer.canonicalize("febre de 38,5 e pressao 12.8")
+    assert "38,5" in canonical.text and "12.8" in canonical.text
+    assert canonicalizer.canonicalize(canonical.text) == canonical
+    assert canonicalizer.canonicalize("  !!  ").text == ""
+
+
+def test_readings_with_slashes_stay_in_their_clause():
+    canonicalizer = SymptomCanonicalizer()
+    canonical = canonicalizer.canonicalize("grávida de 30 semanas, pressão 160/110, edema nas pernas")
+    assert canonical.text == "edema pernas; gravida 30 semanas; pressao 160/110"
+    assert canonicalizer.canonicalize(canonical.text) == canonical
+    assert canonicalizer.canonicalize("PA 12/8 e febre 38,5").text == "febre 38,5; pa 12/8"
+    assert canonicalizer.canonicalize("glicemia 250 mg/dL").text == "glicemia 250 mg dl"
+    # Between words the slash still separates clauses.
+    assert canonicalizer.canonicalize("dor/ardor ao urinar").text == "ardor urinar; dor"
+
+
+def test_spelling_vocabulary_grows_with_the_corpus():
+    canonicalizer = SymptomCanonicalizer()
+    assert canonicalizer.correct("pnemonia") == "pnemonia"
+
+    corpus = [Document(content="Pneumonia adquirida na comunidade."), Document(content="Tratamento da pneumonia.")]
+    assert canonicalizer.fit(corpus) > 0
+    assert canonicalizer.correct("pnemonia") == "pneumonia"
+    assert canonicalizer.correct("adquirida") == "adquirida"
+    assert canonicalizer.canonicalize("febri").text == "febre"
+
+
+def test_agents_get_the_raw_text_and_the_canonical_form_is_only_a_key():
+    raw = "  Estou com   febre de 38,5 desde ontem\n e tosse seca "
+    assert prompt_symptoms(raw) == "Estou com febre de 38,5 desde ontem e tosse seca"
+    assert symptoms_key(raw) == symptoms_key("tosse seca; febre 38,5 desde ontem")
+    assert symptoms_key(raw) != symptoms_key("febre de 39 e tosse seca")
+    assert symptoms_key("  !!  ") == symptoms_key("!!")
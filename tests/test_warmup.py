@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from app.utils import warmup
+from test_model_router import FakeModel
+from test_replay import StaticKnowledge
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_warm_up_opens_pools_and_searches_queries_and_recent_inputs(monkeypatch):
+    logger.info("--- STARTING WARM-UP TEST ---")
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=5, connect_args={"check_same_thread": False})
+    knowledge = StaticKnowledge()
+    agent = SimpleNamespace(model=FakeModel(id="groq"), memory=None, knowledge=knowledge)
+
+    async def recent_inputs():
+        return ["febre", "tosse"]
+
+    monkeypatch.setattr(warmup, "WARMUP_QUERIES", ["febre", "dor no peito"])
+    monkeypatch.setattr(warmup, "recent_inputs", recent_inputs)
+    report = asyncio.run(warmup.warm_up([agent, agent], [engine, engine]))
+
+    assert all(step["ok"] for step in report.steps.values())
+    assert report.steps["db_pools"]["count"] == warmup.WARMUP_DB_CONNECTIONS and engine.pool.checkedin() == warmup.WARMUP_DB_CONNECTIONS
+    assert report.steps["model_backends"]["count"] == 1
+    assert report.steps["retrieval"]["count"] == knowledge.searches == 4
+    assert warmup.last_report is report
+
+
+def test_failed_step_is_reported_and_warm_up_is_cut_off(monkeypatch):
+    async def slow_inputs():
+        await asyncio.sleep(5)
+        return []
+
+    monkeypatch.setattr(warmup, "recent_inputs", slow_inputs)
+    agent = SimpleNamespace(model=None, memory=None, knowledge=StaticKnowledge())
+    report = asyncio.run(warmup.warm_up([agent], [create_engine("postgresql://nobody@127.0.0.1:1/none")], timeout=0.5))
+
+    assert report.steps["db_pools"]["ok"] is False
+    assert report.steps["timeout"]["ok"] is False and "retrieval" not in report.steps